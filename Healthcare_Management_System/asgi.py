@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Healthcare_Management_System.settings')
 
 application = get_asgi_application()
+
+# Load the insurance model in the parent process so preforked workers share it
+from django.conf import settings  # noqa: E402
+
+if settings.INSURANCE_PRELOAD_MODEL:
+    from insurance.ml_model import preload_model  # noqa: E402
+    preload_model()
@@ -82,6 +82,24 @@ else:
         }
     }
 
+# Cache
+# Shared Redis cache in production (needs the 'redis' package), otherwise
+# per-process memory
+redis_url = config('REDIS_URL', default='')
+if redis_url:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": redis_url,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # Password validators
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -110,6 +128,58 @@ AUTH_USER_MODEL = "users.User"
 # Gemini API
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
 
+# Chatbot LLM backend: 'gemini', 'local' (offline stand-in for tests and load
+# runs), 'transformers' (in-process model) or a dotted ChatBackend path
+CHATBOT_BACKEND = config('CHATBOT_BACKEND', default='gemini')
+CHATBOT_LOCAL_MODEL = config('CHATBOT_LOCAL_MODEL', default='')  # Hugging Face model for 'transformers'
+CHATBOT_LOCAL_LATENCY_MS = config('CHATBOT_LOCAL_LATENCY_MS', default=0, cast=int)  # simulated delay for 'local'
+
+# Prompt context: newest messages fetched per reply, and the rough token
+# budget they must fit in (older turns go into the conversation summary)
+CHATBOT_CONTEXT_MESSAGES = config('CHATBOT_CONTEXT_MESSAGES', default=20, cast=int)
+CHATBOT_CONTEXT_TOKENS = config('CHATBOT_CONTEXT_TOKENS', default=1500, cast=int)
+
+# Chatbot response cache for standalone questions (0 entries disables it)
+CHATBOT_CACHE_SIZE = config('CHATBOT_CACHE_SIZE', default=512, cast=int)
+CHATBOT_CACHE_TTL = config('CHATBOT_CACHE_TTL', default=3600, cast=int)  # seconds
+# TF-IDF cosine threshold for near-duplicate matches; 0 = exact matches only
+CHATBOT_CACHE_SIMILARITY = config('CHATBOT_CACHE_SIMILARITY', default=0.0, cast=float)
+
+# Back-pressure for outbound LLM calls (per worker process)
+CHATBOT_MAX_CONCURRENCY = config('CHATBOT_MAX_CONCURRENCY', default=8, cast=int)
+CHATBOT_MAX_QUEUE = config('CHATBOT_MAX_QUEUE', default=32, cast=int)
+CHATBOT_QUEUE_TIMEOUT = config('CHATBOT_QUEUE_TIMEOUT', default=10, cast=float)  # seconds
+# Provider quota in requests per minute per process (0 = unlimited)
+CHATBOT_RATE_LIMIT_PER_MINUTE = config('CHATBOT_RATE_LIMIT_PER_MINUTE', default=0, cast=int)
+CHATBOT_RATE_LIMIT_BURST = config('CHATBOT_RATE_LIMIT_BURST', default=0, cast=int)
+CHATBOT_BREAKER_THRESHOLD = config('CHATBOT_BREAKER_THRESHOLD', default=5, cast=int)  # consecutive failures
+CHATBOT_BREAKER_RESET = config('CHATBOT_BREAKER_RESET', default=30, cast=float)  # seconds before a retry
+
+# Where chat replies are generated: 'inline' (in the request), 'thread'
+# (in-process pool, for development) or 'database' (run_chat_worker processes)
+CHATBOT_JOB_QUEUE = config('CHATBOT_JOB_QUEUE', default='inline')
+CHATBOT_JOB_WORKERS = config('CHATBOT_JOB_WORKERS', default=4, cast=int)  # threads per pool
+CHATBOT_JOB_TIMEOUT = config('CHATBOT_JOB_TIMEOUT', default=300, cast=int)  # seconds before a running job is requeued
+CHATBOT_JOB_RETENTION_HOURS = config('CHATBOT_JOB_RETENTION_HOURS', default=24, cast=int)  # finished jobs are deleted after this
+
+# Appointment reminders (send_reminders command): how far ahead to remind, and
+# how many due appointments are read and marked per database batch
+APPOINTMENT_REMINDER_HOURS = config('APPOINTMENT_REMINDER_HOURS', default=24, cast=int)
+APPOINTMENT_REMINDER_BATCH = config('APPOINTMENT_REMINDER_BATCH', default=500, cast=int)
+
+# Insurance model registry: versioned .npz artifacts plus an ACTIVE pointer file
+INSURANCE_MODEL_DIR = config('INSURANCE_MODEL_DIR', default=str(BASE_DIR / 'insurance' / 'artifacts'))
+# How often (seconds) a running predictor checks for a newly activated version
+INSURANCE_MODEL_CHECK_INTERVAL = config('INSURANCE_MODEL_CHECK_INTERVAL', default=30, cast=int)
+# Load the model when the WSGI/ASGI app is built (use with gunicorn --preload)
+INSURANCE_PRELOAD_MODEL = config('INSURANCE_PRELOAD_MODEL', default=False, cast=bool)
+# Max memoized quotes per process (0 disables the prediction cache)
+INSURANCE_PREDICTION_CACHE_SIZE = config('INSURANCE_PREDICTION_CACHE_SIZE', default=4096, cast=int)
+# JSON quote API: coalescing window for concurrent single quotes, and batch limits
+INSURANCE_BATCH_WINDOW_MS = config('INSURANCE_BATCH_WINDOW_MS', default=2, cast=float)
+INSURANCE_BATCH_MAX_SIZE = config('INSURANCE_BATCH_MAX_SIZE', default=256, cast=int)
+INSURANCE_API_MAX_BATCH = config('INSURANCE_API_MAX_BATCH', default=1000, cast=int)
+
 # Redirects
 LOGIN_URL = "users:login"  # ✅ ADD THIS LINE
 LOGIN_REDIRECT_URL = "users:dashboard"
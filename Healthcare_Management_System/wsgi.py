@@ -15,4 +15,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Healthcare_Management_System.se
 
 application = get_wsgi_application()
 
+# Load the insurance model in the parent process so preforked workers share it
+from django.conf import settings  # noqa: E402
+
+if settings.INSURANCE_PRELOAD_MODEL:
+    from insurance.ml_model import preload_model  # noqa: E402
+    preload_model()
+
 app = application
\ No newline at end of file
@@ -1,5 +1,30 @@
-from django.contrib import admin
-from .models import Appointment
+from django.contrib import admin, messages
+from .models import Appointment, AppointmentSlot, DoctorSchedule
+from .services import MAX_BULK_STATUS, bulk_change_status
+
+
+def status_action(new_status, label):
+    """Admin action moving the selected appointments to ``new_status``"""
+    def action(modeladmin, request, queryset):
+        ids = list(queryset.values_list('id', flat=True)[:MAX_BULK_STATUS + 1])
+        if len(ids) > MAX_BULK_STATUS:
+            modeladmin.message_user(
+                request, f'Please select at most {MAX_BULK_STATUS} appointments at a time.', messages.ERROR
+            )
+            return
+        results = bulk_change_status(ids, new_status)
+        updated = sum(1 for row in results if row['result'] == 'updated')
+        rejected = [row for row in results if row['result'] == 'rejected']
+        modeladmin.message_user(request, f'{updated} appointment(s) marked as {new_status}.', messages.SUCCESS)
+        if rejected:
+            reasons = sorted({row['error'] for row in rejected})
+            modeladmin.message_user(
+                request, f"{len(rejected)} appointment(s) skipped: {' '.join(reasons)}", messages.WARNING
+            )
+    action.__name__ = f'mark_{new_status}'
+    action.short_description = label
+    return action
+
 
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
@@ -7,6 +32,14 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'appointment_date', 'doctor__specialization')
     search_fields = ('patient__user__username', 'doctor__user__username', 'reason')
     date_hierarchy = 'appointment_date'
+    actions = [
+        status_action('confirmed', 'Mark selected appointments as confirmed'),
+        status_action('completed', 'Mark selected appointments as completed'),
+        status_action('cancelled', 'Mark selected appointments as cancelled'),
+    ]
+    # A plain save() would skip the transition rules and slot bookkeeping,
+    # so status only changes through the actions above
+    readonly_fields = ('status',)
     
     fieldsets = (
         ('Appointment Details', {
@@ -16,3 +49,18 @@ class AppointmentAdmin(admin.ModelAdmin):
             'fields': ('status', 'notes')
         }),
     )
+
+
+@admin.register(DoctorSchedule)
+class DoctorScheduleAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes', 'is_active')
+    list_filter = ('weekday', 'is_active', 'doctor__specialization')
+    search_fields = ('doctor__user__username', 'doctor__user__last_name')
+
+@admin.register(AppointmentSlot)
+class AppointmentSlotAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'date', 'start_time', 'end_time', 'status')
+    list_filter = ('status', 'date')
+    search_fields = ('doctor__user__username', 'doctor__user__last_name')
+    date_hierarchy = 'date'
+    raw_id_fields = ('appointment',)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appointments'
+
+    def ready(self):
+        # Registers the signals that invalidate the cached doctor directory
+        # and free the slot of a deleted appointment
+        from . import directory, services  # noqa: F401
@@ -0,0 +1,122 @@
+"""
+Cached doctor directory for the booking page.
+
+The directory is every doctor's id, display name, specialization, experience
+and fee, read with one select_related query projected to those columns and
+kept in Django's cache under a versioned key. Saving or deleting a Doctor,
+or a doctor's User, bumps the version, so the next read rebuilds it without
+deleting keys one by one. With a shared cache (Redis, see REDIS_URL) every
+process sees the bump at once; with the per-process LocMem default only
+the process that handled the save does, so there entries expire after
+DIRECTORY_LOCAL_CACHE_TIMEOUT to bound how stale the others get. Search
+(by name and/or specialization) runs over the cached list.
+"""
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Doctor, User
+
+DIRECTORY_VERSION_KEY = 'appointments:doctor_directory:version'
+
+# Changes invalidate by version; the timeout only bounds stale memory
+DIRECTORY_CACHE_TIMEOUT = 60 * 60
+
+# Per-process caches don't see other processes' version bumps
+DIRECTORY_LOCAL_CACHE_TIMEOUT = 60
+
+# Most search results returned at once
+MAX_SEARCH_RESULTS = 50
+
+
+def directory_version():
+    cache.add(DIRECTORY_VERSION_KEY, 1, None)
+    return cache.get(DIRECTORY_VERSION_KEY, 1)
+
+
+def bump_directory_version():
+    try:
+        cache.incr(DIRECTORY_VERSION_KEY)
+    except ValueError:
+        # Evicted or never set; any new value retires the old entries
+        cache.set(DIRECTORY_VERSION_KEY, directory_version() + 1, None)
+
+
+def _load_directory():
+    rows = (
+        Doctor.objects
+        .select_related('user')
+        .order_by('user__last_name', 'user__first_name', 'id')
+        .values(
+            'id', 'specialization', 'experience_years', 'consultation_fee',
+            'user__first_name', 'user__last_name', 'user__username',
+        )
+    )
+    return [
+        {
+            'id': row['id'],
+            'name': f"{row['user__first_name']} {row['user__last_name']}".strip() or row['user__username'],
+            'specialization': row['specialization'],
+            'experience_years': row['experience_years'],
+            'consultation_fee': str(row['consultation_fee']),
+        }
+        for row in rows
+    ]
+
+
+def directory_cache_timeout():
+    if isinstance(caches['default'], LocMemCache):
+        return DIRECTORY_LOCAL_CACHE_TIMEOUT
+    return DIRECTORY_CACHE_TIMEOUT
+
+
+def doctor_directory():
+    """All doctors as dicts, from the cache when possible"""
+    key = f'appointments:doctor_directory:{directory_version()}'
+    doctors = cache.get(key)
+    if doctors is None:
+        doctors = _load_directory()
+        cache.set(key, doctors, directory_cache_timeout())
+    return doctors
+
+
+def doctor_label(doctor):
+    """Select option text, matching Doctor.__str__"""
+    return f"Dr. {doctor['name']} - {doctor['specialization']}"
+
+
+def specializations():
+    """Distinct specializations in the directory, sorted"""
+    return sorted({doctor['specialization'] for doctor in doctor_directory()}, key=str.lower)
+
+
+def search_doctors(query='', specialization='', limit=MAX_SEARCH_RESULTS):
+    """Doctors whose name or specialization contains ``query``, optionally of one specialization"""
+    query = query.strip().lower()
+    specialization = specialization.strip().lower()
+    results = []
+    for doctor in doctor_directory():
+        if specialization and doctor['specialization'].lower() != specialization:
+            continue
+        if query and query not in doctor['name'].lower() and query not in doctor['specialization'].lower():
+            continue
+        results.append(doctor)
+        if len(results) >= limit:
+            break
+    return results
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def doctor_changed(sender, instance, **kwargs):
+    bump_directory_version()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def doctor_user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which the directory doesn't show
+    if instance.user_type != 'doctor' or update_fields == frozenset({'last_login'}):
+        return
+    bump_directory_version()
@@ -1,7 +1,12 @@
 from django import forms
 from .models import Appointment
+from .directory import doctor_directory, doctor_label, specializations
 from users.models import Doctor
 
+# Above this many doctors the select only holds the chosen one and the
+# booking page finds doctors through the search API instead
+DOCTOR_SELECT_LIMIT = 200
+
 class AppointmentForm(forms.ModelForm):
     """Appointment booking form"""
     
@@ -16,5 +21,15 @@ class AppointmentForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['doctor'].queryset = Doctor.objects.all()
-        self.fields['doctor'].empty_label = "Select a Doctor"
+        # The queryset only validates the submitted id; the options come from
+        # the cached directory instead of one Doctor.__str__ query per doctor
+        self.fields['doctor'].queryset = Doctor.objects.select_related('user')
+        
+        doctors = doctor_directory()
+        if len(doctors) > DOCTOR_SELECT_LIMIT:
+            selected = str(self.data.get(self.add_prefix('doctor')) or self.initial.get('doctor') or '')
+            doctors = [doctor for doctor in doctors if str(doctor['id']) == selected]
+        self.fields['doctor'].choices = [('', 'Select a Doctor')] + [
+            (doctor['id'], doctor_label(doctor)) for doctor in doctors
+        ]
+        self.specializations = specializations()
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from appointments.services import generate_slots
+
+
+class Command(BaseCommand):
+    help = "Create bookable appointment slots from doctors' weekly schedules"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=28,
+                            help='How many days ahead to generate, starting today (default: 28)')
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors',
+                            help='Only this doctor id (repeatable); default: every doctor')
+
+    def handle(self, *args, **options):
+        start = timezone.localdate()
+        end = start + timedelta(days=options['days'] - 1)
+        count = generate_slots(start, end, doctors=options['doctors'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {count} slot(s) from {start} to {end}; missing ones were created'
+        ))
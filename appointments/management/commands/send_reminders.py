@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from appointments.reminders import send_reminders
+
+
+class Command(BaseCommand):
+    help = 'Email patients a reminder of their upcoming appointments (safe to rerun)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int,
+                            help='Remind about appointments starting within this many hours '
+                                 '(default: APPOINTMENT_REMINDER_HOURS)')
+        parser.add_argument('--batch-size', type=int,
+                            help='Appointments read and marked per database batch; each email is '
+                                 'still sent on its own (default: APPOINTMENT_REMINDER_BATCH)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the reminders that would be sent without sending or marking them')
+
+    def handle(self, *args, **options):
+        sent, skipped, failed = send_reminders(
+            hours=options['hours'], batch_size=options['batch_size'], dry_run=options['dry_run']
+        )
+        verb = 'Would send' if options['dry_run'] else 'Sent'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sent} reminder(s)'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {skipped} appointment(s) of patients without an email address'))
+        if failed:
+            self.stdout.write(self.style.ERROR(f'{failed} reminder(s) failed and will be retried on the next run'))
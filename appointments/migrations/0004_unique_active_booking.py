@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:40
+
+from django.db import migrations, models
+
+
+def double_bookings(appointments):
+    """
+    Ids of active appointments sharing a doctor/date/time, one list per
+    clash, from ``appointments`` in (created_at, id) order
+    """
+    groups = {}
+    for appointment in appointments:
+        key = (appointment.doctor_id, appointment.appointment_date, appointment.appointment_time)
+        groups.setdefault(key, []).append(appointment.pk)
+    return [ids for ids in groups.values() if len(ids) > 1]
+
+
+def check_double_bookings(apps, schema_editor):
+    """
+    Earlier check-then-insert booking could leave two active appointments at
+    the same doctor/time. Which one the patient keeps is for staff to decide,
+    so stop with the clashing ids instead of cancelling any of them.
+    """
+    Appointment = apps.get_model('appointments', 'Appointment')
+    active = Appointment.objects.filter(status__in=['pending', 'confirmed']).order_by('created_at', 'id')
+    clashes = double_bookings(active.iterator())
+    if clashes:
+        listed = '; '.join(', '.join(str(pk) for pk in ids) for ids in clashes)
+        raise RuntimeError(
+            'Double-booked active appointments must be resolved (cancel or move all '
+            f'but one per group) before appointments_unique_active_time can be added: {listed}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_doctor_schedule_slots'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=('doctor', 'appointment_date', 'appointment_time'), name='appointments_unique_active_time'),
+        ),
+    ]
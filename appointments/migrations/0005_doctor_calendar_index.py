@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_unique_active_booking'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'appointment_date', 'appointment_time', 'status'], name='appointments_doctor_calendar'),
+        ),
+    ]
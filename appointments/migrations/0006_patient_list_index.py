@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_doctor_calendar_index'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'appointment_date', 'appointment_time', 'id'], name='appointments_patient_list'),
+        ),
+    ]
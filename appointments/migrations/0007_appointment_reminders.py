@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_patient_list_index'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('reminder_sent_at__isnull', True), ('status__in', ['pending', 'confirmed'])), fields=['appointment_date', 'appointment_time', 'id'], name='appointments_reminder_due'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:01
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def remove_invalid_schedules(apps, schema_editor):
+    """
+    Schedules with 0-minute slots or no working time can't produce slots
+    (a 0-minute step never ends); delete them so the checks can be added
+    """
+    DoctorSchedule = apps.get_model('appointments', 'DoctorSchedule')
+    DoctorSchedule.objects.filter(
+        models.Q(slot_minutes__lte=0) | models.Q(end_time__lte=models.F('start_time'))
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_appointment_reminders'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_invalid_schedules, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='doctorschedule',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.CheckConstraint(condition=models.Q(('slot_minutes__gt', 0)), name='appointments_schedule_slot_minutes'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='appointments_schedule_end_after_start'),
+        ),
+    ]
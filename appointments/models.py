@@ -1,3 +1,4 @@
+from django.core.validators import MinValueValidator
 from django.db import models
 from users.models import User, Patient, Doctor
 
@@ -17,11 +18,105 @@ class Appointment(models.Model):
     reason = models.TextField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     notes = models.TextField(blank=True)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-appointment_date', '-appointment_time']
+        constraints = [
+            # A doctor can't hold two active bookings at the same time; the
+            # database enforces it, so concurrent bookings can't both succeed
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=['pending', 'confirmed']),
+                name='appointments_unique_active_time',
+            ),
+        ]
+        indexes = [
+            # Doctor calendar: one range scan per day/week, status read from the index
+            models.Index(
+                fields=['doctor', 'appointment_date', 'appointment_time', 'status'],
+                name='appointments_doctor_calendar',
+            ),
+            # "My appointments" for patients, newest first
+            models.Index(
+                fields=['patient', 'appointment_date', 'appointment_time', 'id'],
+                name='appointments_patient_list',
+            ),
+            # Reminder run: only active appointments still waiting for a reminder
+            models.Index(
+                fields=['appointment_date', 'appointment_time', 'id'],
+                condition=models.Q(reminder_sent_at__isnull=True, status__in=['pending', 'confirmed']),
+                name='appointments_reminder_due',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.patient} with {self.doctor} on {self.appointment_date} at {self.appointment_time}"
+
+
+class DoctorSchedule(models.Model):
+    """Weekly working hours of a doctor, split into bookable slots"""
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30, validators=[MinValueValidator(1)])
+    is_active = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['doctor', 'weekday', 'start_time']
+        constraints = [
+            models.CheckConstraint(condition=models.Q(slot_minutes__gt=0), name='appointments_schedule_slot_minutes'),
+            models.CheckConstraint(
+                condition=models.Q(end_time__gt=models.F('start_time')), name='appointments_schedule_end_after_start'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.doctor} - {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class AppointmentSlot(models.Model):
+    """
+    One bookable time slot of a doctor, generated from DoctorSchedule
+    Booking flips a free slot to booked with a single conditional UPDATE
+    (see appointments.services), so two patients can't claim the same slot
+    """
+    STATUS_CHOICES = [
+        ('free', 'Free'),
+        ('booked', 'Booked'),
+    ]
+    
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='slots')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='free')
+    appointment = models.OneToOneField(
+        Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='slot'
+    )
+    
+    class Meta:
+        ordering = ['date', 'start_time']
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date', 'start_time'], name='appointments_slot_unique_start'),
+        ]
+        indexes = [
+            # Free slots of a doctor over a date range, in order
+            models.Index(fields=['doctor', 'status', 'date', 'start_time'], name='appointments_slot_free'),
+        ]
+    
+    def __str__(self):
+        return f"{self.doctor} on {self.date} {self.start_time:%H:%M}-{self.end_time:%H:%M} ({self.status})"
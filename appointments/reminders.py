@@ -0,0 +1,119 @@
+"""
+Appointment reminder emails.
+
+``python manage.py send_reminders`` (run from cron, e.g. nightly) emails every
+patient whose active appointment starts within the next
+APPOINTMENT_REMINDER_HOURS. Due appointments are read in keyset batches of
+APPOINTMENT_REMINDER_BATCH from the partial appointments_reminder_due index,
+each batch is rendered with one compiled template and sent message by message
+over one reused connection, then the delivered ones are marked with
+reminder_sent_at in one UPDATE. Marked appointments are never selected
+again, so reruns are idempotent; a message the server refuses is logged,
+left unmarked for the next run, and doesn't stop the rest. If the run dies
+part way, the messages already delivered are still marked.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+from django.utils import timezone
+
+from core.pagination import paginate_keyset
+
+from .models import Appointment
+from .services import ACTIVE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+REMINDER_TEMPLATE = 'appointments/email/reminder.txt'
+
+# Walk due appointments in the order of the appointments_reminder_due index
+REMINDER_ORDERING = ('appointment_date', 'appointment_time', 'id')
+
+
+def due_reminders(start, end):
+    """Active, not yet reminded appointments starting between two local datetimes"""
+    return (
+        Appointment.objects
+        .filter(reminder_sent_at__isnull=True, status__in=ACTIVE_STATUSES)
+        .filter(appointment_date__gte=start.date(), appointment_date__lte=end.date())
+        .exclude(appointment_date=start.date(), appointment_time__lt=start.time())
+        .exclude(appointment_date=end.date(), appointment_time__gt=end.time())
+        .select_related('patient__user', 'doctor__user')
+    )
+
+
+def build_reminder(appointment, template, connection=None):
+    """The reminder EmailMessage for ``appointment``"""
+    doctor_name = appointment.doctor.user.get_full_name() or appointment.doctor.user.username
+    body = template.render({
+        'appointment': appointment,
+        'patient_name': appointment.patient.user.get_full_name() or appointment.patient.user.username,
+        'doctor_name': doctor_name,
+    })
+    subject = (
+        f'Reminder: appointment with Dr. {doctor_name} on '
+        f'{appointment.appointment_date:%b %d, %Y} at {appointment.appointment_time:%H:%M}'
+    )
+    return EmailMessage(subject, body, to=[appointment.patient.user.email], connection=connection)
+
+
+def send_reminders(hours=None, batch_size=None, now=None, dry_run=False):
+    """
+    Send reminders for appointments in the next ``hours``; returns
+    (sent, skipped, failed) where skipped counts patients without an email
+    address and failed the messages the server refused.
+    With ``dry_run`` nothing is sent or marked.
+    """
+    if hours is None:
+        hours = getattr(settings, 'APPOINTMENT_REMINDER_HOURS', 24)
+    if batch_size is None:
+        batch_size = getattr(settings, 'APPOINTMENT_REMINDER_BATCH', 500)
+    start = timezone.localtime(now)
+    end = start + timedelta(hours=hours)
+
+    template = get_template(REMINDER_TEMPLATE)
+    queryset = due_reminders(start, end)
+    sent = skipped = failed = 0
+    cursor = None
+
+    connection = get_connection()
+    if not dry_run:
+        connection.open()
+    try:
+        while True:
+            page = paginate_keyset(queryset, REMINDER_ORDERING, cursor=cursor, page_size=batch_size)
+            batch = [a for a in page if a.patient.user.email]
+            skipped += len(page) - len(batch)
+
+            if dry_run:
+                sent += len(batch)
+            elif batch:
+                delivered = []
+                try:
+                    for appointment in batch:
+                        try:
+                            connection.send_messages([build_reminder(appointment, template, connection)])
+                        except Exception as e:
+                            logger.error(f"Reminder for appointment {appointment.pk} failed: {e}")
+                            failed += 1
+                            # The server may have dropped the session; start a fresh one
+                            connection.close()
+                            connection.open()
+                        else:
+                            delivered.append(appointment.pk)
+                finally:
+                    # Even if reconnecting fails, what went out must not go out again
+                    if delivered:
+                        Appointment.objects.filter(pk__in=delivered).update(reminder_sent_at=timezone.now())
+                    sent += len(delivered)
+
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+    finally:
+        if not dry_run:
+            connection.close()
+    return sent, skipped, failed
@@ -0,0 +1,346 @@
+"""
+Doctor availability and slot booking.
+
+Doctors with a DoctorSchedule get AppointmentSlot rows generated ahead of
+time (``python manage.py generate_slots``). Free slots over a date range are
+one indexed query, and booking claims the slot covering the requested time
+with a conditional UPDATE, so a slot can't be double-booked and a 10:05
+request can't slip in next to a 10:00 booking. Doctors without a schedule
+keep free-form booking at any time.
+
+Either way, a conditional unique constraint on Appointment stops two active
+bookings at the same doctor/date/time, even from concurrent requests; the
+resulting IntegrityError is reported as SlotUnavailable.
+"""
+from datetime import date, datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Appointment, AppointmentSlot, DoctorSchedule
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+VALID_STATUSES = [status for status, _ in Appointment.STATUS_CHOICES]
+
+# (current, new) status pairs that are not allowed, with the reason
+FORBIDDEN_TRANSITIONS = {
+    ('cancelled', 'confirmed'): 'Cannot confirm a cancelled appointment. Please create a new one.',
+    ('completed', 'cancelled'): 'Cannot cancel a completed appointment.',
+}
+
+SLOT_TAKEN_MESSAGE = 'This time slot is already booked. Please choose another time or doctor.'
+
+# Most appointments one bulk status change may touch
+MAX_BULK_STATUS = 500
+
+# Longest date range the free-slot API returns at once
+MAX_SLOT_RANGE_DAYS = 31
+
+CALENDAR_VIEWS = ('day', 'week')
+
+# Appointment lists: newest first, id breaks ties between equal times
+LIST_ORDERING = ('-appointment_date', '-appointment_time', '-id')
+
+
+class SlotUnavailable(Exception):
+    """The requested time can't be booked"""
+
+
+class InvalidTransition(Exception):
+    """The requested status change is not allowed"""
+
+
+def schedule_slots(schedule, day):
+    """(start, end) times of each slot ``schedule`` offers on ``day``"""
+    step = timedelta(minutes=schedule.slot_minutes)
+    if step <= timedelta(0):
+        return
+    start = datetime.combine(day, schedule.start_time)
+    end = datetime.combine(day, schedule.end_time)
+    while start + step <= end:
+        yield start.time(), (start + step).time()
+        start += step
+
+
+def generate_slots(start_date, end_date, doctors=None):
+    """
+    Create the slots of every active schedule from ``start_date`` to
+    ``end_date`` (inclusive); existing slots are left untouched. Slots that
+    overlap an active appointment booked before the schedule existed are
+    created booked (and linked to it), so they can't be booked again.
+    Returns the number of slots considered.
+    """
+    schedules = DoctorSchedule.objects.filter(is_active=True)
+    if doctors is not None:
+        schedules = schedules.filter(doctor__in=doctors)
+
+    by_weekday = {}
+    for schedule in schedules:
+        by_weekday.setdefault(schedule.weekday, []).append(schedule)
+
+    # Free-form bookings without a slot, by (doctor, day)
+    booked = {}
+    existing = Appointment.objects.filter(
+        doctor_id__in={schedule.doctor_id for day_schedules in by_weekday.values() for schedule in day_schedules},
+        appointment_date__gte=start_date,
+        appointment_date__lte=end_date,
+        status__in=ACTIVE_STATUSES,
+        slot__isnull=True,
+    ).values_list('pk', 'doctor_id', 'appointment_date', 'appointment_time')
+    for pk, doctor_id, day, at in existing:
+        booked.setdefault((doctor_id, day), []).append((at, pk))
+
+    slots = []
+    day = start_date
+    while day <= end_date:
+        for schedule in by_weekday.get(day.weekday(), []):
+            taken = booked.get((schedule.doctor_id, day), [])
+            for start, end in schedule_slots(schedule, day):
+                slot = AppointmentSlot(doctor_id=schedule.doctor_id, date=day, start_time=start, end_time=end)
+                overlapping = [pk for at, pk in taken if start <= at < end]
+                if overlapping:
+                    slot.status = 'booked'
+                    slot.appointment_id = min(overlapping)
+                slots.append(slot)
+        day += timedelta(days=1)
+
+    AppointmentSlot.objects.bulk_create(slots, batch_size=1000, ignore_conflicts=True)
+    return len(slots)
+
+
+def add_days(day, days):
+    """``day`` plus ``days``, stopping at date.max instead of overflowing"""
+    return day + timedelta(days=min(days, (date.max - day).days))
+
+
+def free_slots(doctor, start_date, end_date):
+    """Free, not yet started slots of ``doctor`` in the date range (one query)"""
+    now = timezone.localtime()
+    return (
+        AppointmentSlot.objects
+        .filter(doctor=doctor, status='free', date__gte=start_date, date__lte=end_date)
+        .filter(Q(date__gt=now.date()) | Q(date=now.date(), start_time__gt=now.time()))
+        .order_by('date', 'start_time')
+    )
+
+
+def _save_active(appointment, **kwargs):
+    """
+    Save ``appointment``, turning a clash with another active booking at
+    the same doctor/time (the appointments_unique_active_time constraint)
+    into SlotUnavailable
+    """
+    try:
+        # Savepoint, so the outer transaction survives the IntegrityError
+        with transaction.atomic():
+            appointment.save(**kwargs)
+    except IntegrityError:
+        raise SlotUnavailable(SLOT_TAKEN_MESSAGE)
+
+
+def reserve_appointment(appointment):
+    """
+    Save a new ``appointment``, claiming the doctor's slot that covers its
+    time. Raises SlotUnavailable if the slot is taken or has already
+    started, or if the doctor works from a schedule and the time is outside
+    every slot.
+    """
+    with transaction.atomic():
+        slot = (
+            AppointmentSlot.objects
+            .filter(
+                doctor=appointment.doctor,
+                date=appointment.appointment_date,
+                start_time__lte=appointment.appointment_time,
+                end_time__gt=appointment.appointment_time,
+            )
+            .values('pk', 'start_time')
+            .first()
+        )
+
+        if slot is None:
+            if DoctorSchedule.objects.filter(doctor=appointment.doctor, is_active=True).exists():
+                raise SlotUnavailable("The doctor isn't available at that time. Please choose one of the free slots.")
+            # No schedule: free-form booking, the unique constraint rejects
+            # an exact-time clash even when two requests race
+            _save_active(appointment)
+            return appointment
+
+        # Book the whole slot from its start time, which must still be ahead
+        now = timezone.localtime()
+        if (appointment.appointment_date, slot['start_time']) <= (now.date(), now.time()):
+            raise SlotUnavailable('That slot has already started. Please choose a later time.')
+        appointment.appointment_time = slot['start_time']
+        _save_active(appointment)
+        claimed = AppointmentSlot.objects.filter(pk=slot['pk'], status='free').update(
+            status='booked', appointment=appointment
+        )
+        if not claimed:
+            # Rolls back the appointment insert
+            raise SlotUnavailable(SLOT_TAKEN_MESSAGE)
+    return appointment
+
+
+def release_slot(appointment):
+    """Free the slot held by ``appointment`` (e.g. after cancelling it)"""
+    return AppointmentSlot.objects.filter(appointment=appointment).update(status='free', appointment=None)
+
+
+@receiver(pre_delete, sender=Appointment)
+def release_slot_on_delete(sender, instance, **kwargs):
+    # SET_NULL alone would leave the slot 'booked' with nobody in it
+    release_slot(instance)
+
+
+def reclaim_slot(appointment):
+    """
+    Re-book the slot at ``appointment``'s time when it becomes active again
+    Raises SlotUnavailable if someone else has booked that slot meanwhile.
+    """
+    slots = AppointmentSlot.objects.filter(
+        doctor_id=appointment.doctor_id,
+        date=appointment.appointment_date,
+        start_time=appointment.appointment_time,
+    )
+    claimed = slots.filter(status='free').update(status='booked', appointment=appointment)
+    if not claimed and slots.exclude(appointment=appointment).exists():
+        raise SlotUnavailable(SLOT_TAKEN_MESSAGE)
+
+
+def validate_transition(current, new_status):
+    """Raise InvalidTransition unless ``current`` may change to ``new_status``"""
+    if new_status not in VALID_STATUSES:
+        raise InvalidTransition('Invalid status selected.')
+    reason = FORBIDDEN_TRANSITIONS.get((current, new_status))
+    if reason:
+        raise InvalidTransition(reason)
+
+
+def change_status(appointment_id, new_status, notes=None):
+    """
+    Move an appointment to ``new_status`` (and optionally replace its notes)
+    The row is locked with select_for_update for the duration, so concurrent
+    updates of the same appointment apply one after the other. Slots are
+    released on deactivation and reclaimed on reactivation.
+    """
+    with transaction.atomic():
+        appointment = Appointment.objects.select_for_update().get(pk=appointment_id)
+        validate_transition(appointment.status, new_status)
+
+        was_active = appointment.status in ACTIVE_STATUSES
+        appointment.status = new_status
+        if notes is not None:
+            appointment.notes = notes
+        _save_active(appointment, update_fields=['status', 'notes', 'updated_at'])
+
+        is_active = new_status in ACTIVE_STATUSES
+        if was_active and not is_active:
+            release_slot(appointment)
+        elif is_active and not was_active:
+            reclaim_slot(appointment)
+    return appointment
+
+
+def bulk_change_status(appointment_ids, new_status, doctor=None):
+    """
+    Move many appointments to ``new_status`` under the same rules as
+    change_status; with ``doctor``, only that doctor's appointments are
+    touched. Returns one ``{'id', 'result'[, 'error']}`` dict per requested
+    id, result being updated, unchanged, rejected or not_found.
+
+    Allowed rows are changed with one ``UPDATE ... WHERE id IN (...) AND
+    status IN (...)`` and their slots released with one more; only rows
+    becoming active again go through change_status one by one, since they
+    must reclaim a slot and may clash with another booking.
+    Raises InvalidTransition for an unknown status.
+    """
+    validate_transition(None, new_status)
+    allowed_from = [
+        status for status in VALID_STATUSES
+        if status != new_status and (status, new_status) not in FORBIDDEN_TRANSITIONS
+    ]
+    becomes_active = new_status in ACTIVE_STATUSES
+    ids = list(dict.fromkeys(appointment_ids))
+
+    with transaction.atomic():
+        rows = Appointment.objects.select_for_update().filter(pk__in=ids)
+        if doctor is not None:
+            rows = rows.filter(doctor=doctor)
+        current = dict(rows.values_list('id', 'status'))
+
+        outcomes = {}
+        fast, reactivated = [], []
+        for pk in ids:
+            status = current.get(pk)
+            if status is None:
+                outcomes[pk] = {'id': pk, 'result': 'not_found'}
+            elif status == new_status:
+                outcomes[pk] = {'id': pk, 'result': 'unchanged'}
+            elif status not in allowed_from:
+                outcomes[pk] = {'id': pk, 'result': 'rejected', 'error': FORBIDDEN_TRANSITIONS[(status, new_status)]}
+            elif becomes_active and status not in ACTIVE_STATUSES:
+                reactivated.append(pk)
+            else:
+                fast.append(pk)
+
+        if fast:
+            Appointment.objects.filter(pk__in=fast, status__in=allowed_from).update(
+                status=new_status, updated_at=timezone.now()
+            )
+            if not becomes_active:
+                AppointmentSlot.objects.filter(appointment_id__in=fast).update(status='free', appointment=None)
+            for pk in fast:
+                outcomes[pk] = {'id': pk, 'result': 'updated'}
+
+        for pk in reactivated:
+            try:
+                change_status(pk, new_status)
+            except (InvalidTransition, SlotUnavailable) as e:
+                outcomes[pk] = {'id': pk, 'result': 'rejected', 'error': str(e)}
+            else:
+                outcomes[pk] = {'id': pk, 'result': 'updated'}
+
+    return [outcomes[pk] for pk in ids]
+
+
+def calendar_range(day, view='day'):
+    """
+    (first, last) date shown by a ``view`` ('day' or 'week', Monday first)
+    containing ``day``; the week of date.max stops at date.max
+    """
+    if view == 'week':
+        first = day - timedelta(days=day.weekday())
+        return first, add_days(first, 6)
+    return day, day
+
+
+def doctor_calendar(doctor, start_date, end_date, statuses=None):
+    """
+    Appointment rows of ``doctor`` between the dates, in time order, as
+    dicts with just what a calendar needs; one query on the
+    appointments_doctor_calendar index, independent of history size
+    """
+    appointments = Appointment.objects.filter(
+        doctor=doctor, appointment_date__gte=start_date, appointment_date__lte=end_date
+    )
+    if statuses:
+        appointments = appointments.filter(status__in=statuses)
+    return appointments.order_by('appointment_date', 'appointment_time').values(
+        'id', 'appointment_date', 'appointment_time', 'status',
+        'patient__user__first_name', 'patient__user__last_name', 'patient__user__username',
+    )
+
+
+def status_counts(appointments):
+    """
+    Total and per-status counts of the ``appointments`` queryset, computed
+    by the database in one conditional-aggregate query
+    """
+    return appointments.aggregate(
+        total=Count('id'),
+        **{status: Count('id', filter=Q(status=status)) for status in VALID_STATUSES},
+    )
@@ -1,8 +1,25 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.cache import cache
+from django.core.management import call_command
 from django.utils import timezone
+from django.apps import apps as django_apps
 from django.contrib.auth import get_user_model
 from datetime import date, time, timedelta
-from .models import Appointment
+from importlib import import_module
+from io import StringIO
+import smtplib
+from unittest import mock
+from .models import Appointment, AppointmentSlot, DoctorSchedule
+from .directory import DIRECTORY_LOCAL_CACHE_TIMEOUT, directory_cache_timeout, directory_version, doctor_directory
+from .forms import AppointmentForm
+from .reminders import send_reminders
+from .services import SLOT_TAKEN_MESSAGE, SlotUnavailable, bulk_change_status, change_status, generate_slots, reserve_appointment
+from django.db import IntegrityError, transaction
+from django.core.exceptions import ValidationError
 from users.models import Patient, Doctor
 
 User = get_user_model()
@@ -275,4 +292,683 @@ class ModelTests(TestCase):
         str_repr = str(appointment)
         self.assertIn('2025-12-25', str_repr)
         self.assertIn('10:00', str_repr)
-        print("✅ Test 10 passed: Model string representation works")
\ No newline at end of file
+        print("✅ Test 10 passed: Model string representation works")
+
+
+class AppointmentSlotTests(TestCase):
+    """Test schedule-based slots and atomic booking"""
+
+    def setUp(self):
+        patient_user = User.objects.create_user(username='slotpatient', password='testpass123', user_type='patient')
+        self.patient = Patient.objects.create(user=patient_user)
+        doctor_user = User.objects.create_user(username='slotdoctor', password='testpass123', user_type='doctor')
+        self.doctor = Doctor.objects.create(user=doctor_user, specialization='Cardiology', license_number='SLOT1')
+
+        # Next week's day, 09:00-11:00 in 30 minute slots
+        self.day = timezone.localdate() + timedelta(days=7)
+        DoctorSchedule.objects.create(
+            doctor=self.doctor, weekday=self.day.weekday(),
+            start_time=time(9, 0), end_time=time(11, 0), slot_minutes=30
+        )
+        generate_slots(self.day, self.day)
+        self.client.login(username='slotpatient', password='testpass123')
+
+    def _book(self, at):
+        return self.client.post('/appointments/book/', {
+            'doctor': self.doctor.id,
+            'appointment_date': self.day,
+            'appointment_time': at,
+            'reason': 'Checkup'
+        })
+
+    def test_slots_generated_once(self):
+        """Test that slots follow the schedule and regeneration adds none"""
+        self.assertEqual(AppointmentSlot.objects.filter(doctor=self.doctor).count(), 4)
+        generate_slots(self.day, self.day)
+        self.assertEqual(AppointmentSlot.objects.filter(doctor=self.doctor).count(), 4)
+        print("✅ Slots generated from schedule")
+
+    def test_invalid_schedules_rejected(self):
+        """Test that 0-minute slots and empty working hours are refused"""
+        schedule = DoctorSchedule(doctor=self.doctor, weekday=0, start_time=time(9, 0), end_time=time(10, 0), slot_minutes=0)
+        with self.assertRaises(ValidationError):
+            schedule.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            schedule.save()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DoctorSchedule.objects.create(doctor=self.doctor, weekday=0, start_time=time(10, 0), end_time=time(9, 0))
+        print("✅ Invalid schedules rejected")
+
+    def test_overlapping_booking_rejected(self):
+        """Test that 10:05 can't be booked next to a 10:00 booking"""
+        self._book(time(10, 0))
+        self._book(time(10, 5))
+
+        appointments = Appointment.objects.filter(doctor=self.doctor)
+        self.assertEqual(appointments.count(), 1)
+        self.assertEqual(appointments.get().slot.status, 'booked')
+        print("✅ Overlapping booking rejected")
+
+    def test_schedule_respects_earlier_bookings(self):
+        """Test that a slot over a booking made before the schedule is created booked"""
+        later = self.day + timedelta(days=7)
+        earlier = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, reason='Checkup',
+            appointment_date=later, appointment_time=time(10, 5)
+        )
+        generate_slots(later, later)
+
+        slot = AppointmentSlot.objects.get(doctor=self.doctor, date=later, start_time=time(10, 0))
+        self.assertEqual((slot.status, slot.appointment), ('booked', earlier))
+        appointment = Appointment(
+            patient=self.patient, doctor=self.doctor, appointment_date=later,
+            appointment_time=time(10, 15), reason='Checkup'
+        )
+        with self.assertRaises(SlotUnavailable):
+            reserve_appointment(appointment)
+        print("✅ Slots respect earlier bookings")
+
+    def test_started_slot_rejected(self):
+        """Test that booking into a slot that already started is refused"""
+        doctor_user = User.objects.create_user(username='todaydoctor', password='testpass123', user_type='doctor')
+        doctor = Doctor.objects.create(user=doctor_user, specialization='Cardiology', license_number='SLOT2')
+        now = timezone.localtime()
+        DoctorSchedule.objects.create(
+            doctor=doctor, weekday=now.weekday(), start_time=time(0, 0), end_time=time(23, 59), slot_minutes=1439
+        )
+        generate_slots(now.date(), now.date())
+
+        appointment = Appointment(
+            patient=self.patient, doctor=doctor, appointment_date=now.date(),
+            appointment_time=now.time(), reason='Checkup'
+        )
+        with self.assertRaises(SlotUnavailable):
+            reserve_appointment(appointment)
+        self.assertFalse(Appointment.objects.filter(doctor=doctor).exists())
+        print("✅ Started slot rejected")
+
+    def test_deleted_appointment_frees_slot(self):
+        """Test that deleting a booked appointment lets the time be booked again"""
+        def book():
+            return reserve_appointment(Appointment(
+                patient=self.patient, doctor=self.doctor, appointment_date=self.day,
+                appointment_time=time(9, 0), reason='Checkup'
+            ))
+
+        book().delete()
+        slot = AppointmentSlot.objects.get(doctor=self.doctor, date=self.day, start_time=time(9, 0))
+        self.assertEqual((slot.status, slot.appointment), ('free', None))
+
+        Appointment.objects.filter(pk=book().pk).delete()
+        book()
+        print("✅ Deleted appointment frees its slot")
+
+    def test_time_outside_schedule_rejected(self):
+        """Test that scheduled doctors can only be booked within a slot"""
+        appointment = Appointment(
+            patient=self.patient, doctor=self.doctor, appointment_date=self.day,
+            appointment_time=time(14, 0), reason='Checkup'
+        )
+        with self.assertRaises(SlotUnavailable):
+            reserve_appointment(appointment)
+        self.assertFalse(Appointment.objects.exists())
+        print("✅ Time outside schedule rejected")
+
+    def test_free_slots_api(self):
+        """Test that the API lists only free slots in one query"""
+        self._book(time(9, 40))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/appointments/api/slots/', {
+                'doctor': self.doctor.id, 'start': self.day, 'end': self.day
+            })
+        slot_queries = [q for q in queries if 'appointments_appointmentslot' in q['sql']]
+        self.assertEqual(len(slot_queries), 1)
+        starts = [slot['start'] for slot in response.json()['slots']]
+        self.assertEqual(starts, ['09:00', '10:00', '10:30'])
+        print("✅ Free slots API")
+
+    def test_free_slots_range_stops_at_last_date(self):
+        """Test that a range near the end of the calendar is clamped instead of overflowing"""
+        response = self.client.get('/appointments/api/slots/', {'doctor': self.doctor.id, 'start': '9999-12-30'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['end'], '9999-12-31')
+        print("✅ Free slots range clamped")
+
+    def test_cancel_frees_slot(self):
+        """Test that cancelling an appointment makes its slot bookable again"""
+        self._book(time(9, 0))
+        appointment = Appointment.objects.get()
+
+        self.client.login(username='slotdoctor', password='testpass123')
+        self.client.post(f'/appointments/update/{appointment.id}/', {'status': 'cancelled'})
+
+        slot = AppointmentSlot.objects.get(doctor=self.doctor, start_time=time(9, 0))
+        self.assertEqual(slot.status, 'free')
+        self.assertIsNone(slot.appointment)
+        print("✅ Cancelling frees the slot")
+
+
+class BookingConstraintTests(TestCase):
+    """Test that the database prevents double booking"""
+
+    def setUp(self):
+        patient_user = User.objects.create_user(username='racepatient', password='testpass123', user_type='patient')
+        self.patient = Patient.objects.create(user=patient_user)
+        doctor_user = User.objects.create_user(username='racedoctor', password='testpass123', user_type='doctor')
+        self.doctor = Doctor.objects.create(user=doctor_user, specialization='Dermatology', license_number='RACE1')
+        self.day = timezone.localdate() + timedelta(days=3)
+
+    def _appointment(self, **kwargs):
+        fields = dict(
+            patient=self.patient, doctor=self.doctor, appointment_date=self.day,
+            appointment_time=time(11, 0), reason='Rash'
+        )
+        fields.update(kwargs)
+        return Appointment(**fields)
+
+    def test_constraint_blocks_second_active_booking(self):
+        """Test that a racing insert past the app checks still fails"""
+        self._appointment().save()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._appointment().save()
+
+        # Cancelled appointments don't hold the time
+        self._appointment(status='cancelled').save()
+        print("✅ Constraint blocks double booking")
+
+    def test_migration_stops_on_double_bookings(self):
+        """Test that the constraint migration lists clashing ids instead of cancelling bookings"""
+        migration = import_module('appointments.migrations.0004_unique_active_booking')
+        rows = [
+            self._appointment(pk=pk, appointment_time=at, doctor_id=doctor)
+            for pk, at, doctor in [(1, time(9, 0), 1), (2, time(10, 0), 1), (3, time(9, 0), 1), (4, time(9, 0), 2)]
+        ]
+        self.assertEqual(migration.double_bookings(rows), [[1, 3]])
+
+        booking = reserve_appointment(self._appointment())
+        migration.check_double_bookings(django_apps, None)
+        with mock.patch.object(migration, 'double_bookings', return_value=[[booking.pk, 99]]):
+            with self.assertRaisesMessage(RuntimeError, f'{booking.pk}, 99'):
+                migration.check_double_bookings(django_apps, None)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'pending')
+        print("✅ Double bookings block the migration")
+
+    def test_service_reports_clash(self):
+        """Test that the booking service turns the clash into SlotUnavailable"""
+        reserve_appointment(self._appointment())
+        with self.assertRaises(SlotUnavailable):
+            reserve_appointment(self._appointment())
+        self.assertEqual(Appointment.objects.count(), 1)
+        print("✅ Booking service reports clash")
+
+    def test_reactivation_respects_new_booking(self):
+        """Test that a cancelled appointment can't come back over a newer booking"""
+        first = reserve_appointment(self._appointment())
+        change_status(first.id, 'cancelled')
+        reserve_appointment(self._appointment())
+
+        with self.assertRaises(SlotUnavailable):
+            change_status(first.id, 'pending')
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'cancelled')
+        print("✅ Reactivation respects newer booking")
+
+
+class DoctorCalendarTests(TestCase):
+    """Test the doctor calendar API"""
+
+    def setUp(self):
+        patient_user = User.objects.create_user(
+            username='calpatient', password='testpass123', user_type='patient', first_name='Ada', last_name='Lovelace'
+        )
+        self.patient = Patient.objects.create(user=patient_user)
+        doctor_user = User.objects.create_user(username='caldoctor', password='testpass123', user_type='doctor')
+        self.doctor = Doctor.objects.create(user=doctor_user, specialization='Neurology', license_number='CAL1')
+
+        # A Wednesday, with history before it and a booking later that week
+        self.day = date(2030, 1, 9)
+        for days_back in range(1, 40):
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor, reason='Old',
+                appointment_date=self.day - timedelta(days=days_back), appointment_time=time(9, 0), status='completed'
+            )
+        for at, status in [(time(14, 0), 'confirmed'), (time(9, 30), 'pending'), (time(10, 0), 'cancelled')]:
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor, reason='Today',
+                appointment_date=self.day, appointment_time=at, status=status
+            )
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, reason='Friday',
+            appointment_date=self.day + timedelta(days=2), appointment_time=time(8, 0)
+        )
+        self.client.login(username='caldoctor', password='testpass123')
+
+    def test_day_view(self):
+        """Test that the day view lists that day's appointments in time order"""
+        data = self.client.get('/appointments/api/calendar/', {'date': '2030-01-09'}).json()
+
+        self.assertEqual([a['time'] for a in data['appointments']], ['09:30', '10:00', '14:00'])
+        self.assertEqual(data['appointments'][0]['patient'], 'Ada Lovelace')
+        print("✅ Calendar day view")
+
+    def test_week_view_and_status_filter(self):
+        """Test the Monday-Sunday week and filtering by status"""
+        data = self.client.get('/appointments/api/calendar/', {
+            'date': '2030-01-09', 'view': 'week', 'status': ['pending', 'confirmed']
+        }).json()
+
+        self.assertEqual((data['start'], data['end']), ('2030-01-07', '2030-01-13'))
+        # Monday and Tuesday hold completed history, filtered out
+        self.assertEqual([a['date'] for a in data['appointments']], ['2030-01-09', '2030-01-09', '2030-01-11'])
+        print("✅ Calendar week view")
+
+    def test_last_week_of_calendar(self):
+        """Test that the week containing date.max ends there instead of overflowing"""
+        response = self.client.get('/appointments/api/calendar/', {'date': '9999-12-31', 'view': 'week'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['start'], response.json()['end']), ('9999-12-27', '9999-12-31'))
+        print("✅ Last calendar week clamped")
+
+    def test_calendar_is_one_query(self):
+        """Test that the calendar costs a single appointment query"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/appointments/api/calendar/', {'date': '2030-01-09'})
+        calendar_queries = [q for q in queries if 'FROM "appointments_appointment"' in q['sql']]
+        self.assertEqual(len(calendar_queries), 1)
+        print("✅ Calendar is one query")
+
+    def test_patients_have_no_calendar(self):
+        """Test that only doctors can use the calendar"""
+        self.client.login(username='calpatient', password='testpass123')
+        response = self.client.get('/appointments/api/calendar/')
+        self.assertEqual(response.status_code, 403)
+        print("✅ Calendar limited to doctors")
+
+
+class AppointmentListTests(TestCase):
+    """Test the paginated appointment list and its status counters"""
+
+    def setUp(self):
+        patient_user = User.objects.create_user(username='listpatient', password='testpass123', user_type='patient')
+        self.patient = Patient.objects.create(user=patient_user)
+        doctor_user = User.objects.create_user(username='listdoctor', password='testpass123', user_type='doctor')
+        self.doctor = Doctor.objects.create(user=doctor_user, specialization='Dermatology', license_number='LIST1')
+
+        statuses = ['pending'] * 5 + ['confirmed'] * 10 + ['completed'] * 8 + ['cancelled'] * 2
+        first_day = date(2030, 3, 1)
+        for i, status in enumerate(statuses):
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor, reason='Checkup',
+                appointment_date=first_day + timedelta(days=i), appointment_time=time(10, 0), status=status
+            )
+
+    def test_status_counts(self):
+        """Test that the summary cards get counts for every status"""
+        self.client.login(username='listpatient', password='testpass123')
+        counts = self.client.get('/appointments/my/').context['counts']
+
+        self.assertEqual(counts, {'total': 25, 'pending': 5, 'confirmed': 10, 'completed': 8, 'cancelled': 2})
+        print("✅ Status counts aggregated")
+
+    def test_pages_cover_every_appointment_once(self):
+        """Test that following the cursors walks the whole list, newest first"""
+        self.client.login(username='listdoctor', password='testpass123')
+        seen = []
+        url = '/appointments/my/'
+        while url:
+            response = self.client.get(url)
+            page = list(response.context['appointments'])
+            self.assertLessEqual(len(page), 20)
+            seen.extend(page)
+            cursor = response.context['next_cursor']
+            url = f'/appointments/my/?cursor={cursor}' if cursor else None
+
+        self.assertEqual(len(seen), 25)
+        dates = [a.appointment_date for a in seen]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        print("✅ Appointment list paginated")
+
+    def test_list_queries(self):
+        """Test that counts and a page cost one query each, regardless of list size"""
+        self.client.login(username='listpatient', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/appointments/my/')
+        list_queries = [q for q in queries if 'FROM "appointments_appointment"' in q['sql']]
+        self.assertEqual(len(list_queries), 2)
+        print("✅ Appointment list is two queries")
+
+    def test_invalid_cursor_redirects(self):
+        """Test that a malformed cursor goes back to the first page"""
+        self.client.login(username='listpatient', password='testpass123')
+        response = self.client.get('/appointments/my/?cursor=garbage')
+        self.assertRedirects(response, '/appointments/my/')
+        print("✅ Invalid cursor handled")
+
+
+class RefusingEmailBackend(locmem.EmailBackend):
+    """Email backend whose server refuses one address"""
+
+    def send_messages(self, messages):
+        if any('refused@example.com' in message.to for message in messages):
+            raise smtplib.SMTPRecipientsRefused({'refused@example.com': (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+class DroppingEmailBackend(RefusingEmailBackend):
+    """Email backend that can't reconnect once the server has refused a message"""
+
+    dropped = False
+
+    def open(self):
+        if self.dropped:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().open()
+
+    def send_messages(self, messages):
+        try:
+            return super().send_messages(messages)
+        except smtplib.SMTPRecipientsRefused:
+            self.dropped = True
+            raise
+
+
+class ReminderTests(TestCase):
+    """Test the batched appointment reminders"""
+
+    def setUp(self):
+        patient_user = User.objects.create_user(
+            username='remindpatient', password='testpass123', user_type='patient',
+            first_name='Grace', email='grace@example.com'
+        )
+        self.patient = Patient.objects.create(user=patient_user)
+        doctor_user = User.objects.create_user(
+            username='reminddoctor', password='testpass123', user_type='doctor', last_name='House'
+        )
+        self.doctor = Doctor.objects.create(user=doctor_user, specialization='Diagnostics', license_number='REM1')
+        self.now = timezone.localtime().replace(hour=20, minute=0, second=0, microsecond=0)
+        self.tomorrow = self.now.date() + timedelta(days=1)
+
+    def book(self, day, at, status='pending', patient=None):
+        return Appointment.objects.create(
+            patient=patient or self.patient, doctor=self.doctor, reason='Follow-up',
+            appointment_date=day, appointment_time=at, status=status
+        )
+
+    def test_reminds_only_due_appointments(self):
+        """Test that only active appointments inside the window are reminded"""
+        due = self.book(self.tomorrow, time(9, 0))
+        self.book(self.tomorrow, time(10, 0), status='cancelled')
+        self.book(self.tomorrow, time(21, 0))  # past the 24h window
+        self.book(self.now.date(), time(8, 0))  # already started
+
+        sent, skipped, failed = send_reminders(hours=24, now=self.now)
+
+        self.assertEqual((sent, skipped, failed), (1, 0, 0))
+        self.assertEqual(mail.outbox[0].to, ['grace@example.com'])
+        self.assertIn('Dr. House', mail.outbox[0].subject)
+        self.assertIn('Hello Grace', mail.outbox[0].body)
+        due.refresh_from_db()
+        self.assertIsNotNone(due.reminder_sent_at)
+        print("✅ Due appointments reminded")
+
+    def test_rerun_is_idempotent(self):
+        """Test that a second run sends nothing new"""
+        for hour in range(8, 18):
+            self.book(self.tomorrow, time(hour, 0))
+
+        self.assertEqual(send_reminders(hours=24, batch_size=3, now=self.now), (10, 0, 0))
+        self.assertEqual(send_reminders(hours=24, batch_size=3, now=self.now), (0, 0, 0))
+        self.assertEqual(len(mail.outbox), 10)
+        print("✅ Reminder reruns idempotent")
+
+    def test_patients_without_email_are_skipped(self):
+        """Test that appointments of patients without an email are skipped, not failed"""
+        no_email = Patient.objects.create(
+            user=User.objects.create_user(username='noemail', password='testpass123', user_type='patient')
+        )
+        self.book(self.tomorrow, time(9, 0), patient=no_email)
+        self.book(self.tomorrow, time(10, 0))
+
+        self.assertEqual(send_reminders(hours=24, now=self.now), (1, 1, 0))
+        print("✅ Patients without email skipped")
+
+    @override_settings(EMAIL_BACKEND='appointments.tests.RefusingEmailBackend')
+    def test_refused_message_doesnt_block_the_rest(self):
+        """Test that one refused address is retried later without resending or stopping the others"""
+        refused = Patient.objects.create(user=User.objects.create_user(
+            username='refused', password='testpass123', user_type='patient', email='refused@example.com'
+        ))
+        self.book(self.tomorrow, time(9, 0))
+        bad = self.book(self.tomorrow, time(10, 0), patient=refused)
+        self.book(self.tomorrow, time(11, 0))
+
+        self.assertEqual(send_reminders(hours=24, batch_size=2, now=self.now), (2, 0, 1))
+        self.assertEqual(send_reminders(hours=24, batch_size=2, now=self.now), (0, 0, 1))
+
+        self.assertEqual(len(mail.outbox), 2)
+        bad.refresh_from_db()
+        self.assertIsNone(bad.reminder_sent_at)
+        print("✅ Refused reminders skipped and retried")
+
+    @override_settings(EMAIL_BACKEND='appointments.tests.DroppingEmailBackend')
+    def test_delivered_marked_when_reconnect_fails(self):
+        """Test that messages sent before a failed reconnect aren't sent again"""
+        refused = Patient.objects.create(user=User.objects.create_user(
+            username='dropped', password='testpass123', user_type='patient', email='refused@example.com'
+        ))
+        first = self.book(self.tomorrow, time(9, 0))
+        self.book(self.tomorrow, time(10, 0), patient=refused)
+        last = self.book(self.tomorrow, time(11, 0))
+
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            send_reminders(hours=24, now=self.now)
+
+        first.refresh_from_db()
+        last.refresh_from_db()
+        self.assertIsNotNone(first.reminder_sent_at)
+        self.assertIsNone(last.reminder_sent_at)
+        print("✅ Delivered reminders marked despite a failed reconnect")
+
+    def test_dry_run_command(self):
+        """Test that --dry-run reports without sending or marking"""
+        appointment = self.book(timezone.localdate() + timedelta(days=1), time(23, 59))
+        out = StringIO()
+
+        call_command('send_reminders', '--dry-run', '--hours', '48', stdout=out)
+
+        self.assertIn('Would send 1 reminder(s)', out.getvalue())
+        self.assertEqual(len(mail.outbox), 0)
+        appointment.refresh_from_db()
+        self.assertIsNone(appointment.reminder_sent_at)
+        print("✅ Reminder dry run")
+
+
+class BulkStatusTests(TestCase):
+    """Test bulk status transitions"""
+
+    def setUp(self):
+        patient_user = User.objects.create_user(username='bulkpatient', password='testpass123', user_type='patient')
+        self.patient = Patient.objects.create(user=patient_user)
+        doctor_user = User.objects.create_user(username='bulkdoctor', password='testpass123', user_type='doctor')
+        self.doctor = Doctor.objects.create(user=doctor_user, specialization='Surgery', license_number='BULK1')
+        other_user = User.objects.create_user(username='otherdoctor', password='testpass123', user_type='doctor')
+        self.other_doctor = Doctor.objects.create(user=other_user, specialization='Surgery', license_number='BULK2')
+        self.day = date(2030, 5, 6)
+
+    def book(self, hour, status='pending', doctor=None):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=doctor or self.doctor, reason='Visit',
+            appointment_date=self.day, appointment_time=time(hour, 0), status=status
+        )
+
+    def test_end_of_day_in_one_update(self):
+        """Test that allowed rows change in a single UPDATE and rule breakers are reported"""
+        visits = [self.book(hour, 'confirmed') for hour in range(8, 16)]
+        cancelled = self.book(16, 'cancelled')
+        ids = [a.id for a in visits] + [cancelled.id]
+
+        with CaptureQueriesContext(connection) as queries:
+            results = bulk_change_status(ids, 'completed')
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "appointments_appointment"')]
+
+        self.assertEqual(len(updates), 1)
+        self.assertEqual([r['result'] for r in results], ['updated'] * 8 + ['updated'])
+        self.assertEqual(Appointment.objects.filter(status='completed').count(), 9)
+
+        results = bulk_change_status(ids, 'cancelled')
+        self.assertTrue(all(r['result'] == 'rejected' for r in results))
+        self.assertEqual(results[0]['error'], 'Cannot cancel a completed appointment.')
+        print("✅ Bulk completion in one update")
+
+    def test_reactivation_respects_bookings(self):
+        """Test that reviving a cancelled visit can't double-book its time"""
+        old = self.book(9, 'cancelled')
+        self.book(9, 'pending')
+        free = self.book(10, 'cancelled')
+
+        results = bulk_change_status([old.id, free.id], 'pending')
+
+        self.assertEqual([r['result'] for r in results], ['rejected', 'updated'])
+        self.assertEqual(results[0]['error'], SLOT_TAKEN_MESSAGE)
+        print("✅ Bulk reactivation checks clashes")
+
+    def test_endpoint_limited_to_own_appointments(self):
+        """Test the JSON endpoint only touches the doctor's own appointments"""
+        mine = self.book(9)
+        theirs = self.book(9, doctor=self.other_doctor)
+        self.client.login(username='bulkdoctor', password='testpass123')
+
+        response = self.client.post(
+            '/appointments/api/bulk-status/',
+            data={'ids': [mine.id, theirs.id, 99999], 'status': 'confirmed'},
+            content_type='application/json',
+        )
+        data = response.json()
+
+        self.assertEqual(data['updated'], 1)
+        self.assertEqual([r['result'] for r in data['results']], ['updated', 'not_found', 'not_found'])
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.status, 'pending')
+        print("✅ Bulk endpoint scoped to doctor")
+
+    def test_endpoint_validation(self):
+        """Test bad statuses, bad ids and non-doctors are refused"""
+        self.client.login(username='bulkdoctor', password='testpass123')
+        url = '/appointments/api/bulk-status/'
+        bad_status = self.client.post(url, data={'ids': [1], 'status': 'done'}, content_type='application/json')
+        bad_ids = self.client.post(url, data={'ids': 'all', 'status': 'completed'}, content_type='application/json')
+        bool_ids = self.client.post(url, data={'ids': [True], 'status': 'completed'}, content_type='application/json')
+        self.assertEqual((bad_status.status_code, bad_ids.status_code, bool_ids.status_code), (400, 400, 400))
+
+        self.client.login(username='bulkpatient', password='testpass123')
+        response = self.client.post(url, data={'ids': [1], 'status': 'completed'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        print("✅ Bulk endpoint validation")
+
+    def test_admin_action(self):
+        """Test the admin action uses the same transition rules"""
+        pending = self.book(9)
+        completed = self.book(10, 'completed')
+        User.objects.create_superuser(username='bulkadmin', password='testpass123', email='admin@example.com')
+        self.client.login(username='bulkadmin', password='testpass123')
+
+        self.client.post('/admin/appointments/appointment/', {
+            'action': 'mark_cancelled', '_selected_action': [pending.id, completed.id],
+        })
+
+        pending.refresh_from_db()
+        completed.refresh_from_db()
+        self.assertEqual((pending.status, completed.status), ('cancelled', 'completed'))
+        print("✅ Bulk admin action")
+
+    def test_admin_change_form_leaves_status_alone(self):
+        """Test that the change form can't set status around the transition rules"""
+        visit = self.book(9)
+        User.objects.create_superuser(username='formadmin', password='testpass123', email='admin@example.com')
+        self.client.login(username='formadmin', password='testpass123')
+
+        response = self.client.post(f'/admin/appointments/appointment/{visit.id}/change/', {
+            'patient': self.patient.id, 'doctor': self.doctor.id, 'appointment_date': '2030-05-06',
+            'appointment_time': '09:00', 'reason': 'Visit', 'status': 'completed', 'notes': 'Seen',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        visit.refresh_from_db()
+        self.assertEqual((visit.status, visit.notes), ('pending', 'Seen'))
+        print("✅ Admin change form leaves status alone")
+
+
+class DoctorDirectoryTests(TestCase):
+    """Test the cached doctor directory and search API"""
+
+    def setUp(self):
+        cache.clear()
+        for i, specialization in enumerate(['Cardiology'] * 3 + ['Pediatrics'] * 2):
+            user = User.objects.create_user(
+                username=f'dirdoctor{i}', password='testpass123', user_type='doctor',
+                first_name='Doc', last_name=f'Number{i}'
+            )
+            Doctor.objects.create(user=user, specialization=specialization, license_number=f'DIR{i}')
+
+    def test_booking_form_uses_cached_directory(self):
+        """Test that rendering the doctor select doesn't query per doctor"""
+        doctor_directory()  # warm the cache
+        with CaptureQueriesContext(connection) as queries:
+            html = str(AppointmentForm()['doctor'])
+
+        self.assertEqual(len(queries), 0)
+        self.assertIn('Dr. Doc Number0 - Cardiology', html)
+        self.assertIn('Select a Doctor', html)
+        print("✅ Booking form served from directory cache")
+
+    def test_search_api(self):
+        """Test searching by name and filtering by specialization"""
+        self.client.login(username='dirdoctor0', password='testpass123')
+        data = self.client.get('/appointments/api/doctors/', {'specialization': 'pediatrics'}).json()
+        self.assertEqual([d['name'] for d in data['doctors']], ['Doc Number3', 'Doc Number4'])
+
+        data = self.client.get('/appointments/api/doctors/', {'q': 'number1'}).json()
+        self.assertEqual(data['doctors'][0]['label'], 'Dr. Doc Number1 - Cardiology')
+        print("✅ Doctor search API")
+
+    def test_search_requires_login(self):
+        """Test that the directory isn't public"""
+        response = self.client.get('/appointments/api/doctors/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/users/login/', response.url)
+        print("✅ Doctor search requires login")
+
+    def test_local_cache_entries_expire_sooner(self):
+        """Test that per-process caches hold the directory only briefly"""
+        self.assertEqual(directory_cache_timeout(), DIRECTORY_LOCAL_CACHE_TIMEOUT)
+        print("✅ Local directory cache expires sooner")
+
+    def test_changes_invalidate_directory(self):
+        """Test that doctor and user changes show up, but logins don't rebuild it"""
+        doctor = Doctor.objects.get(license_number='DIR0')
+        doctor.specialization = 'Neurology'
+        doctor.save()
+        self.assertIn('Neurology', [d['specialization'] for d in doctor_directory()])
+
+        doctor.user.last_name = 'Renamed'
+        doctor.user.save()
+        self.assertIn('Doc Renamed', [d['name'] for d in doctor_directory()])
+
+        version = directory_version()
+        self.client.login(username='dirdoctor0', password='testpass123')
+        self.assertEqual(directory_version(), version)
+        print("✅ Directory invalidated on change")
+
+    def test_large_directory_renders_only_selection(self):
+        """Test that past the select limit only the chosen doctor is rendered"""
+        chosen = Doctor.objects.get(license_number='DIR2')
+        with mock.patch('appointments.forms.DOCTOR_SELECT_LIMIT', 2):
+            form = AppointmentForm(data={'doctor': chosen.id})
+
+        self.assertEqual([value for value, label in form.fields['doctor'].choices], ['', chosen.id])
+        print("✅ Large directory keeps the select small")
+
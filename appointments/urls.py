@@ -8,4 +8,8 @@ urlpatterns = [
     path('my/', views.my_appointments, name='my_appointments'),
     path('success/<int:appointment_id>/', views.appointment_success, name='success'),
     path('update/<int:appointment_id>/', views.update_appointment, name='update'),  # ADD THIS LINE
+    path('api/slots/', views.available_slots, name='available_slots'),
+    path('api/doctors/', views.doctor_search, name='doctor_search'),
+    path('api/calendar/', views.doctor_calendar_api, name='calendar'),
+    path('api/bulk-status/', views.bulk_update_status, name='bulk_status'),
 ]
\ No newline at end of file
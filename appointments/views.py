@@ -1,28 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+import json
+from core.pagination import paginate_keyset, InvalidCursor
 from .models import Appointment
 from .forms import AppointmentForm
-from users.models import Patient
+from .directory import MAX_SEARCH_RESULTS, doctor_label, search_doctors
+from .services import (
+    CALENDAR_VIEWS, LIST_ORDERING, MAX_BULK_STATUS, MAX_SLOT_RANGE_DAYS, InvalidTransition, SlotUnavailable,
+    add_days, bulk_change_status, calendar_range, change_status, doctor_calendar, free_slots, reserve_appointment, status_counts, VALID_STATUSES,
+)
+from users.models import Patient, Doctor
 
-# ✅ NEW: Helper function to check appointment conflicts
-def check_appointment_conflict(doctor, appointment_date, appointment_time, exclude_id=None):
-    """
-    Check if doctor already has an appointment at this date/time
-    """
-    conflicts = Appointment.objects.filter(
-        doctor=doctor,
-        appointment_date=appointment_date,
-        appointment_time=appointment_time,
-        status__in=['pending', 'confirmed']  # Only check active appointments
-    )
-    
-    # If updating an appointment, exclude it from conflict check
-    if exclude_id:
-        conflicts = conflicts.exclude(id=exclude_id)
-    
-    return conflicts.exists()
+LIST_PAGE_SIZE = 20
 
 @login_required
 def book_appointment(request):
@@ -49,16 +43,13 @@ def book_appointment(request):
                     messages.error(request, 'Cannot book appointments in the past. Please select a future time.')
                     return render(request, 'appointments/book.html', {'form': form})
             
-            # ✅ NEW: Check for appointment conflicts
-            if check_appointment_conflict(appointment.doctor, appointment.appointment_date, appointment.appointment_time):
-                messages.error(
-                    request, 
-                    f'This time slot is already booked. Please choose another time or doctor.'
-                )
+            # ✅ NEW: Claim the doctor's slot atomically (no check-then-insert race)
+            try:
+                reserve_appointment(appointment)
+            except SlotUnavailable as e:
+                messages.error(request, str(e))
                 return render(request, 'appointments/book.html', {'form': form})
             
-            # All validations passed - save the appointment
-            appointment.save()
             messages.success(request, 'Appointment booked successfully!')
             return redirect('appointments:success', appointment_id=appointment.id)
     else:
@@ -68,7 +59,7 @@ def book_appointment(request):
 
 @login_required
 def my_appointments(request):
-    """View user's appointments"""
+    """View user's appointments, one page at a time"""
     if hasattr(request.user, 'patient'):
         # ✅ IMPROVED: Use select_related to avoid N+1 queries
         appointments = Appointment.objects.filter(
@@ -80,9 +71,29 @@ def my_appointments(request):
             doctor=request.user.doctor
         ).select_related('patient__user')
     else:
-        appointments = []
+        appointments = Appointment.objects.none()
+    
+    # Summary cards come from one aggregate query, not the loaded list
+    counts = status_counts(appointments)
     
-    return render(request, 'appointments/list.html', {'appointments': appointments})
+    # Keyset pagination: newest first, continue after the cursor row
+    try:
+        page = paginate_keyset(
+            appointments,
+            LIST_ORDERING,
+            cursor=request.GET.get('cursor'),
+            page_size=LIST_PAGE_SIZE,
+        )
+    except InvalidCursor:
+        return redirect('appointments:my_appointments')
+    
+    context = {
+        'appointments': page,
+        'counts': counts,
+        'next_cursor': page.next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+    }
+    return render(request, 'appointments/list.html', context)
 
 @login_required
 def appointment_success(request, appointment_id):
@@ -115,30 +126,138 @@ def update_appointment(request, appointment_id):
         new_status = request.POST.get('status')
         notes = request.POST.get('notes', '')
         
-        # ✅ NEW: Validate status transitions
-        valid_statuses = ['pending', 'confirmed', 'completed', 'cancelled']
-        
-        if new_status not in valid_statuses:
-            messages.error(request, 'Invalid status selected.')
-            return render(request, 'appointments/update.html', {'appointment': appointment})
-        
-        # ✅ NEW: Business logic validation
-        # Can't confirm a cancelled appointment
-        if appointment.status == 'cancelled' and new_status == 'confirmed':
-            messages.error(request, 'Cannot confirm a cancelled appointment. Please create a new one.')
+        # ✅ NEW: Validate and apply the transition with the row locked
+        try:
+            appointment = change_status(appointment.id, new_status, notes)
+        except (InvalidTransition, SlotUnavailable) as e:
+            messages.error(request, str(e))
             return render(request, 'appointments/update.html', {'appointment': appointment})
         
-        # Can't cancel a completed appointment
-        if appointment.status == 'completed' and new_status == 'cancelled':
-            messages.error(request, 'Cannot cancel a completed appointment.')
-            return render(request, 'appointments/update.html', {'appointment': appointment})
-        
-        # Update the appointment
-        appointment.status = new_status
-        appointment.notes = notes
-        appointment.save()
-        
         messages.success(request, f'Appointment status updated to {appointment.get_status_display()}!')
         return redirect('appointments:my_appointments')
     
-    return render(request, 'appointments/update.html', {'appointment': appointment})
\ No newline at end of file
+    return render(request, 'appointments/update.html', {'appointment': appointment})
+
+@login_required
+def available_slots(request):
+    """
+    Free slots of a doctor as JSON
+    ?doctor=<id>&start=YYYY-MM-DD&end=YYYY-MM-DD (default: the next 7 days,
+    at most MAX_SLOT_RANGE_DAYS)
+    """
+    doctor_id = request.GET.get('doctor', '')
+    doctor = Doctor.objects.filter(pk=doctor_id).first() if doctor_id.isdigit() else None
+    if doctor is None:
+        return JsonResponse({'error': 'Unknown doctor'}, status=400)
+    
+    today = timezone.localdate()
+    try:
+        start = parse_date(request.GET.get('start') or '') or today
+        end = parse_date(request.GET.get('end') or '') or add_days(start, 6)
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+    start = max(start, today)
+    if end < start:
+        return JsonResponse({'error': 'end must not be before start'}, status=400)
+    end = min(end, add_days(start, MAX_SLOT_RANGE_DAYS - 1))
+    
+    slots = free_slots(doctor, start, end).values_list('date', 'start_time', 'end_time')
+    return JsonResponse({
+        'doctor': doctor.id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'slots': [
+            {'date': date.isoformat(), 'start': start_time.strftime('%H:%M'), 'end': end_time.strftime('%H:%M')}
+            for date, start_time, end_time in slots
+        ],
+    })
+
+@login_required
+def doctor_calendar_api(request):
+    """
+    The logged-in doctor's appointments for a day or week as JSON
+    ?date=YYYY-MM-DD (default today)&view=day|week&status=confirmed (repeatable)
+    """
+    if not hasattr(request.user, 'doctor'):
+        return JsonResponse({'error': 'Only doctors have a calendar.'}, status=403)
+    
+    view = request.GET.get('view', 'day')
+    statuses = request.GET.getlist('status')
+    if view not in CALENDAR_VIEWS or any(status not in VALID_STATUSES for status in statuses):
+        return JsonResponse({'error': 'Invalid view or status'}, status=400)
+    try:
+        day = parse_date(request.GET.get('date') or '') or timezone.localdate()
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+    
+    start, end = calendar_range(day, view)
+    rows = doctor_calendar(request.user.doctor, start, end, statuses)
+    return JsonResponse({
+        'view': view,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'appointments': [
+            {
+                'id': row['id'],
+                'date': row['appointment_date'].isoformat(),
+                'time': row['appointment_time'].strftime('%H:%M'),
+                'status': row['status'],
+                'patient': (
+                    f"{row['patient__user__first_name']} {row['patient__user__last_name']}".strip()
+                    or row['patient__user__username']
+                ),
+            }
+            for row in rows
+        ],
+    })
+
+@login_required
+@require_http_methods(["POST"])
+def bulk_update_status(request):
+    """
+    Move many of the logged-in doctor's appointments to one status
+    JSON body: {"ids": [1, 2, ...], "status": "completed"}
+    Answers with the outcome of every id (updated, unchanged, rejected, not_found)
+    """
+    if not hasattr(request.user, 'doctor'):
+        return JsonResponse({'error': 'Only doctors can update appointments.'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON format'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+    
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids or not all(type(pk) is int for pk in ids):
+        return JsonResponse({'error': 'ids must be a non-empty list of appointment ids'}, status=400)
+    if len(ids) > MAX_BULK_STATUS:
+        return JsonResponse({'error': f'Too many appointments. Please send at most {MAX_BULK_STATUS}.'}, status=400)
+    
+    try:
+        results = bulk_change_status(ids, data.get('status'), doctor=request.user.doctor)
+    except InvalidTransition as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'status': data['status'],
+        'updated': sum(1 for row in results if row['result'] == 'updated'),
+        'results': results,
+    })
+
+@login_required
+def doctor_search(request):
+    """
+    Doctors matching a search as JSON, from the cached directory
+    ?q=<name or specialization>&specialization=<exact specialization>
+    """
+    doctors = search_doctors(
+        request.GET.get('q', ''),
+        request.GET.get('specialization', ''),
+        limit=MAX_SEARCH_RESULTS,
+    )
+    return JsonResponse({
+        'doctors': [dict(doctor, label=doctor_label(doctor)) for doctor in doctors],
+    })
+
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import ChatJob, Conversation, Message
 
 class MessageInline(admin.TabularInline):
     model = Message
@@ -25,4 +25,11 @@ class MessageAdmin(admin.ModelAdmin):
     
     def content_preview(self, obj):
         return obj.content[:100] + "..." if len(obj.content) > 100 else obj.content
-    content_preview.short_description = 'Content'
\ No newline at end of file
+    content_preview.short_description = 'Content'
+
+@admin.register(ChatJob)
+class ChatJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('user__username', 'message')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
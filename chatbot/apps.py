@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
+
+    def ready(self):
+        # Registers the signal that drops cached conversations on delete,
+        # and the settings checks
+        from . import checks, persistence  # noqa: F401
@@ -0,0 +1,300 @@
+"""
+LLM backends for the chatbot.
+
+A backend turns a prompt (conversation history + question, without the
+healthcare context) into reply text, either all at once with generate() or
+chunk by chunk with stream(). Each backend applies HEALTHCARE_CONTEXT in its
+own way. Errors are raised, not swallowed; chatbot.services turns them into
+friendly messages.
+
+The backend is chosen with settings.CHATBOT_BACKEND:
+
+- ``gemini``: Google Gemini (default, needs GEMINI_API_KEY)
+- ``local``: deterministic offline stand-in for tests and load runs
+- ``transformers``: small in-process Hugging Face model (CHATBOT_LOCAL_MODEL),
+  needs the optional ``transformers`` package
+- or the dotted path of any ChatBackend subclass
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+MODEL_NAME = 'gemini-2.5-flash'
+
+# Sent once per model as the system instruction, not repeated in every prompt
+HEALTHCARE_CONTEXT = """You are a helpful healthcare assistant for a Healthcare Management System.
+You can help with:
+- General health information and tips
+- Explaining medical terms and conditions
+- Appointment scheduling guidance
+- Symptom information (but always recommend consulting a doctor)
+- Medication information (general, non-prescription advice only)
+- Healthy lifestyle recommendations
+- Preventive care information
+
+Important guidelines:
+- Always remind users to consult with healthcare professionals for medical advice
+- Do not provide specific medical diagnoses
+- Do not recommend prescription medications
+- Keep responses friendly, helpful, and informative
+- If asked about emergency situations, advise to seek immediate medical attention
+- Provide accurate, evidence-based health information
+
+Keep your responses concise but comprehensive, and always prioritize user safety."""
+
+# Safety settings
+SAFETY_SETTINGS = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    }
+]
+
+# Generation parameters shared by every backend
+TEMPERATURE = 0.7  # Balanced creativity and accuracy
+TOP_P = 0.9
+TOP_K = 40
+MAX_OUTPUT_TOKENS = 1000  # Reasonable response length
+
+
+class ChatBackend:
+    """Base class; subclasses implement generate() and may override stream()"""
+
+    name = None
+
+    def generate(self, prompt):
+        """Return the full reply text for ``prompt``"""
+        raise NotImplementedError
+
+    async def stream(self, prompt):
+        """Async generator of reply chunks; by default one chunk from generate()"""
+        text = await sync_to_async(self.generate, thread_sensitive=False)(prompt)
+        if text:
+            yield text
+
+    def validate(self):
+        """Return ``(ok, message)`` describing whether the backend is usable"""
+        return True, f"{self.name} backend ready"
+
+    def is_provider_error(self, exc):
+        """
+        Whether ``exc`` means the provider or the connection to it failed
+        (and should count towards opening the circuit breaker), rather than
+        the prompt being refused
+        """
+        return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+class GeminiBackend(ChatBackend):
+    """Google Gemini through one shared, lazily configured GenerativeModel"""
+
+    name = 'gemini'
+
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get_model(self):
+        """
+        GenerativeModel built on first use
+        Reusing it keeps the SDK's client (and its open connections) warm instead
+        of rebuilding config, safety settings and transport on every message.
+        Built lazily so each preforked worker creates its own connection.
+        """
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=settings.GEMINI_API_KEY)
+                    self._model = genai.GenerativeModel(
+                        MODEL_NAME,
+                        system_instruction=HEALTHCARE_CONTEXT,
+                        generation_config=genai.types.GenerationConfig(
+                            temperature=TEMPERATURE,
+                            top_p=TOP_P,
+                            top_k=TOP_K,
+                            max_output_tokens=MAX_OUTPUT_TOKENS,
+                        ),
+                        safety_settings=SAFETY_SETTINGS,
+                    )
+        return self._model
+
+    def generate(self, prompt):
+        response = self.get_model().generate_content(prompt)
+        if response and hasattr(response, 'text') and response.text:
+            return response.text.strip()
+        return ''
+
+    async def stream(self, prompt):
+        response = await self.get_model().generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    def validate(self):
+        if not getattr(settings, 'GEMINI_API_KEY', ''):
+            return False, "GEMINI_API_KEY not found in settings"
+
+        # Try a simple API call to validate the key
+        response = self.get_model().generate_content(
+            "Hello", generation_config={'max_output_tokens': 10}
+        )
+        if response and hasattr(response, 'text'):
+            return True, "API key is valid"
+        return False, "API key validation failed"
+
+    def is_provider_error(self, exc):
+        # 5xx (incl. deadline exceeded), 429 quota and exhausted retries; safety
+        # blocks and other 4xx are about the prompt, not the provider's health
+        from google.api_core import exceptions as api_exceptions
+
+        return super().is_provider_error(exc) or isinstance(exc, (
+            api_exceptions.ServerError, api_exceptions.TooManyRequests, api_exceptions.RetryError,
+        ))
+
+
+class LocalBackend(ChatBackend):
+    """
+    Deterministic offline stand-in: no network, same reply for the same prompt
+    CHATBOT_LOCAL_LATENCY_MS adds a per-reply delay (spread over the streamed
+    chunks) so load runs can simulate a real model's response time.
+    """
+
+    name = 'local'
+
+    def __init__(self, latency_ms=None):
+        if latency_ms is None:
+            latency_ms = getattr(settings, 'CHATBOT_LOCAL_LATENCY_MS', 0)
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def reply(self, prompt):
+        question = prompt.rsplit('Current User Question: ', 1)[-1].strip()
+        return (
+            f'You asked: "{question}". I am the offline healthcare assistant, '
+            'so I can only acknowledge your question right now. '
+            'Please consult a healthcare professional for medical advice.'
+        )
+
+    def generate(self, prompt):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.reply(prompt)
+
+    async def stream(self, prompt):
+        with self._lock:
+            self.calls += 1
+        words = self.reply(prompt).split(' ')
+        delay = self.latency / len(words)
+        for i, word in enumerate(words):
+            if delay:
+                await asyncio.sleep(delay)
+            yield word if i == len(words) - 1 else word + ' '
+
+
+class TransformersBackend(ChatBackend):
+    """
+    Small in-process model served by a Hugging Face ``text-generation``
+    pipeline (CHATBOT_LOCAL_MODEL), loaded once per process on first use
+    """
+
+    name = 'transformers'
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name or getattr(settings, 'CHATBOT_LOCAL_MODEL', '')
+        if not self.model_name:
+            raise ImproperlyConfigured("CHATBOT_LOCAL_MODEL must name a model for the transformers backend")
+        self._pipeline = None
+        self._load_lock = threading.Lock()
+        # The pipeline is not thread-safe, so generation is serialized
+        self._run_lock = threading.Lock()
+
+    def get_pipeline(self):
+        if self._pipeline is None:
+            with self._load_lock:
+                if self._pipeline is None:
+                    try:
+                        from transformers import pipeline
+                    except ImportError:
+                        raise ImproperlyConfigured(
+                            "The transformers backend requires the 'transformers' package"
+                        )
+                    self._pipeline = pipeline('text-generation', model=self.model_name)
+        return self._pipeline
+
+    def generate(self, prompt):
+        generator = self.get_pipeline()
+        with self._run_lock:
+            output = generator(
+                f"{HEALTHCARE_CONTEXT}\n\n{prompt}\nAssistant:",
+                max_new_tokens=MAX_OUTPUT_TOKENS,
+                do_sample=True,
+                temperature=TEMPERATURE,
+                top_p=TOP_P,
+                top_k=TOP_K,
+                return_full_text=False,
+            )
+        return output[0]['generated_text'].strip()
+
+    def validate(self):
+        try:
+            self.get_pipeline()
+        except Exception as e:
+            return False, f"Local model could not be loaded: {e}"
+        return True, f"Local model '{self.model_name}' loaded"
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'local': LocalBackend,
+    'transformers': TransformersBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Process-wide backend selected by settings.CHATBOT_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = getattr(settings, 'CHATBOT_BACKEND', 'gemini')
+                try:
+                    backend_class = BACKENDS[name] if name in BACKENDS else import_string(name)
+                except ImportError:
+                    raise ImproperlyConfigured(f"Unknown CHATBOT_BACKEND '{name}'")
+                _backend = backend_class()
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    """Rebuild the backend when a test overrides its settings"""
+    global _backend
+    if setting.startswith('CHATBOT_') or setting == 'GEMINI_API_KEY':
+        _backend = None
@@ -0,0 +1,170 @@
+"""
+Response cache for standalone chatbot questions.
+
+Questions are matched exactly after normalization (case, punctuation and
+whitespace are ignored). Optionally, a TF-IDF cosine-similarity lookup over
+the cached questions also catches close rewordings above a threshold.
+Entries expire after a TTL and the cache is bounded with LRU eviction.
+Only questions asked without prior conversation history are cached, since
+a reply that depends on earlier turns can't be reused for someone else.
+"""
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+
+_SPACES = re.compile(r'\s+')
+
+# Letters, digits and combining marks of any script are kept; \w alone
+# would split Devanagari and other scripts at their vowel signs
+_WORD_CATEGORIES = ('L', 'N', 'M')
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse whitespace (any script)"""
+    text = text.casefold().replace("'", '')
+    text = ''.join(ch if unicodedata.category(ch)[0] in _WORD_CATEGORIES else ' ' for ch in text)
+    return _SPACES.sub(' ', text).strip()
+
+
+class _Entry:
+    __slots__ = ('response', 'expires_at', 'terms')
+
+    def __init__(self, response, expires_at, terms):
+        self.response = response
+        self.expires_at = expires_at
+        self.terms = terms
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache of chatbot answers"""
+
+    def __init__(self, max_entries=512, ttl=3600, similarity_threshold=0.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._document_frequency = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, question):
+        """Cached response for ``question``, or None"""
+        key = normalize(question)
+        if not key:
+            # Nothing left to match on (e.g. only punctuation or emoji)
+            return None
+        now = self._clock()
+        with self._lock:
+            self._purge_expired(now)
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.response
+
+            if self.similarity_threshold > 0 and self._entries:
+                match = self._most_similar(Counter(key.split()))
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.similar_hits += 1
+                    return self._entries[match].response
+
+            self.misses += 1
+            return None
+
+    def set(self, question, response):
+        key = normalize(question)
+        if not key:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(response, self._clock() + self.ttl, Counter(key.split()))
+            self._document_frequency.update(self._entries[key].terms.keys())
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._document_frequency.clear()
+            self.hits = self.similar_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._document_frequency.subtract(entry.terms.keys())
+        self._document_frequency += Counter()  # drop zero counts
+
+    def _purge_expired(self, now):
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            self._remove(key)
+
+    def _vector(self, terms):
+        # Smoothed IDF, as in scikit-learn's TfidfVectorizer
+        n = len(self._entries)
+        vector = {
+            term: count * (math.log((1 + n) / (1 + self._document_frequency[term])) + 1)
+            for term, count in terms.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return vector, norm
+
+    def _most_similar(self, query_terms):
+        query, query_norm = self._vector(query_terms)
+        if not query_norm:
+            return None
+
+        best_key, best_score = None, self.similarity_threshold
+        for key, entry in self._entries.items():
+            candidate, candidate_norm = self._vector(entry.terms)
+            if not candidate_norm:
+                continue
+            dot = sum(weight * candidate.get(term, 0.0) for term, weight in query.items())
+            score = dot / (query_norm * candidate_norm)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Process-wide cache configured from CHATBOT_CACHE_SIZE, CHATBOT_CACHE_TTL
+    and CHATBOT_CACHE_SIMILARITY; returns None when CHATBOT_CACHE_SIZE is 0
+    """
+    global _cache
+    size = getattr(settings, 'CHATBOT_CACHE_SIZE', 512)
+    if size <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    max_entries=size,
+                    ttl=getattr(settings, 'CHATBOT_CACHE_TTL', 3600),
+                    similarity_threshold=getattr(settings, 'CHATBOT_CACHE_SIMILARITY', 0.0),
+                )
+    return _cache
@@ -0,0 +1,20 @@
+"""
+System checks for the chatbot settings, so a misconfiguration stops
+``runserver``/``migrate``/``check --deploy`` instead of failing requests.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_job_queue(app_configs, **kwargs):
+    from .jobs import QUEUE_MODES
+
+    mode = getattr(settings, 'CHATBOT_JOB_QUEUE', 'inline')
+    if mode in QUEUE_MODES:
+        return []
+    return [Error(
+        f"CHATBOT_JOB_QUEUE is '{mode}'",
+        hint=f"Use one of: {', '.join(QUEUE_MODES)}.",
+        id='chatbot.E001',
+    )]
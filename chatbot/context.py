@@ -0,0 +1,133 @@
+"""
+Conversation context for chatbot prompts.
+
+Only the newest CHATBOT_CONTEXT_MESSAGES messages are fetched (a reverse
+scan of the (conversation, created_at, id) index), then as many of them as
+fit in CHATBOT_CONTEXT_TOKENS are kept verbatim, newest first. Turns that
+fall out of that window are folded into Conversation.summary, a short
+running digest stored on the conversation, so older context survives
+without growing the prompt or re-reading the whole conversation.
+
+The summary is re-read from the database on every call and only written
+back if no other worker has advanced it in the meantime.
+"""
+import re
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from .models import Conversation
+
+# Rough size of a token for English text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# A single very long message is cut to this before budgeting
+MAX_MESSAGE_CHARS = 2000
+
+# Each summarized turn keeps about this much of its text
+SUMMARY_LINE_CHARS = 160
+
+# The summary keeps its newest lines within this many characters
+MAX_SUMMARY_CHARS = 2000
+
+# At most this many newly dropped messages are summarized per turn
+MAX_SUMMARIZE_BATCH = 50
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+@dataclass
+class ConversationContext:
+    summary: str = ''
+    messages: list = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.summary or self.messages)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def clip(text, limit):
+    """Cut ``text`` to ``limit`` characters on a word boundary"""
+    text = ' '.join(text.split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + '...'
+
+
+def recent_messages(conversation, limit, exclude=None):
+    """Newest ``limit`` messages of ``conversation``, oldest first"""
+    queryset = conversation.messages.order_by('-created_at', '-id')
+    if exclude is not None:
+        queryset = queryset.exclude(pk=exclude)
+    return list(queryset[:limit])[::-1]
+
+
+def summary_line(message):
+    """One-line digest of a message: its first sentence, clipped"""
+    first_sentence = _SENTENCE_END.split(message.content.strip(), 1)[0]
+    speaker = 'User' if message.is_from_user else 'Assistant'
+    return f"{speaker}: {clip(first_sentence, SUMMARY_LINE_CHARS)}"
+
+
+def extend_summary(summary, messages):
+    """Append digests of ``messages`` to ``summary``, dropping the oldest lines past the cap"""
+    lines = [line for line in summary.splitlines() if line]
+    lines.extend(summary_line(message) for message in messages)
+    while lines and len('\n'.join(lines)) > MAX_SUMMARY_CHARS:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+
+def build_context(conversation, exclude=None, max_messages=None, token_budget=None):
+    """
+    Context for the next reply in ``conversation``, leaving out message
+    ``exclude`` (the question being answered). Updates the stored summary
+    when turns have dropped out of the window since the last call.
+    """
+    if max_messages is None:
+        max_messages = getattr(settings, 'CHATBOT_CONTEXT_MESSAGES', 20)
+    if token_budget is None:
+        token_budget = getattr(settings, 'CHATBOT_CONTEXT_TOKENS', 1500)
+
+    # Another worker may have summarized since this instance was loaded
+    conversation.refresh_from_db(fields=['summary', 'summarized_up_to'])
+    window = recent_messages(conversation, max_messages, exclude=exclude)
+
+    # Keep the newest messages that fit the budget
+    kept = []
+    used = estimate_tokens(conversation.summary)
+    for message in reversed(window):
+        content = clip(message.content, MAX_MESSAGE_CHARS)
+        cost = estimate_tokens(content)
+        if kept and used + cost > token_budget:
+            break
+        used += cost
+        message.content = content
+        kept.append(message)
+    kept.reverse()
+
+    # Fold anything older than the kept messages into the summary (nothing
+    # can be older when the whole conversation fit)
+    if kept and (len(kept) < len(window) or len(window) == max_messages):
+        boundary = kept[0].pk
+        dropped = conversation.messages.filter(pk__lt=boundary)
+        if conversation.summarized_up_to is not None:
+            dropped = dropped.filter(pk__gt=conversation.summarized_up_to)
+        if exclude is not None:
+            dropped = dropped.exclude(pk=exclude)
+        dropped = list(dropped.order_by('-created_at', '-id')[:MAX_SUMMARIZE_BATCH])[::-1]
+        if dropped:
+            summary = extend_summary(conversation.summary, dropped)
+            saved = Conversation.objects.filter(
+                pk=conversation.pk, summarized_up_to=conversation.summarized_up_to
+            ).update(summary=summary, summarized_up_to=dropped[-1].pk)
+            if saved:
+                conversation.summary, conversation.summarized_up_to = summary, dropped[-1].pk
+            else:
+                # Lost the race: keep the other worker's summary
+                conversation.refresh_from_db(fields=['summary', 'summarized_up_to'])
+
+    return ConversationContext(summary=conversation.summary, messages=kept)
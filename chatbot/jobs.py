@@ -0,0 +1,189 @@
+"""
+Background generation of chat replies.
+
+With settings.CHATBOT_JOB_QUEUE set, send_message stores a ChatJob and
+answers 202 with its id straight away; the browser polls chatbot:job_status
+until the reply is ready. Jobs are run by:
+
+- ``inline``: no jobs at all, replies are generated in the request (default)
+- ``thread``: an in-process pool of CHATBOT_JOB_WORKERS threads, for
+  development and single-process deployments
+- ``database``: ``python manage.py run_chat_worker`` processes, sized
+  independently of the web workers, claiming jobs from the ChatJob table
+
+Finished jobs hold the question and reply (for guests too), so they are
+deleted CHATBOT_JOB_RETENTION_HOURS after they were queued: by the worker
+loop, or in ``thread`` mode when new jobs are submitted.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ChatJob
+from .persistence import load_conversation, save_turn
+from .services import get_gemini_response
+
+logger = logging.getLogger(__name__)
+
+QUEUE_MODES = ('inline', 'thread', 'database')
+
+FINISHED_STATUSES = ('done', 'failed')
+
+# Seconds between two housekeeping rounds (requeue, purge) of one process
+MAINTENANCE_INTERVAL = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def queue_mode():
+    mode = getattr(settings, 'CHATBOT_JOB_QUEUE', 'inline')
+    if mode not in QUEUE_MODES:
+        raise ValueError(f"CHATBOT_JOB_QUEUE must be one of {', '.join(QUEUE_MODES)}")
+    return mode
+
+
+def get_executor():
+    """Process-wide thread pool for the ``thread`` queue mode"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CHATBOT_JOB_WORKERS', 4),
+                    thread_name_prefix='chat-job',
+                )
+    return _executor
+
+
+def submit_job(user, message):
+    """Queue a reply to ``message`` (``user`` may be None for guests)"""
+    job = ChatJob.objects.create(user=user, message=message)
+    if queue_mode() == 'thread':
+        # Only hand the job over once its row is visible to other connections
+        transaction.on_commit(lambda: get_executor().submit(_run_in_thread, job.pk))
+        # No worker loop in this mode to clean up after us
+        purge_if_due()
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def claim_job(job_id):
+    """Mark a queued job as running; returns it, or None if someone else got it"""
+    claimed = ChatJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    return ChatJob.objects.select_related('user').get(pk=job_id)
+
+
+def claim_next_job():
+    """Claim the oldest queued job, or return None when the queue is empty"""
+    while True:
+        job_id = ChatJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True).first()
+        if job_id is None:
+            return None
+        job = claim_job(job_id)
+        if job is not None:
+            return job
+        # Another worker claimed it first; try the next one
+
+
+def requeue_stale_jobs(timeout=None):
+    """Put jobs whose worker died back in the queue; returns how many"""
+    if timeout is None:
+        timeout = getattr(settings, 'CHATBOT_JOB_TIMEOUT', 300)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return ChatJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='queued', started_at=None
+    )
+
+
+def purge_finished_jobs(max_age_hours=None):
+    """Delete done/failed jobs queued more than ``max_age_hours`` ago; returns how many"""
+    if max_age_hours is None:
+        max_age_hours = getattr(settings, 'CHATBOT_JOB_RETENTION_HOURS', 24)
+    cutoff = timezone.now() - timedelta(hours=max_age_hours)
+    deleted, _ = ChatJob.objects.filter(status__in=FINISHED_STATUSES, created_at__lt=cutoff).delete()
+    return deleted
+
+
+def purge_if_due():
+    """purge_finished_jobs() at most once per MAINTENANCE_INTERVAL in this process"""
+    global _last_purge
+    with _purge_lock:
+        now = time.monotonic()
+        if now - _last_purge < MAINTENANCE_INTERVAL:
+            return 0
+        _last_purge = now
+    return purge_finished_jobs()
+
+
+def finish_job(job, conversation=None):
+    """
+    Store the outcome of ``job`` (and its chat turn, when it succeeded for
+    a signed-in user) if this worker still owns it. Returns False, saving
+    nothing, if the job was requeued as stale and maybe claimed again since.
+    """
+    with transaction.atomic():
+        if job.status == 'done' and conversation is not None:
+            job.user_message, job.ai_message = save_turn(conversation, job.message, job.response)
+        owned = ChatJob.objects.filter(pk=job.pk, status='running', started_at=job.started_at).update(
+            status=job.status,
+            response=job.response,
+            user_message=job.user_message,
+            ai_message=job.ai_message,
+            finished_at=job.finished_at,
+        )
+        if not owned:
+            # Whoever owns the job now saves the turn; drop ours
+            transaction.set_rollback(True)
+    return bool(owned)
+
+
+def process_job(job):
+    """Generate the reply for a claimed job and save the turn"""
+    try:
+        history = None
+        conversation = None
+        if job.user is not None:
+            conversation, history = load_conversation(job.user)
+
+        job.response = get_gemini_response(job.message, history)
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        owned = finish_job(job, conversation)
+    except Exception as e:
+        logger.error(f"Chat job {job.pk} failed: {e}")
+        job.status = 'failed'
+        job.user_message = job.ai_message = None
+        job.finished_at = timezone.now()
+        owned = finish_job(job)
+
+    if not owned:
+        logger.warning(f"Chat job {job.pk} was requeued while running; discarded this worker's result")
+    return job
+
+
+def run_job(job_id):
+    """Claim and process one job by id; returns it, or None if already taken"""
+    job = claim_job(job_id)
+    if job is not None:
+        process_job(job)
+    return job
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from chatbot import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate queued chat replies (CHATBOT_JOB_QUEUE=database) with a pool '
+        'of worker threads, separate from the web workers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Jobs processed at the same time (default: 4)')
+        parser.add_argument('--poll-interval', type=float, default=0.5,
+                            help='Seconds to wait when the queue is empty (default: 0.5)')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of running forever')
+
+    def handle(self, *args, **options):
+        self.maintain()
+
+        self.processed = 0
+        self._lock = threading.Lock()
+        self._maintainer = threading.current_thread()
+        if options['concurrency'] == 1:
+            self.work(options['poll_interval'], options['once'])
+            self.stdout.write(self.style.SUCCESS(f'Processed {self.processed} job(s)'))
+            return
+
+        threads = [
+            threading.Thread(target=self.work, args=(options['poll_interval'], options['once']), daemon=True)
+            for _ in range(options['concurrency'])
+        ]
+        # One thread does the periodic housekeeping
+        self._maintainer = threads[0]
+        self.stdout.write(f"Chat worker started with {options['concurrency']} thread(s)")
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping chat worker')
+        self.stdout.write(self.style.SUCCESS(f'Processed {self.processed} job(s)'))
+
+    def maintain(self):
+        """Requeue jobs of dead workers and delete expired finished jobs"""
+        self._last_maintenance = time.monotonic()
+        requeued = jobs.requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale job(s)')
+        purged = jobs.purge_finished_jobs()
+        if purged:
+            self.stdout.write(f'Deleted {purged} expired job(s)')
+
+    def maintain_if_due(self):
+        if time.monotonic() - self._last_maintenance >= jobs.MAINTENANCE_INTERVAL:
+            self.maintain()
+
+    def work(self, poll_interval, once):
+        try:
+            while True:
+                if threading.current_thread() is self._maintainer:
+                    self.maintain_if_due()
+                job = jobs.claim_next_job()
+                if job is None:
+                    if once:
+                        return
+                    close_old_connections()
+                    time.sleep(poll_interval)
+                    continue
+                jobs.process_job(job)
+                with self._lock:
+                    self.processed += 1
+        finally:
+            close_old_connections()
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_conversation_summary'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='message',
+            options={'ordering': ['created_at', 'id']},
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from users.models import User
 
@@ -6,6 +8,9 @@ class Conversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Running digest of turns that no longer fit in the prompt (see chatbot.context)
+    summary = models.TextField(blank=True, default='')
+    summarized_up_to = models.PositiveBigIntegerField(null=True, blank=True)  # id of the last summarized message
     
     class Meta:
         ordering = ['-updated_at']
@@ -21,8 +26,44 @@ class Message(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['created_at']
+        ordering = ['created_at', 'id']
+        indexes = [
+            # Serves "newest N messages" and history cursors as index range scans
+            models.Index(fields=['conversation', 'created_at', 'id'], name='chatbot_msg_conv_created'),
+        ]
     
     def __str__(self):
         sender = "User" if self.is_from_user else "AI"
         return f"{sender}: {self.content[:50]}..."
+
+
+class ChatJob(models.Model):
+    """A queued chat reply, generated outside the request (see chatbot.jobs)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Random ids, so guests can poll their own job without an account
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    response = models.TextField(blank=True, default='')
+    user_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    ai_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Workers claim the oldest queued job
+            models.Index(fields=['status', 'created_at'], name='chatbot_job_status_created'),
+        ]
+    
+    def __str__(self):
+        return f"Chat job {self.id} ({self.status})"
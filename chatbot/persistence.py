@@ -0,0 +1,78 @@
+"""
+Saving chat turns.
+
+A turn (the user's question and the assistant's reply) is written with one
+bulk_create, and the conversation is "touched" with a single UPDATE of
+updated_at, both in one transaction. Only the id of the user's Conversation is cached
+(per user, in Django's cache): the mutable summary fields are always read
+from the database by chatbot.context, so workers with their own cache never
+act on a stale copy. The cached id is trusted until reading the
+conversation fails, since another process may have deleted it. A turn normally costs two writes plus the context
+reads, instead of get_or_create + two inserts + a full save().
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .context import build_context
+from .models import Conversation, Message
+
+# A user's conversation id never changes (deleting it drops the key)
+CONVERSATION_CACHE_TIMEOUT = 60 * 60
+
+
+def conversation_cache_key(user_id):
+    return f'chatbot:conversation:{user_id}'
+
+
+def get_conversation(user):
+    """
+    The user's conversation; with its id cached this needs no query, and
+    every other field is deferred (loaded from the database when read)
+    """
+    key = conversation_cache_key(user.pk)
+    conversation_id = cache.get(key)
+    if conversation_id is not None:
+        return Conversation.from_db(None, ['id', 'user_id'], [conversation_id, user.pk])
+    conversation, created = Conversation.objects.get_or_create(user=user)
+    cache.set(key, conversation.pk, CONVERSATION_CACHE_TIMEOUT)
+    return conversation
+
+
+def load_conversation(user):
+    """
+    The user's conversation and the context for its next reply, as
+    ``(conversation, history)``. A cached id whose row was deleted by
+    another process is forgotten and the conversation looked up again.
+    """
+    conversation = get_conversation(user)
+    try:
+        return conversation, build_context(conversation)
+    except Conversation.DoesNotExist:
+        cache.delete(conversation_cache_key(user.pk))
+    conversation = get_conversation(user)
+    return conversation, build_context(conversation)
+
+
+def save_turn(conversation, user_message, ai_response):
+    """
+    Store one question/answer pair and bump the conversation's updated_at
+    Returns the two saved Message objects (user, AI)
+    """
+    user_msg = Message(conversation=conversation, content=user_message, is_from_user=True)
+    ai_msg = Message(conversation=conversation, content=ai_response, is_from_user=False)
+    now = timezone.now()
+
+    with transaction.atomic():
+        Message.objects.bulk_create([user_msg, ai_msg])
+        Conversation.objects.filter(pk=conversation.pk).update(updated_at=now)
+
+    conversation.updated_at = now
+    return user_msg, ai_msg
+
+
+@receiver(post_delete, sender=Conversation)
+def forget_conversation(sender, instance, **kwargs):
+    cache.delete(conversation_cache_key(instance.user_id))
@@ -0,0 +1,344 @@
+"""
+Back-pressure for outbound LLM calls.
+
+Every backend call goes through one LLMGuard per process, which combines:
+
+- a ConcurrencyGate: at most ``limit`` calls in flight, up to ``max_queue``
+  more waiting (each for at most ``timeout`` seconds), the rest rejected
+- a TokenBucket matching the provider's requests-per-minute quota
+- a CircuitBreaker that fails fast for ``reset_timeout`` seconds after
+  ``failure_threshold`` consecutive provider failures (timeouts, 5xx,
+  connection errors; not refused prompts), then lets one trial call through
+
+Rejected calls raise a BackendUnavailable subclass before any network round
+trip; chatbot.services answers them from the response cache or with a
+"high traffic" message. All limits are per process.
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class BackendUnavailable(Exception):
+    """The call was not made because the backend is overloaded or degraded"""
+
+    reason = 'unavailable'
+
+
+class QueueFull(BackendUnavailable):
+    reason = 'queue_full'
+
+
+class QueueTimeout(BackendUnavailable):
+    reason = 'queue_timeout'
+
+
+class RateLimited(BackendUnavailable):
+    reason = 'rate_limited'
+
+
+class CircuitOpen(BackendUnavailable):
+    reason = 'circuit_open'
+
+
+class ConcurrencyGate:
+    """Bounded number of concurrent calls with a bounded, timed wait queue"""
+
+    def __init__(self, limit=8, max_queue=32, timeout=10.0):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed; returns seconds waited"""
+        start = time.monotonic()
+        with self._cond:
+            if self.in_flight >= self.limit:
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise QueueFull('Too many chat requests are waiting')
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+                try:
+                    admitted = self._cond.wait_for(lambda: self.in_flight < self.limit, timeout=self.timeout)
+                finally:
+                    self.queued -= 1
+                if not admitted:
+                    self.timed_out += 1
+                    raise QueueTimeout('Timed out waiting for a chat slot')
+
+            self.in_flight += 1
+            self.admitted += 1
+            waited = time.monotonic() - start
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            return waited
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'queue_depth': self.queued,
+                'max_queue_depth': self.max_queued,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_wait_seconds': self.total_wait / self.admitted if self.admitted else 0.0,
+                'max_wait_seconds': self.max_wait,
+            }
+
+
+class TokenBucket:
+    """
+    ``rate_per_minute`` tokens refilled continuously, holding at most
+    ``burst``; a rate of 0 disables limiting
+    """
+
+    def __init__(self, rate_per_minute=0, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, rate_per_minute))
+        self.tokens = self.capacity
+        self.throttled = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=0.0):
+        """
+        Take one token, sleeping for it if it becomes available within
+        ``timeout`` seconds; raises RateLimited otherwise
+        """
+        if not self.rate:
+            return
+        with self._lock:
+            self._refill(self._clock())
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            if wait > timeout:
+                self.throttled += 1
+                raise RateLimited('Chat provider rate limit reached')
+            # Reserve the token now so concurrent callers queue up behind it
+            self.tokens -= 1
+        if wait:
+            self._sleep(wait)
+
+    def stats(self):
+        with self._lock:
+            if self.rate:
+                self._refill(self._clock())
+            return {
+                'rate_per_minute': self.rate * 60,
+                'tokens': round(self.tokens, 2),
+                'throttled': self.throttled,
+            }
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial -> closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go through right now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            self.short_circuited += 1
+            raise CircuitOpen('Chat provider is temporarily unavailable')
+
+    def cancel_trial(self):
+        """Give back a half-open trial that was never attempted"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'short_circuited': self.short_circuited,
+            }
+
+
+class LLMGuard:
+    """Gate + rate limit + breaker around each backend call"""
+
+    def __init__(self, gate, bucket, breaker):
+        self.gate = gate
+        self.bucket = bucket
+        self.breaker = breaker
+
+    def acquire(self):
+        """
+        Admit one call or raise BackendUnavailable; every successful
+        acquire() must be paired with release()
+        """
+        self.breaker.before_call()
+        try:
+            waited = self.gate.acquire()
+            try:
+                self.bucket.acquire(timeout=max(0.0, self.gate.timeout - waited))
+            except BackendUnavailable:
+                self.gate.release()
+                raise
+        except BackendUnavailable:
+            # Not the provider's fault, so hand back a half-open trial unused
+            self.breaker.cancel_trial()
+            raise
+
+    def release(self, success):
+        """
+        Give back the slot; ``success`` True/False is recorded by the
+        breaker, None (the call never reached the provider) is not
+        """
+        self.gate.release()
+        if success is None:
+            self.breaker.cancel_trial()
+        elif success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    async def acquire_async(self):
+        """
+        acquire() for async callers; waiting for a slot blocks, so it runs in
+        a worker thread. If the caller is cancelled while queued (e.g. the
+        client disconnected), the slot is given back as soon as that thread
+        gets it, instead of leaking.
+        """
+        task = asyncio.ensure_future(sync_to_async(self.acquire, thread_sensitive=False)())
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            task.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, task):
+        if not task.cancelled() and task.exception() is None:
+            self.release(success=None)
+
+    def call(self, func, *args, is_failure=None):
+        """
+        Run ``func(*args)`` under the guard; exceptions count as breaker
+        failures only when ``is_failure(exc)`` is true (all of them by default)
+        """
+        self.acquire()
+        try:
+            result = func(*args)
+        except Exception as e:
+            self.release(success=False if is_failure is None or is_failure(e) else None)
+            raise
+        self.release(success=True)
+        return result
+
+    def stats(self):
+        return {
+            'concurrency': self.gate.stats(),
+            'rate_limit': self.bucket.stats(),
+            'circuit_breaker': self.breaker.stats(),
+        }
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_guard():
+    """Process-wide LLMGuard configured from the CHATBOT_* limit settings"""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = LLMGuard(
+                    ConcurrencyGate(
+                        limit=getattr(settings, 'CHATBOT_MAX_CONCURRENCY', 8),
+                        max_queue=getattr(settings, 'CHATBOT_MAX_QUEUE', 32),
+                        timeout=getattr(settings, 'CHATBOT_QUEUE_TIMEOUT', 10),
+                    ),
+                    TokenBucket(
+                        rate_per_minute=getattr(settings, 'CHATBOT_RATE_LIMIT_PER_MINUTE', 0),
+                        burst=getattr(settings, 'CHATBOT_RATE_LIMIT_BURST', 0),
+                    ),
+                    CircuitBreaker(
+                        failure_threshold=getattr(settings, 'CHATBOT_BREAKER_THRESHOLD', 5),
+                        reset_timeout=getattr(settings, 'CHATBOT_BREAKER_RESET', 30),
+                    ),
+                )
+    return _guard
+
+
+@receiver(setting_changed)
+def reset_guard(setting, **kwargs):
+    """Rebuild the guard when a test overrides its settings"""
+    global _guard
+    if setting.startswith('CHATBOT_'):
+        _guard = None
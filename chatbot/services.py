@@ -1,131 +1,159 @@
-import google.generativeai as genai
-from django.conf import settings
 import logging
+from .backends import get_backend
+from .cache import get_response_cache
+from .resilience import BackendUnavailable, get_guard
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Configure Gemini AI
-try:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-except Exception as e:
-    logger.error(f"Failed to configure Gemini API: {e}")
+EMPTY_RESPONSE_MESSAGE = "I apologize, but I'm having trouble generating a response right now. Could you please try rephrasing your question?"
+
+OVERLOADED_MESSAGE = "I'm currently experiencing high traffic. Please try again in a moment."
+
+def build_prompt(user_message, conversation_history=None):
+    """
+    Prepare the prompt with conversation context
+    (the healthcare context is the model's system instruction)
+    conversation_history is a chatbot.context.ConversationContext or a plain
+    list of messages, already trimmed to the prompt budget
+    """
+    summary = getattr(conversation_history, 'summary', '')
+    messages = getattr(conversation_history, 'messages', conversation_history) or []
+    if not summary and not messages:
+        return user_message
+    
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation:\n{summary}")
+    if messages:
+        history_text = "\n".join([
+            f"{'User' if msg.is_from_user else 'Assistant'}: {msg.content}"
+            for msg in messages
+        ])
+        parts.append(f"Recent conversation:\n{history_text}")
+    parts.append(f"Current User Question: {user_message}")
+    return "\n\n".join(parts)
+
+def error_message(e):
+    """
+    Return different error messages based on the type of error
+    """
+    if "API_KEY" in str(e).upper():
+        return "I'm experiencing authentication issues. Please contact support if this problem persists."
+    elif "QUOTA" in str(e).upper() or "LIMIT" in str(e).upper():
+        return "I'm currently experiencing high traffic. Please try again in a moment."
+    elif "SAFETY" in str(e).upper():
+        return "I understand you're looking for health information, but I need to be careful with my responses. Could you please rephrase your question?"
+    else:
+        return "I apologize, but I'm having trouble connecting to my AI service right now. Please try again later or contact support if the issue persists."
+
+def get_cached_response(user_message, conversation_history=None):
+    """
+    Cached answer for a standalone question, or None
+    Questions asked with prior history are never served from the cache
+    """
+    cache = get_response_cache()
+    if cache is None or conversation_history:
+        return None
+    return cache.get(user_message)
+
+def cache_response(user_message, conversation_history, response_text):
+    """Remember a successful answer to a standalone question"""
+    cache = get_response_cache()
+    if cache is not None and not conversation_history:
+        cache.set(user_message, response_text)
+
+def fallback_response(user_message, e):
+    """
+    Answer given when the guard refuses a call (overloaded or breaker open)
+    A cached answer to the question on its own is better than nothing here
+    """
+    logger.warning(f"Chat backend unavailable ({e.reason}): {e}")
+    cached = get_cached_response(user_message)
+    return cached if cached is not None else OVERLOADED_MESSAGE
 
 def get_gemini_response(user_message, conversation_history=None):
     """
-    Get response from Gemini AI using Gemini 1.5 Flash
+    Get the AI response from the configured backend (CHATBOT_BACKEND)
     """
+    cached = get_cached_response(user_message, conversation_history)
+    if cached is not None:
+        return cached
+    
     try:
-        # Create the model - using gemini-1.5-flash for better performance
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Create healthcare context
-        healthcare_context = """
-        You are a helpful healthcare assistant for a Healthcare Management System. 
-        You can help with:
-        - General health information and tips
-        - Explaining medical terms and conditions
-        - Appointment scheduling guidance
-        - Symptom information (but always recommend consulting a doctor)
-        - Medication information (general, non-prescription advice only)
-        - Healthy lifestyle recommendations
-        - Preventive care information
-        
-        Important guidelines:
-        - Always remind users to consult with healthcare professionals for medical advice
-        - Do not provide specific medical diagnoses
-        - Do not recommend prescription medications
-        - Keep responses friendly, helpful, and informative
-        - If asked about emergency situations, advise to seek immediate medical attention
-        - Provide accurate, evidence-based health information
-        
-        Keep your responses concise but comprehensive, and always prioritize user safety.
-        """
-        
-        # Prepare the prompt with conversation context
-        if conversation_history and len(conversation_history) > 0:
-            # Include recent conversation history for context (last 5 messages)
-            recent_history = list(conversation_history)[-5:] if len(conversation_history) > 5 else list(conversation_history)
-            history_text = "\n".join([
-                f"{'User' if msg.is_from_user else 'Assistant'}: {msg.content[:500]}..."  # Limit message length
-                for msg in recent_history
-            ])
-            prompt = f"{healthcare_context}\n\nRecent conversation:\n{history_text}\n\nCurrent User Question: {user_message}\n\nAssistant Response:"
-        else:
-            prompt = f"{healthcare_context}\n\nUser Question: {user_message}\n\nAssistant Response:"
-        
-        # Configure generation parameters for better responses
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.7,  # Balanced creativity and accuracy
-            top_p=0.9,
-            top_k=40,
-            max_output_tokens=1000,  # Reasonable response length
-        )
-        
-        # Safety settings
-        safety_settings = [
-            {
-                "category": "HARM_CATEGORY_HARASSMENT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            },
-            {
-                "category": "HARM_CATEGORY_HATE_SPEECH",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            },
-            {
-                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            },
-            {
-                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            }
-        ]
-        
         # Generate response
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings
+        backend = get_backend()
+        response_text = get_guard().call(
+            backend.generate, build_prompt(user_message, conversation_history),
+            is_failure=backend.is_provider_error,
         )
         
         # Check if response was generated successfully
-        if response and hasattr(response, 'text') and response.text:
-            return response.text.strip()
+        if response_text:
+            cache_response(user_message, conversation_history, response_text)
+            return response_text
         else:
-            logger.warning("Gemini API returned empty response")
-            return "I apologize, but I'm having trouble generating a response right now. Could you please try rephrasing your question?"
+            logger.warning("Chat backend returned empty response")
+            return EMPTY_RESPONSE_MESSAGE
         
+    except BackendUnavailable as e:
+        return fallback_response(user_message, e)
     except Exception as e:
-        logger.error(f"Error getting Gemini response: {e}")
+        logger.error(f"Error getting chat response: {e}")
+        return error_message(e)
+
+async def stream_gemini_response(user_message, conversation_history=None):
+    """
+    Async generator yielding the backend's response text chunk by chunk as it
+    is generated. Errors are reported the same way as get_gemini_response, as a
+    final friendly chunk, so callers can always persist what they streamed.
+    """
+    cached = get_cached_response(user_message, conversation_history)
+    if cached is not None:
+        yield cached
+        return
+    
+    guard = get_guard()
+    try:
+        await guard.acquire_async()
+    except BackendUnavailable as e:
+        yield fallback_response(user_message, e)
+        return
+    
+    backend = get_backend()
+    chunks = []
+    success = True
+    try:
+        async for text in backend.stream(build_prompt(user_message, conversation_history)):
+            chunks.append(text)
+            yield text
         
-        # Return different error messages based on the type of error
-        if "API_KEY" in str(e).upper():
-            return "I'm experiencing authentication issues. Please contact support if this problem persists."
-        elif "QUOTA" in str(e).upper() or "LIMIT" in str(e).upper():
-            return "I'm currently experiencing high traffic. Please try again in a moment."
-        elif "SAFETY" in str(e).upper():
-            return "I understand you're looking for health information, but I need to be careful with my responses. Could you please rephrase your question?"
+        if chunks:
+            cache_response(user_message, conversation_history, ''.join(chunks).strip())
         else:
-            return "I apologize, but I'm having trouble connecting to my AI service right now. Please try again later or contact support if the issue persists."
+            logger.warning("Chat backend returned empty streamed response")
+            yield EMPTY_RESPONSE_MESSAGE
+    
+    except Exception as e:
+        # A refused prompt says nothing about the provider's health
+        success = False if backend.is_provider_error(e) else None
+        logger.error(f"Error streaming chat response: {e}")
+        yield ("\n\n" if chunks else "") + error_message(e)
+    finally:
+        guard.release(success=success)
+
+def chat_metrics():
+    """Queue, rate limit, circuit breaker and cache counters for this process"""
+    metrics = get_guard().stats()
+    cache = get_response_cache()
+    metrics['response_cache'] = cache.stats() if cache is not None else None
+    return metrics
 
 def validate_api_key():
     """
-    Validate if the Gemini API key is properly configured
+    Validate that the configured chat backend (by default Gemini) is usable
     """
     try:
-        if not hasattr(settings, 'GEMINI_API_KEY') or not settings.GEMINI_API_KEY:
-            return False, "GEMINI_API_KEY not found in settings"
-        
-        # Try a simple API call to validate the key
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content("Hello", 
-            generation_config=genai.types.GenerationConfig(max_output_tokens=10))
-        
-        if response and hasattr(response, 'text'):
-            return True, "API key is valid"
-        else:
-            return False, "API key validation failed"
-            
+        return get_backend().validate()
     except Exception as e:
-        return False, f"API key validation error: {e}"
\ No newline at end of file
+        return False, f"API key validation error: {e}"
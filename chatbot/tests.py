@@ -1,6 +1,22 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
-from .models import Conversation, Message
+from .models import ChatJob, Conversation, Message
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test.utils import CaptureQueriesContext
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from io import StringIO
+from datetime import timedelta
+from django.utils import timezone
+from . import services
+from .backends import GeminiBackend, LocalBackend, get_backend
+from .cache import ResponseCache
+from .context import build_context
+from .persistence import conversation_cache_key, forget_conversation
+from .resilience import CircuitBreaker, CircuitOpen, ConcurrencyGate, LLMGuard, QueueFull, QueueTimeout, RateLimited, TokenBucket
+import asyncio
 import json
 
 User = get_user_model()
@@ -209,4 +225,644 @@ class ChatbotModelTests(TestCase):
         
         self.assertTrue(user_msg.is_from_user)
         self.assertFalse(ai_msg.is_from_user)
-        print("✅ Test 12 passed: User vs AI messages distinguished")
\ No newline at end of file
+        print("✅ Test 12 passed: User vs AI messages distinguished")
+
+@override_settings(CHATBOT_BACKEND='local', CHATBOT_CACHE_SIZE=0)
+class ChatbotStreamingTests(TestCase):
+    """Test Server-Sent Events streaming of chatbot responses"""
+
+    def setUp(self):
+        # Rolled-back test data can reuse primary keys; drop cached conversations
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='streamuser',
+            password='testpass123',
+            user_type='patient'
+        )
+
+    async def _stream(self, message):
+        response = await self.async_client.post(
+            '/chatbot/stream/',
+            data=json.dumps({'message': message}),
+            content_type='application/json'
+        )
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        return response, body
+
+    async def test_guest_receives_streamed_tokens(self):
+        """Test that tokens arrive as SSE events followed by done"""
+        response, body = await self._stream('How much water should I drink?')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: token\ndata: {"text": "You "}', body)
+        self.assertTrue(body.rstrip().split('\n\n')[-1].startswith('event: done'))
+        print("✅ Guest receives streamed tokens")
+
+    async def test_streamed_reply_saved_for_user(self):
+        """Test that the full assistant message is saved after the stream"""
+        await self.async_client.aforce_login(self.user)
+        await self._stream('Any tips?')
+
+        contents = [msg.content async for msg in Message.objects.filter(conversation__user=self.user)]
+        self.assertEqual(contents, ['Any tips?', LocalBackend().reply('Any tips?')])
+        print("✅ Streamed reply saved for user")
+
+    async def test_stream_rejects_empty_message(self):
+        """Test that the stream endpoint validates like send_message"""
+        response = await self.async_client.post(
+            '/chatbot/stream/',
+            data=json.dumps({'message': '  '}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        print("✅ Stream rejects empty message")
+
+
+class GeminiClientTests(TestCase):
+    """Test the shared Gemini client configuration"""
+
+    def test_model_is_built_once(self):
+        """Test that every call reuses one configured model"""
+        backend = GeminiBackend()
+        self.assertIs(backend.get_model(), backend.get_model())
+        print("✅ Gemini model reused")
+
+    def test_context_is_system_instruction(self):
+        """Test that the healthcare context is not repeated in prompts"""
+        model = GeminiBackend().get_model()
+        prompt = services.build_prompt('What is a normal BMI?')
+
+        self.assertIn('healthcare assistant', str(model._system_instruction))
+        self.assertNotIn('healthcare assistant', prompt)
+        self.assertEqual(prompt, 'What is a normal BMI?')
+        print("✅ Healthcare context sent as system instruction")
+
+
+class ResponseCacheTests(TestCase):
+    """Test the chatbot response cache"""
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = ResponseCache(max_entries=2, ttl=60, clock=lambda: self.now)
+
+    def test_normalized_exact_match(self):
+        """Test that case, punctuation and spacing are ignored"""
+        self.cache.set('What is a normal BMI?', 'Between 18.5 and 24.9.')
+
+        self.assertEqual(self.cache.get('what is a  normal bmi'), 'Between 18.5 and 24.9.')
+        self.assertIsNone(self.cache.get('what is a high bmi'))
+        print("✅ Normalized exact match")
+
+    def test_entries_expire(self):
+        """Test that entries are dropped after the TTL"""
+        self.cache.set('How do I book an appointment?', 'Use the booking page.')
+        self.now = 61.0
+
+        self.assertIsNone(self.cache.get('How do I book an appointment?'))
+        print("✅ Entries expire")
+
+    def test_size_bounded_lru(self):
+        """Test that the least recently used entry is evicted"""
+        self.cache.set('first question', 'one')
+        self.cache.set('second question', 'two')
+        self.cache.get('first question')
+        self.cache.set('third question', 'three')
+
+        self.assertEqual(self.cache.get('first question'), 'one')
+        self.assertIsNone(self.cache.get('second question'))
+        print("✅ Cache is size bounded")
+
+    def test_similarity_match(self):
+        """Test that near-identical questions match above the threshold"""
+        cache = ResponseCache(max_entries=10, ttl=60, similarity_threshold=0.8)
+        cache.set('how do i book an appointment with a doctor', 'Use the booking page.')
+        cache.set('what is a normal blood pressure', 'Around 120/80.')
+
+        self.assertEqual(cache.get('how can i book an appointment with a doctor'), 'Use the booking page.')
+        self.assertIsNone(cache.get('what is a normal resting heart rate'))
+        print("✅ Similar questions matched")
+
+    def test_non_latin_questions_kept_apart(self):
+        """Test that questions in other scripts get their own keys"""
+        cache = ResponseCache(max_entries=10, ttl=60, similarity_threshold=0.5)
+        cache.set('मुझे बुखार है क्या करूं?', 'Fever answer')
+        cache.set('Что такое грипп?', 'Flu answer')
+
+        self.assertEqual(cache.get('मुझे बुखार है, क्या करूं'), 'Fever answer')
+        self.assertEqual(cache.get('что такое ГРИПП'), 'Flu answer')
+        self.assertIsNone(cache.get('मेरे सिर में दर्द है'))
+        self.assertIsNone(cache.get('Τι είναι η γρίπη;'))
+        # Nothing to match on: never cached, never served
+        cache.set('??? 🙂', 'Anything')
+        self.assertIsNone(cache.get('!!!'))
+        print("✅ Non-Latin questions cached separately")
+
+    @override_settings(CHATBOT_BACKEND='local', CHATBOT_CACHE_SIZE=16)
+    def test_standalone_questions_skip_llm(self):
+        """Test that a repeated standalone question does not call the LLM again"""
+        services.get_response_cache().clear()
+
+        services.get_gemini_response('Tips for hydration?')
+        services.get_gemini_response('tips for hydration')
+        self.assertEqual(get_backend().calls, 1)
+
+        # With history, always ask the model
+        history = [Message(content='Hi', is_from_user=True)]
+        services.get_gemini_response('tips for hydration', history)
+        self.assertEqual(get_backend().calls, 2)
+        print("✅ Standalone questions served from cache")
+
+
+class FailingBackend(LocalBackend):
+    """Backend whose every call fails, to check error handling"""
+
+    def generate(self, prompt):
+        self.calls += 1
+        raise ConnectionError('quota exceeded')
+
+
+class RefusingBackend(LocalBackend):
+    """Backend that refuses every prompt, like a safety block"""
+
+    def generate(self, prompt):
+        self.calls += 1
+        raise ValueError('Response blocked for SAFETY reasons')
+
+
+@override_settings(CHATBOT_BACKEND='local', CHATBOT_CACHE_SIZE=0)
+class ChatBackendTests(TestCase):
+    """Test choosing the chat backend from settings"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_backend_chosen_from_settings(self):
+        """Test that CHATBOT_BACKEND selects the backend"""
+        self.assertIsInstance(get_backend(), LocalBackend)
+        with override_settings(CHATBOT_BACKEND='chatbot.tests.FailingBackend'):
+            self.assertIsInstance(get_backend(), FailingBackend)
+        with override_settings(CHATBOT_BACKEND='nonexistent'):
+            with self.assertRaises(ImproperlyConfigured):
+                get_backend()
+        print("✅ Backend chosen from settings")
+
+    def test_local_backend_is_deterministic(self):
+        """Test that the offline backend answers without network"""
+        first = services.get_gemini_response('Is coffee bad for me?')
+        self.assertEqual(first, services.get_gemini_response('Is coffee bad for me?'))
+        self.assertIn('Is coffee bad for me?', first)
+        self.assertEqual(services.validate_api_key(), (True, 'local backend ready'))
+        print("✅ Local backend is deterministic")
+
+    def test_send_message_end_to_end(self):
+        """Test a full send_message round trip against the local backend"""
+        user = User.objects.create_user(username='backenduser', password='testpass123', user_type='patient')
+        self.client.force_login(user)
+
+        response = self.client.post(
+            '/chatbot/send/',
+            data=json.dumps({'message': 'How do I sleep better?'}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ai_response'], LocalBackend().reply('How do I sleep better?'))
+        self.assertEqual(Message.objects.filter(conversation__user=user).count(), 2)
+        print("✅ send_message works with the local backend")
+
+    @override_settings(CHATBOT_BACKEND='chatbot.tests.FailingBackend')
+    def test_backend_errors_become_friendly_messages(self):
+        """Test that backend exceptions are turned into user-facing messages"""
+        self.assertIn('high traffic', services.get_gemini_response('Hello'))
+        print("✅ Backend errors handled")
+
+
+class BackPressureTests(TestCase):
+    """Test the concurrency gate, rate limiter and circuit breaker"""
+
+    def test_gate_rejects_when_queue_full(self):
+        """Test that callers beyond the limit and queue are turned away"""
+        gate = ConcurrencyGate(limit=1, max_queue=0, timeout=1)
+        gate.acquire()
+        with self.assertRaises(QueueFull):
+            gate.acquire()
+        gate.release()
+        gate.acquire()
+        self.assertEqual(gate.stats()['rejected'], 1)
+        print("✅ Full queue rejects callers")
+
+    def test_gate_queue_times_out(self):
+        """Test that queued callers give up after the timeout"""
+        gate = ConcurrencyGate(limit=1, max_queue=5, timeout=0.01)
+        gate.acquire()
+        with self.assertRaises(QueueTimeout):
+            gate.acquire()
+        self.assertEqual(gate.stats()['queue_depth'], 0)
+        print("✅ Queued callers time out")
+
+    def test_token_bucket(self):
+        """Test that the bucket allows the burst, then refills at the rate"""
+        now = [0.0]
+        bucket = TokenBucket(rate_per_minute=60, burst=2, clock=lambda: now[0], sleep=lambda s: None)
+        bucket.acquire()
+        bucket.acquire()
+        with self.assertRaises(RateLimited):
+            bucket.acquire(timeout=0.5)
+        bucket.acquire(timeout=1.0)  # waits for the next token instead
+        now[0] = 5.0
+        bucket.acquire()
+        print("✅ Token bucket limits rate")
+
+    def test_circuit_breaker(self):
+        """Test closed -> open -> half-open -> closed"""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+
+        now[0] = 10.0
+        breaker.before_call()  # the single half-open trial
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        print("✅ Circuit breaker opens and recovers")
+
+    @override_settings(
+        CHATBOT_BACKEND='chatbot.tests.FailingBackend', CHATBOT_CACHE_SIZE=0,
+        CHATBOT_BREAKER_THRESHOLD=2, CHATBOT_BREAKER_RESET=60
+    )
+    def test_open_breaker_fails_fast(self):
+        """Test that once the breaker opens the backend is not called"""
+        for _ in range(3):
+            services.get_gemini_response('Hello')
+
+        self.assertEqual(get_backend().calls, 2)
+        self.assertEqual(services.get_gemini_response('Hello'), services.OVERLOADED_MESSAGE)
+        self.assertEqual(services.chat_metrics()['circuit_breaker']['state'], 'open')
+        print("✅ Open breaker fails fast")
+
+    async def test_cancelled_waiter_gives_slot_back(self):
+        """Test that a request cancelled while queued doesn't leak its slot"""
+        guard = LLMGuard(ConcurrencyGate(limit=1, max_queue=5, timeout=5), TokenBucket(), CircuitBreaker())
+        guard.acquire()
+        waiter = asyncio.ensure_future(guard.acquire_async())
+        while guard.gate.stats()['queue_depth'] == 0:
+            await asyncio.sleep(0.01)
+
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        guard.release(success=True)  # the queued thread now takes the slot...
+        for _ in range(200):
+            stats = guard.gate.stats()
+            if stats['admitted'] == 2 and stats['in_flight'] == 0:
+                break
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(guard.gate.stats()['in_flight'], 0)  # ...and hands it back
+        print("✅ Cancelled waiters release their slot")
+
+    @override_settings(
+        CHATBOT_BACKEND='chatbot.tests.RefusingBackend', CHATBOT_CACHE_SIZE=0,
+        CHATBOT_BREAKER_THRESHOLD=2, CHATBOT_BREAKER_RESET=60
+    )
+    def test_refused_prompts_leave_breaker_closed(self):
+        """Test that prompt-caused errors don't open the breaker for everyone"""
+        for _ in range(5):
+            self.assertIn('rephrase', services.get_gemini_response('Hello'))
+
+        self.assertEqual(get_backend().calls, 5)
+        self.assertEqual(services.chat_metrics()['circuit_breaker']['state'], 'closed')
+        print("✅ Refused prompts don't open the breaker")
+
+    def test_metrics_staff_only(self):
+        """Test that the metrics endpoint is limited to staff"""
+        user = User.objects.create_user(username='metricsuser', password='testpass123', user_type='patient')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/chatbot/metrics/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        data = self.client.get('/chatbot/metrics/').json()
+        self.assertIn('queue_depth', data['concurrency'])
+        self.assertIn('state', data['circuit_breaker'])
+        print("✅ Metrics endpoint limited to staff")
+
+
+class ConversationContextTests(TestCase):
+    """Test the token-budgeted prompt context"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='contextuser', password='testpass123', user_type='patient')
+        self.conversation = Conversation.objects.create(user=self.user)
+
+    def _add(self, count, content='Message {}. More detail here.'):
+        for i in range(count):
+            Message.objects.create(
+                conversation=self.conversation,
+                content=content.format(i),
+                is_from_user=i % 2 == 0
+            )
+
+    def test_newest_messages_used(self):
+        """Test that the newest messages (not the oldest) are in the context"""
+        self._add(30)
+
+        with self.assertNumQueries(4):  # summary fields, window, newly dropped turns, summary update
+            context = build_context(self.conversation, max_messages=10)
+
+        self.assertEqual([m.content for m in context.messages][-1], 'Message 29. More detail here.')
+        self.assertEqual(len(context.messages), 10)
+        print("✅ Newest messages used for context")
+
+    def test_token_budget_and_summary(self):
+        """Test that turns beyond the budget are summarized and persisted"""
+        self._add(6, content='Question {}. ' + 'word ' * 100)
+
+        context = build_context(self.conversation, max_messages=10, token_budget=300)
+
+        self.assertEqual(len(context.messages), 2)
+        self.assertEqual(len(context.summary.splitlines()), 4)
+        self.assertTrue(context.summary.startswith('User: Question 0.'))
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, context.summary)
+
+        # Next turn only folds in what has newly dropped out
+        self._add(2, content='Later {}. ' + 'word ' * 100)
+        context = build_context(self.conversation, max_messages=10, token_budget=300)
+        self.assertEqual(len(context.summary.splitlines()), 6)
+        print("✅ Older turns summarized within budget")
+
+    def test_prompt_includes_summary(self):
+        """Test that the prompt carries the summary and recent turns"""
+        self._add(4)
+        context = build_context(self.conversation, max_messages=2)
+        prompt = services.build_prompt('And now?', context)
+
+        self.assertIn('Summary of earlier conversation:\nUser: Message 0.', prompt)
+        self.assertIn('Recent conversation:\nUser: Message 2.', prompt)
+        self.assertTrue(prompt.endswith('Current User Question: And now?'))
+        print("✅ Prompt includes summary and recent turns")
+
+    def test_short_conversation_needs_two_queries(self):
+        """Test that a conversation that fits entirely costs the summary read and the window"""
+        self._add(3)
+        with self.assertNumQueries(2):
+            context = build_context(self.conversation, max_messages=10)
+        self.assertEqual(len(context.messages), 3)
+        self.assertEqual(context.summary, '')
+        print("✅ Short conversation needs two queries")
+
+    def test_stale_copy_doesnt_overwrite_summary(self):
+        """Test that a worker holding an old copy builds on another worker's newer summary"""
+        stale = Conversation.objects.get(pk=self.conversation.pk)
+        self._add(6, content='Question {}. ' + 'word ' * 100)
+        # Another worker has already summarized the first two messages
+        second = self.conversation.messages.order_by('id')[1]
+        Conversation.objects.filter(pk=self.conversation.pk).update(
+            summary='User: Digest from another worker', summarized_up_to=second.pk
+        )
+
+        context = build_context(stale, max_messages=10, token_budget=300)
+
+        lines = context.summary.splitlines()
+        self.assertEqual(lines[0], 'User: Digest from another worker')
+        self.assertEqual(len(lines), 3)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, context.summary)
+        print("✅ Stale conversation copies don't overwrite the summary")
+
+
+class MessageHistoryTests(TestCase):
+    """Test paginated chat history"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='historyuser', password='testpass123', user_type='patient')
+        self.conversation = Conversation.objects.create(user=self.user)
+        Message.objects.bulk_create([
+            Message(conversation=self.conversation, content=f'Message {i}', is_from_user=i % 2 == 0)
+            for i in range(70)
+        ])
+        self.client.force_login(self.user)
+
+    def test_chat_page_renders_newest_page(self):
+        """Test that the chat page renders only the newest messages"""
+        response = self.client.get('/chatbot/')
+
+        messages = response.context['messages']
+        self.assertEqual(len(messages), 30)
+        self.assertEqual(messages[-1].content, 'Message 69')
+        self.assertContains(response, 'data-next-cursor=')
+        print("✅ Chat page renders newest page")
+
+    def test_history_pages_backwards(self):
+        """Test that cursors walk back through every message exactly once"""
+        cursor = self.client.get('/chatbot/').context['history_cursor']
+        seen = []
+        while cursor:
+            data = self.client.get('/chatbot/history/', {'cursor': cursor}).json()
+            seen = [m['content'] for m in data['messages']] + seen
+            cursor = data['next_cursor']
+
+        self.assertEqual(seen, [f'Message {i}' for i in range(40)])
+        print("✅ History pages backwards")
+
+    def test_invalid_cursor_rejected(self):
+        """Test that a malformed cursor returns 400"""
+        response = self.client.get('/chatbot/history/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        print("✅ Invalid history cursor rejected")
+
+
+@override_settings(CHATBOT_BACKEND='local', CHATBOT_CACHE_SIZE=0)
+class ChatPersistenceTests(TestCase):
+    """Test how chat turns are written"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='persistuser', password='testpass123', user_type='patient')
+        self.client.force_login(self.user)
+
+    def _send(self, message):
+        return self.client.post(
+            '/chatbot/send/',
+            data=json.dumps({'message': message}),
+            content_type='application/json'
+        )
+
+    def test_turn_saved_in_one_insert(self):
+        """Test that a repeat turn needs only the context read and two writes"""
+        self._send('First question')
+        conversation = Conversation.objects.get(user=self.user)
+        before = conversation.updated_at
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self._send('Second question').json()
+
+        # Summary and context reads, one insert for both messages, one timestamp update
+        chat_queries = [q['sql'].split()[0] for q in queries if 'chatbot_' in q['sql']]
+        self.assertEqual(chat_queries, ['SELECT', 'SELECT', 'INSERT', 'UPDATE'])
+
+        contents = list(conversation.messages.values_list('content', 'is_from_user'))
+        self.assertEqual(contents[2], ('Second question', True))
+        self.assertEqual(contents[3][1], False)
+        self.assertEqual(data['ai_message_id'], conversation.messages.last().id)
+        conversation.refresh_from_db()
+        self.assertGreater(conversation.updated_at, before)
+        print("✅ Chat turn saved in one insert")
+
+    def test_deleted_conversation_not_served_from_cache(self):
+        """Test that deleting a conversation drops the cached copy"""
+        self._send('Hello')
+        Conversation.objects.filter(user=self.user).delete()
+
+        response = self._send('Hello again')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Conversation.objects.get(user=self.user).messages.count(), 2)
+        print("✅ Deleted conversation not served from cache")
+
+    def test_conversation_deleted_elsewhere_recreated(self):
+        """Test that a cached id whose row another process deleted is dropped, not a 500"""
+        self._send('Hello')
+        # Another process's delete: this process's cache never hears about it
+        post_delete.disconnect(forget_conversation, sender=Conversation)
+        try:
+            Conversation.objects.filter(user=self.user).delete()
+        finally:
+            post_delete.connect(forget_conversation, sender=Conversation)
+
+        response = self._send('Hello again')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        conversation = Conversation.objects.get(user=self.user)
+        self.assertEqual(conversation.messages.count(), 2)
+        self.assertEqual(cache.get(conversation_cache_key(self.user.pk)), conversation.pk)
+        print("✅ Conversation deleted elsewhere recreated")
+
+
+@override_settings(CHATBOT_BACKEND='local', CHATBOT_CACHE_SIZE=0, CHATBOT_JOB_QUEUE='database')
+class ChatJobTests(TestCase):
+    """Test queued chat generation"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='jobuser', password='testpass123', user_type='patient')
+
+    def _send(self, message):
+        return self.client.post(
+            '/chatbot/send/',
+            data=json.dumps({'message': message}),
+            content_type='application/json'
+        )
+
+    def test_send_returns_job_immediately(self):
+        """Test that send_message queues a job instead of calling the LLM"""
+        response = self._send('Is walking good exercise?')
+
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual(data['status'], 'queued')
+        self.assertEqual(self.client.get(data['poll_url']).json()['status'], 'queued')
+        print("✅ send_message returns a job id")
+
+    def test_worker_completes_job(self):
+        """Test that the worker generates and saves the reply"""
+        self.client.force_login(self.user)
+        poll_url = self._send('Is walking good exercise?').json()['poll_url']
+
+        call_command('run_chat_worker', '--once', '--concurrency', '1', stdout=StringIO())
+
+        data = self.client.get(poll_url).json()
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['ai_response'], LocalBackend().reply('Is walking good exercise?'))
+        self.assertEqual(Message.objects.filter(conversation__user=self.user).count(), 2)
+        print("✅ Worker completes queued job")
+
+    def test_job_claimed_once(self):
+        """Test that a job can only be claimed by one worker"""
+        from .jobs import claim_job, claim_next_job, requeue_stale_jobs
+
+        job = ChatJob.objects.create(message='Hello')
+        self.assertEqual(claim_next_job().pk, job.pk)
+        self.assertIsNone(claim_job(job.pk))
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(requeue_stale_jobs(timeout=-1), 1)
+        print("✅ Jobs claimed once")
+
+    def test_other_users_job_hidden(self):
+        """Test that a user's job can't be polled by someone else"""
+        self.client.force_login(self.user)
+        poll_url = self._send('Private question').json()['poll_url']
+        self.client.logout()
+
+        self.assertEqual(self.client.get(poll_url).status_code, 404)
+        print("✅ Other users' jobs hidden")
+
+    def test_finished_jobs_purged(self):
+        """Test that finished jobs are deleted after the retention period"""
+        from .jobs import purge_finished_jobs
+
+        old = timezone.now() - timedelta(hours=30)
+        ChatJob.objects.create(message='Old guest question', status='done')
+        ChatJob.objects.create(message='Old failure', status='failed')
+        ChatJob.objects.create(message='Still waiting', status='queued')
+        ChatJob.objects.filter(status__in=['done', 'failed', 'queued']).update(created_at=old)
+        recent = ChatJob.objects.create(message='Recent', status='done')
+
+        self.assertEqual(purge_finished_jobs(max_age_hours=24), 2)
+        self.assertEqual(
+            set(ChatJob.objects.values_list('message', flat=True)), {'Still waiting', recent.message}
+        )
+        print("✅ Finished jobs purged")
+
+    def test_worker_requeues_stale_jobs_while_running(self):
+        """Test that the worker loop requeues jobs of dead workers, not only at startup"""
+        from .management.commands.run_chat_worker import Command
+
+        command = Command(stdout=StringIO())
+        command.maintain()
+        job = ChatJob.objects.create(message='Orphaned', status='running', started_at=timezone.now() - timedelta(hours=1))
+
+        command.maintain_if_due()  # not due yet
+        self.assertEqual(ChatJob.objects.get(pk=job.pk).status, 'running')
+        command._last_maintenance -= 3600
+        command.maintain_if_due()
+        self.assertEqual(ChatJob.objects.get(pk=job.pk).status, 'queued')
+        print("✅ Worker requeues stale jobs periodically")
+
+    def test_requeued_job_finished_once(self):
+        """Test that a slow worker whose job was requeued and re-run doesn't save a second turn"""
+        from .jobs import claim_next_job, process_job, requeue_stale_jobs
+
+        self.client.force_login(self.user)
+        poll_url = self._send('Is walking good exercise?').json()['poll_url']
+        slow = claim_next_job()
+        requeue_stale_jobs(timeout=-1)
+        fresh = claim_next_job()
+        self.assertEqual(fresh.pk, slow.pk)
+
+        process_job(fresh)
+        process_job(slow)
+
+        self.assertEqual(Message.objects.filter(conversation__user=self.user).count(), 2)
+        data = self.client.get(poll_url).json()
+        self.assertEqual(data['status'], 'done')
+        job = ChatJob.objects.get(pk=fresh.pk)
+        self.assertEqual((job.user_message, job.ai_message), (fresh.user_message, fresh.ai_message))
+        print("✅ Requeued job finished once")
+
+    def test_invalid_queue_mode_fails_system_check(self):
+        """Test that a typo in CHATBOT_JOB_QUEUE is reported at startup"""
+        from .checks import check_job_queue
+
+        self.assertEqual(check_job_queue(None), [])
+        with override_settings(CHATBOT_JOB_QUEUE='databse'):
+            errors = check_job_queue(None)
+        self.assertEqual([error.id for error in errors], ['chatbot.E001'])
+        print("✅ Invalid job queue mode caught by system check")
+
@@ -6,4 +6,8 @@ app_name = 'chatbot'
 urlpatterns = [
     path('', views.chat_page, name='chat'),
     path('send/', views.send_message, name='send_message'),
+    path('stream/', views.stream_message, name='stream_message'),
+    path('jobs/<uuid:job_id>/', views.job_status, name='job_status'),
+    path('history/', views.message_history, name='history'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -1,24 +1,69 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
+from asgiref.sync import sync_to_async
 import json
-from .models import Conversation, Message
-from .services import get_gemini_response
+import logging
+from .models import ChatJob, Conversation
+from .jobs import queue_mode, submit_job
+from .persistence import load_conversation, save_turn
+from core.pagination import paginate_keyset, InvalidCursor
+from .services import chat_metrics, get_gemini_response, stream_gemini_response
 from django.contrib import messages
 
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 1000
+
+# Messages per history page; older pages load as the user scrolls up
+HISTORY_PAGE_SIZE = 30
+HISTORY_ORDERING = ('-created_at', '-id')
+
+def parse_user_message(request):
+    """
+    Read and validate the chat message from a JSON request body
+    Returns (message, None) or (None, error JsonResponse)
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return None, JsonResponse({'error': 'Invalid JSON format'}, status=400)
+    
+    user_message = str(data.get('message', '')).strip() if isinstance(data, dict) else ''
+    
+    if not user_message:
+        return None, JsonResponse({'error': 'Message cannot be empty'}, status=400)
+    
+    # Limit message length
+    if len(user_message) > MAX_MESSAGE_LENGTH:
+        return None, JsonResponse({'error': 'Message too long. Please limit to 1000 characters.'}, status=400)
+    
+    return user_message, None
+
+def sse_event(event, data):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 def chat_page(request):
     """
     Public chat page - accessible to everyone
     Logged-in users get saved history, guests don't
     """
-    context = {}
+    context = {
+        # Replies are queued as background jobs instead of streamed
+        'use_job_queue': queue_mode() != 'inline',
+    }
     
-    # If user is logged in, load their conversation history
+    # If user is logged in, load the newest page of their history;
+    # chat.js fetches older pages from chatbot:history on scroll
     if request.user.is_authenticated:
         try:
             conversation = Conversation.objects.get(user=request.user)
-            context['messages'] = conversation.messages.all()[:50]  # Last 50 messages
+            page = paginate_keyset(conversation.messages.all(), HISTORY_ORDERING, page_size=HISTORY_PAGE_SIZE)
+            context['messages'] = page.items[::-1]  # Oldest first on screen
+            context['history_cursor'] = page.next_cursor
         except Conversation.DoesNotExist:
             context['messages'] = []
     else:
@@ -28,6 +73,40 @@ def chat_page(request):
     
     return render(request, 'chatbot/chat.html', context)
 
+@login_required
+def message_history(request):
+    """
+    JSON page of older messages, newest page first
+    Pass the previous response's next_cursor as ?cursor= to go further back;
+    messages in each page are oldest first, ready to prepend
+    """
+    conversation = Conversation.objects.filter(user=request.user).first()
+    if conversation is None:
+        return JsonResponse({'messages': [], 'next_cursor': None})
+    
+    try:
+        page = paginate_keyset(
+            conversation.messages.all(),
+            HISTORY_ORDERING,
+            cursor=request.GET.get('cursor'),
+            page_size=HISTORY_PAGE_SIZE,
+        )
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    return JsonResponse({
+        'messages': [
+            {
+                'id': message.id,
+                'content': message.content,
+                'is_from_user': message.is_from_user,
+                'created_at': message.created_at.isoformat(),
+            }
+            for message in reversed(page.items)
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
 # ✅ REMOVED @csrf_exempt - Now using proper CSRF token
 @require_http_methods(["POST"])
 def send_message(request):
@@ -36,51 +115,38 @@ def send_message(request):
     Works for both logged-in users and guests
     ✅ FIXED: Now properly handles CSRF tokens
     """
+    user_message, error_response = parse_user_message(request)
+    if error_response:
+        return error_response
+    
+    # Hand the reply to the background workers and answer right away;
+    # the browser polls job_status for the result
+    if queue_mode() != 'inline':
+        job = submit_job(request.user if request.user.is_authenticated else None, user_message)
+        return JsonResponse({
+            'success': True,
+            'job_id': str(job.id),
+            'status': job.status,
+            'poll_url': reverse('chatbot:job_status', args=[job.id]),
+        }, status=202)
+    
     try:
-        data = json.loads(request.body)
-        user_message = data.get('message', '').strip()
-        
-        if not user_message:
-            return JsonResponse({'error': 'Message cannot be empty'}, status=400)
-        
-        # Limit message length
-        if len(user_message) > 1000:
-            return JsonResponse({'error': 'Message too long. Please limit to 1000 characters.'}, status=400)
-        
         # Get conversation history for context
-        recent_messages = []
+        history = None
         
         # Only save for logged-in users
         if request.user.is_authenticated:
-            # Get or create conversation
-            conversation, created = Conversation.objects.get_or_create(
-                user=request.user,
-                defaults={'user': request.user}
-            )
-            
-            # Save user message
-            user_msg = Message.objects.create(
-                conversation=conversation,
-                content=user_message,
-                is_from_user=True
-            )
-            
-            # Get conversation history (last 10 messages for performance)
-            recent_messages = conversation.messages.all()[:10]
+            # Get or create conversation (cached per user), with the newest
+            # messages within the prompt budget plus a summary of older ones
+            conversation, history = load_conversation(request.user)
         
         # Get AI response (works for both logged-in and guest users)
-        ai_response = get_gemini_response(user_message, recent_messages)
+        ai_response = get_gemini_response(user_message, history)
         
-        # Save AI response only for logged-in users
+        # Save the turn only for logged-in users
         if request.user.is_authenticated:
-            ai_msg = Message.objects.create(
-                conversation=conversation,
-                content=ai_response,
-                is_from_user=False
-            )
-            
-            # Update conversation timestamp
-            conversation.save()
+            # Both messages in one insert, plus the conversation timestamp
+            user_msg, ai_msg = save_turn(conversation, user_message, ai_response)
             
             return JsonResponse({
                 'success': True,
@@ -98,11 +164,91 @@ def send_message(request):
                 'message': 'Login to save your conversation history'
             })
         
-    except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON format'}, status=400)
     except Exception as e:
         print(f"Chat error: {e}")  # For debugging
         return JsonResponse({
             'error': 'Something went wrong. Please try again.',
             'debug': str(e) if request.user.is_superuser else None
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+@require_http_methods(["GET"])
+def job_status(request, job_id):
+    """
+    Poll a queued chat reply
+    Once done, the payload matches send_message's inline response
+    """
+    job = ChatJob.objects.filter(pk=job_id).first()
+    # Guests' jobs are only reachable by their random id
+    if job is None or (job.user_id is not None and job.user_id != request.user.pk):
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    
+    data = {'job_id': str(job.id), 'status': job.status}
+    if job.status == 'done':
+        data.update({
+            'success': True,
+            'ai_response': job.response,
+            'is_authenticated': job.user_id is not None,
+            'user_message_id': job.user_message_id,
+            'ai_message_id': job.ai_message_id,
+        })
+    elif job.status == 'failed':
+        data['error'] = 'Something went wrong. Please try again.'
+    return JsonResponse(data)
+
+@require_http_methods(["POST"])
+async def stream_message(request):
+    """
+    Stream the AI response as Server-Sent Events while it is generated
+    Runs as an async view (served through asgi.py), so a slow LLM call does
+    not hold a worker; the turn is saved once the stream ends
+    """
+    user_message, error_response = parse_user_message(request)
+    if error_response:
+        return error_response
+    
+    user = await request.auser()
+    conversation = None
+    history = None
+    
+    # Only save for logged-in users
+    if user.is_authenticated:
+        # Newest messages within the prompt budget, plus a summary of older ones
+        conversation, history = await sync_to_async(load_conversation)(user)
+    
+    async def event_stream():
+        chunks = []
+        async for chunk in stream_gemini_response(user_message, history):
+            chunks.append(chunk)
+            yield sse_event('token', {'text': chunk})
+        
+        done = {'is_authenticated': conversation is not None}
+        if conversation is not None:
+            try:
+                # Both messages in one insert, plus the conversation timestamp
+                user_msg, ai_msg = await sync_to_async(save_turn)(
+                    conversation, user_message, ''.join(chunks).strip()
+                )
+                done.update(user_message_id=user_msg.id, ai_message_id=ai_msg.id)
+            except Exception as e:
+                logger.error(f"Failed to save streamed chat turn: {e}")
+                done['error'] = 'Your conversation could not be saved.'
+        else:
+            done['message'] = 'Login to save your conversation history'
+        
+        yield sse_event('done', done)
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
+
+@login_required
+def metrics(request):
+    """
+    LLM back-pressure metrics for this worker process (staff only):
+    queue depth and wait times, rate limiting, breaker state, cache hits
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff access required'}, status=403)
+    return JsonResponse(chat_metrics())
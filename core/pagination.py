@@ -0,0 +1,106 @@
+"""
+Keyset (cursor) pagination shared by the history and list pages.
+
+Instead of OFFSET, each page continues strictly after the last row of the
+previous one, so page N costs the same as page 1 when the ordering is backed
+by an index. Cursors are opaque URL-safe strings holding the ordering values
+of that last row.
+"""
+import base64
+import datetime
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded for the given ordering"""
+
+
+@dataclass
+class KeysetPage:
+    items: list = field(default_factory=list)
+    next_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _json_value(value):
+    # Full-precision ISO strings; DjangoJSONEncoder would drop microseconds
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _split(ordering):
+    names = [name.lstrip('-') for name in ordering]
+    descending = {name.startswith('-') for name in ordering}
+    if len(descending) != 1:
+        raise ValueError('Keyset ordering fields must all sort in the same direction')
+    return names, descending.pop()
+
+
+def encode_cursor(obj, ordering):
+    """Cursor pointing just past ``obj`` (a model instance or values() dict)"""
+    names, _ = _split(ordering)
+    if isinstance(obj, dict):
+        values = [obj[name] for name in names]
+    else:
+        values = [getattr(obj, name) for name in names]
+    raw = json.dumps(values, default=_json_value).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Ordering values stored in ``cursor``, converted back to Python types"""
+    names, _ = _split(ordering)
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(names):
+            raise ValueError('wrong number of values')
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(names, values)]
+    except (ValueError, TypeError, ValidationError) as e:
+        raise InvalidCursor(f'Invalid cursor: {e}')
+
+
+def after_cursor(queryset, ordering, values):
+    """Filter ``queryset`` to rows strictly after ``values`` in ``ordering``"""
+    names, descending = _split(ordering)
+    lookup = 'lt' if descending else 'gt'
+
+    # (a, b, c) > (x, y, z)  ==  a > x  OR  (a = x AND b > y)  OR  ...
+    condition = Q()
+    for i, name in enumerate(names):
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for prior, value in zip(names[:i], values[:i]):
+            clause &= Q(**{prior: value})
+        condition |= clause
+    return queryset.filter(condition)
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=20):
+    """
+    Return a KeysetPage of at most ``page_size`` rows of ``queryset`` in
+    ``ordering`` (e.g. ``('-created_at', '-id')``; the last field must be
+    unique). Raises InvalidCursor for a malformed cursor.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = after_cursor(queryset, ordering, decode_cursor(cursor, queryset.model, ordering))
+
+    rows = list(queryset[:page_size + 1])
+    page = KeysetPage(items=rows[:page_size])
+    if len(rows) > page_size:
+        page.next_cursor = encode_cursor(rows[page_size - 1], ordering)
+    return page
@@ -0,0 +1,108 @@
+"""
+Request coalescing for single-quote API calls.
+
+Concurrent requests in one process that arrive within a few milliseconds of
+each other are gathered and scored with a single predict_batch() call. The
+first request to arrive leads: it waits up to ``window`` seconds (or until
+``max_batch`` requests are queued), scores everything queued, and hands each
+waiting request its own row. Only threaded workers see a benefit; with sync
+workers each batch is simply size one.
+"""
+import threading
+
+from django.conf import settings
+
+from .ml_model import FEATURE_NAMES, get_predictor
+
+
+class _Pending:
+    """One queued applicant and the slot its result is delivered to"""
+
+    __slots__ = ('applicant', 'done', 'result', 'error')
+
+    def __init__(self, applicant):
+        self.applicant = applicant
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PredictionBatcher:
+    """Coalesce concurrent predictions into vectorized batches"""
+
+    def __init__(self, window=0.002, max_batch=256):
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.requests = 0
+        self._queue = []
+        self._leader_active = False
+        self._cond = threading.Condition()
+
+    def predict(self, applicant):
+        """
+        Score one applicant dict; returns ``(cost, contributions)`` where
+        contributions maps each FEATURE_NAMES entry to coefficient × value.
+        """
+        pending = _Pending(applicant)
+        with self._cond:
+            self._queue.append(pending)
+            self.requests += 1
+            lead = not self._leader_active
+            if lead:
+                self._leader_active = True
+            elif len(self._queue) >= self.max_batch:
+                self._cond.notify_all()
+
+        if lead:
+            with self._cond:
+                if self.window > 0:
+                    self._cond.wait_for(lambda: len(self._queue) >= self.max_batch, timeout=self.window)
+                batch, self._queue = self._queue, []
+                self._leader_active = False
+                self.batches += 1
+            self._run(batch)
+
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run(self, batch):
+        try:
+            costs, contributions = get_predictor().predict_batch(
+                [pending.applicant for pending in batch], return_contributions=True
+            )
+            for pending, cost, row in zip(batch, costs, contributions):
+                pending.result = (float(cost), dict(zip(FEATURE_NAMES, row.tolist())))
+        except Exception as e:
+            for pending in batch:
+                pending.error = e
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+            }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """Process-wide batcher configured from INSURANCE_BATCH_WINDOW_MS / INSURANCE_BATCH_MAX_SIZE"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = PredictionBatcher(
+                    window=getattr(settings, 'INSURANCE_BATCH_WINDOW_MS', 2) / 1000.0,
+                    max_batch=getattr(settings, 'INSURANCE_BATCH_MAX_SIZE', 256),
+                )
+    return _batcher
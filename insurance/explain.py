@@ -0,0 +1,119 @@
+"""
+Explanations shown alongside a prediction.
+
+Risk factors are described by a static rule table instead of per-view
+if-chains, so the saved-result and guest-result pages share one evaluator.
+Feature importance comes from the predictor, which caches it per model version,
+and the per-prediction breakdown is read back from what was stored at scoring time.
+"""
+import operator
+
+from .ml_model import FEATURE_LABELS, FEATURE_NAMES, MIN_PREDICTED_COST, get_predictor
+
+# Each group lists (field, comparison, threshold, factor) rules; the first
+# matching rule in a group wins, so e.g. only one BMI factor is reported.
+RISK_FACTOR_RULES = (
+    (
+        ('smoker', operator.eq, 'yes', {
+            'factor': 'Smoking',
+            'impact': 'Very High',
+            'recommendation': 'Quitting smoking can significantly reduce insurance costs'
+        }),
+    ),
+    (
+        ('bmi', operator.gt, 30, {
+            'factor': 'High BMI',
+            'impact': 'High',
+            'recommendation': 'Maintaining a healthy weight can lower costs'
+        }),
+        ('bmi', operator.gt, 25, {
+            'factor': 'Overweight BMI',
+            'impact': 'Moderate',
+            'recommendation': 'Consider weight management for better rates'
+        }),
+    ),
+    (
+        ('age', operator.gt, 50, {
+            'factor': 'Age',
+            'impact': 'Moderate',
+            'recommendation': 'Regular health checkups are important'
+        }),
+    ),
+)
+
+
+def _value(prediction, field):
+    if isinstance(prediction, dict):
+        return prediction[field]
+    return getattr(prediction, field)
+
+
+def evaluate_risk_factors(prediction):
+    """
+    Risk factors for a saved InsurancePrediction or a guest-session dict.
+    The returned factor dicts are shared; do not mutate them.
+    """
+    risk_factors = []
+    for group in RISK_FACTOR_RULES:
+        for field, compare, threshold, factor in group:
+            if compare(_value(prediction, field), threshold):
+                risk_factors.append(factor)
+                break
+    return risk_factors
+
+
+def contribution_items(breakdown, cost, intercept):
+    """
+    Rows of [{'label', 'value', 'kind'}] that add up to ``cost``: the base
+    cost, the non-zero feature contributions (largest effect first) and,
+    when the quote was raised to MIN_PREDICTED_COST, the floor adjustment.
+    ``intercept`` is the one stored with the prediction; without it the
+    base cost row also absorbs any floor adjustment.
+    Returns [] for predictions saved without a breakdown.
+    """
+    if not breakdown:
+        return []
+    features = sorted(
+        (
+            {'label': FEATURE_LABELS[name], 'value': value, 'kind': 'feature'}
+            for name, value in breakdown.items()
+            if value
+        ),
+        key=lambda item: abs(item['value']),
+        reverse=True,
+    )
+    total = sum(breakdown.values())
+    
+    # Whatever the contributions don't explain is base cost plus any floor
+    # adjustment; the scoring model's intercept tells the two apart
+    floor = 0.0
+    if intercept is not None and cost <= MIN_PREDICTED_COST:
+        floor = max(round(cost - intercept - total, 2), 0.0)
+    
+    items = [{'label': 'Base cost', 'value': cost - total - floor, 'kind': 'base'}, *features]
+    if floor:
+        items.append({'label': 'Minimum quote adjustment', 'value': floor, 'kind': 'floor'})
+    return items
+
+
+def _breakdown(prediction):
+    if isinstance(prediction, dict):
+        return dict(zip(FEATURE_NAMES, prediction.get('contributions') or ()))
+    return prediction.contribution_breakdown
+
+
+def _intercept(prediction):
+    if isinstance(prediction, dict):
+        return prediction.get('intercept')
+    return prediction.intercept
+
+
+def explain_prediction(prediction):
+    """Template context explaining one prediction"""
+    return {
+        'feature_importance': get_predictor().get_feature_importance(),
+        'risk_factors': evaluate_risk_factors(prediction),
+        'contributions': contribution_items(
+            _breakdown(prediction), float(_value(prediction, 'predicted_cost')), _intercept(prediction)
+        ),
+    }
@@ -1,6 +1,32 @@
+import math
+
 from django import forms
 from .models import InsurancePrediction
 
+
+def validate_age(age):
+    """Shared age rule for the predictor form and bulk roster uploads"""
+    if age is not None and age < 18:
+        raise forms.ValidationError('Age must be at least 18 years.')
+    if age is not None and age > 100:
+        raise forms.ValidationError('Please enter a valid age.')
+    return age
+
+
+def validate_bmi(bmi):
+    """Shared BMI rule for the predictor form and bulk roster uploads"""
+    # NaN compares False both ways, so check finiteness explicitly
+    if bmi is not None and (not math.isfinite(bmi) or bmi < 10 or bmi > 60):
+        raise forms.ValidationError('Please enter a valid BMI between 10 and 60.')
+    return bmi
+
+
+def validate_children(children):
+    """Shared number-of-children rule for the predictor form and bulk roster uploads"""
+    if children is not None and (children < 0 or children > 10):
+        raise forms.ValidationError('Number of children must be between 0 and 10.')
+    return children
+
 class InsurancePredictionForm(forms.ModelForm):
     """Form for insurance cost prediction"""
     
@@ -54,15 +80,26 @@ class InsurancePredictionForm(forms.ModelForm):
         }
     
     def clean_age(self):
-        age = self.cleaned_data.get('age')
-        if age and age < 18:
-            raise forms.ValidationError('Age must be at least 18 years.')
-        if age and age > 100:
-            raise forms.ValidationError('Please enter a valid age.')
-        return age
+        return validate_age(self.cleaned_data.get('age'))
     
     def clean_bmi(self):
-        bmi = self.cleaned_data.get('bmi')
-        if bmi and (bmi < 10 or bmi > 60):
-            raise forms.ValidationError('Please enter a valid BMI between 10 and 60.')
-        return bmi
\ No newline at end of file
+        return validate_bmi(self.cleaned_data.get('bmi'))
+    
+    def clean_children(self):
+        return validate_children(self.cleaned_data.get('children'))
+
+
+class RosterUploadForm(forms.Form):
+    """Form for uploading a CSV or NDJSON roster of applicants"""
+    
+    roster = forms.FileField(
+        label='Roster file',
+        help_text='CSV with a header row, or NDJSON (one JSON object per line). '
+                  'Columns: age, sex, bmi, children, smoker, region',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.ndjson,.jsonl'})
+    )
+    save_predictions = forms.BooleanField(
+        required=False,
+        label='Save predictions to my history',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
\ No newline at end of file
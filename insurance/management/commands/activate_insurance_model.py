@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from insurance import registry
+
+
+class Command(BaseCommand):
+    help = 'List stored insurance model versions, or make one of them active'
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', nargs='?', help='Version to activate, e.g. v0003')
+
+    def handle(self, *args, **options):
+        if options['version']:
+            try:
+                registry.activate(options['version'])
+            except registry.ModelRegistryError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Model {options['version']} is now active"))
+            return
+
+        active = registry.active_version()
+        versions = registry.list_versions()
+        if not versions:
+            self.stdout.write('No trained model versions found.')
+            return
+        for version in versions:
+            metadata = registry.load_artifact(version)['metadata']
+            marker = '*' if version == active else ' '
+            self.stdout.write(
+                f"{marker} {version}  {metadata.get('algorithm', '?'):5}  "
+                f"rows={metadata.get('rows', '?')}  r2={metadata.get('r2', '?')}  {metadata.get('trained_at', '')}"
+            )
@@ -0,0 +1,112 @@
+import csv
+import time
+from itertools import islice
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from insurance import registry
+from insurance.ml_model import FEATURE_NAMES, INPUT_FIELDS, InsuranceCostPredictor
+
+
+class Command(BaseCommand):
+    help = (
+        'Fit the insurance cost regression on a CSV dataset and store it as a '
+        'new versioned model artifact'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', help='CSV with age, sex, bmi, children, smoker, region and a target column')
+        parser.add_argument('--target', default='charges', help='Target column name (default: charges)')
+        parser.add_argument('--alpha', type=float, default=0.0,
+                            help='L2 (ridge) penalty; 0 fits ordinary least squares')
+        parser.add_argument('--chunk-size', type=int, default=100_000,
+                            help='Rows encoded per vectorized step (default: 100000)')
+        parser.add_argument('--no-activate', action='store_true',
+                            help='Store the artifact without making it the active model')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        encoder = InsuranceCostPredictor()
+        width = len(FEATURE_NAMES) + 1  # + intercept column
+
+        # Accumulate the normal equations chunk by chunk so memory stays flat
+        xtx = np.zeros((width, width))
+        xty = np.zeros(width)
+        yty = 0.0
+        y_sum = 0.0
+        n_rows = 0
+
+        try:
+            with open(options['dataset'], newline='', encoding='utf-8-sig') as f:
+                reader = csv.DictReader(f)
+                fieldnames = [name.strip().lower() for name in (reader.fieldnames or [])]
+                missing = [name for name in INPUT_FIELDS + (options['target'],) if name not in fieldnames]
+                if missing:
+                    raise CommandError(f"Dataset is missing column(s): {', '.join(missing)}")
+                reader.fieldnames = fieldnames
+                numbered = ((reader.line_num, row) for row in reader)
+                needed = INPUT_FIELDS + (options['target'],)
+
+                while True:
+                    chunk = list(islice(numbered, options['chunk_size']))
+                    if not chunk:
+                        break
+                    line_numbers = [line for line, row in chunk]
+                    rows = [row for line, row in chunk]
+                    for line, row in chunk:
+                        if any(row[name] is None for name in needed):
+                            raise CommandError(f'Line {line} has fewer cells than the header')
+                    columns = {name: [row[name] for row in rows] for name in INPUT_FIELDS}
+                    features = encoder.encode_batch(columns)
+                    design = np.hstack([features, np.ones((features.shape[0], 1))])
+                    target = np.asarray([row[options['target']] for row in rows], dtype=np.float64)
+
+                    # One nan/inf cell would make the whole solve fail
+                    finite = np.isfinite(design).all(axis=1) & np.isfinite(target)
+                    if not finite.all():
+                        line = line_numbers[int(np.argmin(finite))]
+                        raise CommandError(f'Line {line} contains a missing or non-finite value')
+
+                    xtx += design.T @ design
+                    xty += design.T @ target
+                    yty += float(target @ target)
+                    y_sum += float(target.sum())
+                    n_rows += len(rows)
+        except OSError as e:
+            raise CommandError(f'Cannot read dataset: {e}')
+        except ValueError as e:
+            raise CommandError(f'Dataset contains a non-numeric value: {e}')
+
+        if n_rows <= width:
+            raise CommandError(f'Need more than {width} rows to fit the model, got {n_rows}')
+
+        # Ridge penalty applies to the feature weights, never the intercept
+        penalty = np.eye(width) * options['alpha']
+        penalty[-1, -1] = 0.0
+        try:
+            solution = np.linalg.lstsq(xtx + penalty, xty, rcond=None)[0]
+        except np.linalg.LinAlgError as e:
+            raise CommandError(f'Could not fit the model: {e}')
+        coefficients, intercept = solution[:-1], float(solution[-1])
+
+        sse = yty - 2 * solution @ xty + solution @ xtx @ solution
+        sst = yty - y_sum ** 2 / n_rows
+        r_squared = 1 - sse / sst if sst else 0.0
+
+        metadata = {
+            'algorithm': 'ridge' if options['alpha'] else 'ols',
+            'alpha': options['alpha'],
+            'rows': n_rows,
+            'r2': round(float(r_squared), 6),
+            'dataset': str(options['dataset']),
+            'trained_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        }
+        version = registry.save_artifact(FEATURE_NAMES, coefficients, intercept, metadata)
+        if not options['no_activate']:
+            registry.activate(version)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained model {version} on {n_rows} rows in {time.monotonic() - started:.1f}s "
+            f"(R² = {r_squared:.4f}){'' if options['no_activate'] else ', now active'}"
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='insuranceprediction',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='insuranceprediction',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='insurance_pred_user_recent'),
+        ),
+    ]
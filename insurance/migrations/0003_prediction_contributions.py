@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance', '0002_prediction_user_recent_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insuranceprediction',
+            name='contributions',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
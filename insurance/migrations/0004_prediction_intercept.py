@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance', '0003_prediction_contributions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insuranceprediction',
+            name='intercept',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,7 +1,125 @@
 import numpy as np
 import pickle
 import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping
 from pathlib import Path
+from django.conf import settings
+from . import registry
+
+# Column order of the design matrix and of the coefficient vector
+FEATURE_NAMES = (
+    'age',
+    'sex_male',
+    'bmi',
+    'children',
+    'smoker_yes',
+    'region_northwest',
+    'region_southeast',
+    'region_southwest',
+)
+
+# Raw applicant fields accepted by predict() / predict_batch()
+INPUT_FIELDS = ('age', 'sex', 'bmi', 'children', 'smoker', 'region')
+
+# Display names for the per-feature contribution breakdown
+FEATURE_LABELS = {
+    'age': 'Age',
+    'sex_male': 'Sex (male)',
+    'bmi': 'BMI',
+    'children': 'Number of Children',
+    'smoker_yes': 'Smoking',
+    'region_northwest': 'Region (northwest)',
+    'region_southeast': 'Region (southeast)',
+    'region_southwest': 'Region (southwest)',
+}
+
+# Stored contribution breakdowns are little-endian float32 in FEATURE_NAMES order
+CONTRIBUTION_DTYPE = np.dtype('<f4')
+
+# Predictions are never quoted below this amount
+MIN_PREDICTED_COST = 1000.0
+
+# Version labels for models that do not come from the registry
+LEGACY_VERSION = 'legacy'
+BUILTIN_VERSION = 'builtin'
+
+# One loaded model. The predictor swaps the whole tuple at once, so a
+# reader that takes it once never mixes coefficients from two versions.
+ModelState = namedtuple('ModelState', ['coefficients', 'intercept', 'coefficient_vector', 'version'])
+
+def pack_contributions(values):
+    """Pack one row of contributions into bytes for InsurancePrediction.contributions"""
+    return np.asarray(values, dtype=CONTRIBUTION_DTYPE).tobytes()
+
+
+def unpack_contributions(blob):
+    """
+    Inverse of pack_contributions(); returns {feature name: value}
+    or an empty dict for missing/mismatched data
+    """
+    if not blob:
+        return {}
+    values = np.frombuffer(bytes(blob), dtype=CONTRIBUTION_DTYPE)
+    if values.shape[0] != len(FEATURE_NAMES):
+        return {}
+    return dict(zip(FEATURE_NAMES, values.tolist()))
+
+
+class PredictionCache:
+    """
+    Bounded LRU of predict() results keyed by the normalized feature tuple.
+    Entries belong to one model version; a new version empties the cache.
+    """
+    
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, version, key):
+        """Return the cached cost, or None on a miss"""
+        with self._lock:
+            if version == self.version and key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, version, key, value):
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+    
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
 
 class InsuranceCostPredictor:
     """
@@ -9,20 +127,27 @@ class InsuranceCostPredictor:
     Features: age, sex, bmi, children, smoker, region
     """
     
-    def __init__(self):
+    def __init__(self, cache_size=None):
         self.model = None
         self.model_path = Path(__file__).parent / 'trained_model.pkl'
-        self.coefficients = None
-        self.intercept = None
+        self._state = None
+        self._last_version_check = 0.0
+        self._load_lock = threading.Lock()
+        self._importance_cache = None
         
-    def train_model(self):
+        # Memoizes predict(); INSURANCE_PREDICTION_CACHE_SIZE = 0 turns it off
+        if cache_size is None:
+            cache_size = getattr(settings, 'INSURANCE_PREDICTION_CACHE_SIZE', 4096)
+        self.cache = PredictionCache(cache_size) if cache_size > 0 else None
+        
+    def use_default_coefficients(self):
         """
-        Train a simple linear regression model with pre-calculated coefficients
+        Use the built-in pre-calculated coefficients (in memory only)
         Based on typical insurance dataset patterns
         """
         # Pre-calculated coefficients based on insurance data analysis
         # These are approximate values that reflect realistic insurance cost factors
-        self.coefficients = {
+        coefficients = {
             'age': 256.85,           # Age has positive correlation
             'sex_male': -131.31,     # Males typically cost slightly less
             'bmi': 339.19,           # BMI has strong positive correlation
@@ -32,7 +157,30 @@ class InsuranceCostPredictor:
             'region_southeast': -1035.02,
             'region_southwest': -960.05,
         }
-        self.intercept = -11938.54
+        self._set_state(coefficients, -11938.54, BUILTIN_VERSION)
+    
+    @property
+    def coefficients(self):
+        return self._state.coefficients if self._state else None
+    
+    @property
+    def intercept(self):
+        return self._state.intercept if self._state else None
+    
+    @property
+    def coefficient_vector(self):
+        return self._state.coefficient_vector if self._state else None
+    
+    @property
+    def version(self):
+        return self._state.version if self._state else None
+    
+    def train_model(self):
+        """
+        Train a simple linear regression model with pre-calculated coefficients
+        and write them to trained_model.pkl
+        """
+        self.use_default_coefficients()
         
         # Save the model
         self.save_model()
@@ -47,15 +195,62 @@ class InsuranceCostPredictor:
             pickle.dump(model_data, f)
     
     def load_model(self):
-        """Load the model coefficients"""
+        """
+        Load the model coefficients
+        The active registry artifact wins; the bundled pickle is the fallback
+        """
+        self._last_version_check = time.monotonic()
+        
+        version = registry.active_version()
+        if version:
+            artifact = registry.load_artifact(version)
+            if artifact['feature_names'] != FEATURE_NAMES:
+                raise registry.ModelRegistryError(
+                    f"Model {version} was trained on {artifact['feature_names']}, expected {FEATURE_NAMES}"
+                )
+            coefficients = dict(zip(FEATURE_NAMES, artifact['coefficients'].tolist()))
+            self._set_state(coefficients, artifact['intercept'], version)
+            return True
+        
         if os.path.exists(self.model_path):
             with open(self.model_path, 'rb') as f:
                 model_data = pickle.load(f)
-                self.coefficients = model_data['coefficients']
-                self.intercept = model_data['intercept']
+            self._set_state(model_data['coefficients'], model_data['intercept'], LEGACY_VERSION)
             return True
         return False
     
+    def _set_state(self, coefficients, intercept, version):
+        """
+        Build the full model state, coefficient vector in FEATURE_NAMES
+        order included, then publish it with a single assignment
+        """
+        coefficient_vector = np.array(
+            [coefficients[name] for name in FEATURE_NAMES], dtype=np.float64
+        )
+        self._state = ModelState(coefficients, intercept, coefficient_vector, version)
+    
+    def _ensure_loaded(self):
+        """
+        Load the model on first use, then pick up a newly activated registry
+        version at most every INSURANCE_MODEL_CHECK_INTERVAL seconds
+        Never writes to disk: with no artifact the built-in coefficients are used
+        """
+        if self._state is None:
+            with self._load_lock:
+                if self._state is None and not self.load_model():
+                    self.use_default_coefficients()
+            return
+        
+        interval = getattr(settings, 'INSURANCE_MODEL_CHECK_INTERVAL', 30)
+        if time.monotonic() - self._last_version_check >= interval:
+            self._last_version_check = time.monotonic()
+            active = registry.active_version()
+            if active and active != self.version:
+                with self._load_lock:
+                    # Another thread may have switched while we waited
+                    if active != self.version:
+                        self.load_model()
+    
     def preprocess_features(self, age, sex, bmi, children, smoker, region):
         """
         Convert input features to model-ready format
@@ -72,53 +267,151 @@ class InsuranceCostPredictor:
         }
         return features
     
-    def predict(self, age, sex, bmi, children, smoker, region):
+    def encode_batch(self, applicants):
         """
-        Predict insurance cost based on input features
+        Build the (n_rows, n_features) design matrix for many applicants.
+        
+        ``applicants`` is either a mapping of column name -> array-like
+        (e.g. numpy arrays, one per INPUT_FIELDS entry) or a sequence of
+        dicts with the same keys as predict()'s arguments.
         """
-        # Load model if not already loaded
-        if self.coefficients is None:
-            if not self.load_model():
-                # Train model if it doesn't exist
-                self.train_model()
+        if isinstance(applicants, Mapping):
+            columns = applicants
+        else:
+            rows = list(applicants)
+            columns = {field: [row[field] for row in rows] for field in INPUT_FIELDS}
         
-        # Preprocess features
-        features = self.preprocess_features(age, sex, bmi, children, smoker, region)
+        age = np.asarray(columns['age'], dtype=np.float64)
+        sex = np.char.lower(np.asarray(columns['sex'], dtype=str))
+        smoker = np.char.lower(np.asarray(columns['smoker'], dtype=str))
+        region = np.char.lower(np.asarray(columns['region'], dtype=str))
         
-        # Calculate prediction
-        prediction = self.intercept
-        for feature_name, coefficient in self.coefficients.items():
-            prediction += features[feature_name] * coefficient
+        matrix = np.empty((age.shape[0], len(FEATURE_NAMES)), dtype=np.float64)
+        matrix[:, 0] = age
+        matrix[:, 1] = sex == 'male'
+        matrix[:, 2] = np.asarray(columns['bmi'], dtype=np.float64)
+        matrix[:, 3] = np.asarray(columns['children'], dtype=np.float64)
+        matrix[:, 4] = smoker == 'yes'
+        matrix[:, 5] = region == 'northwest'
+        matrix[:, 6] = region == 'southeast'
+        matrix[:, 7] = region == 'southwest'
+        return matrix
+    
+    def predict_batch(self, applicants, return_contributions=False):
+        """
+        Predict insurance costs for many applicants at once.
+        
+        Scores every row with a single matrix-vector product and applies
+        the same floor and rounding as predict(). Returns a float64 array,
+        or ``(costs, contributions)`` when ``return_contributions`` is set,
+        where ``contributions[i, j]`` is coefficient × value for row i and
+        feature FEATURE_NAMES[j] (before the intercept and the floor).
+        """
+        self._ensure_loaded()
+        return self._score(self._state, applicants, return_contributions)
+    
+    def _score(self, state, applicants, return_contributions):
+        """predict_batch() against one ModelState snapshot"""
+        coefficient_vector = state.coefficient_vector
+        matrix = self.encode_batch(applicants)
+        predictions = matrix @ coefficient_vector + state.intercept
         
         # Ensure prediction is not negative
-        prediction = max(prediction, 1000.0)
+        np.maximum(predictions, MIN_PREDICTED_COST, out=predictions)
+        predictions = np.round(predictions, 2)
+        
+        if return_contributions:
+            return predictions, matrix * coefficient_vector
+        return predictions
+    
+    @staticmethod
+    def cache_key(age, sex, bmi, children, smoker, region):
+        """Normalized feature tuple; inputs that encode identically share a key"""
+        return (
+            float(age), sex.lower(), float(bmi), float(children), smoker.lower(), region.lower()
+        )
+    
+    def predict_with_contributions(self, age, sex, bmi, children, smoker, region):
+        """
+        Predict insurance cost and return ``(cost, contributions)``, where
+        contributions is a tuple of coefficient × value in FEATURE_NAMES order
+        """
+        self._ensure_loaded()
+        state = self._state
+        
+        key = None
+        if self.cache is not None:
+            key = self.cache_key(age, sex, bmi, children, smoker, region)
+            cached = self.cache.get(state.version, key)
+            if cached is not None:
+                return cached
         
-        return round(prediction, 2)
+        # Score through the batch path so single and bulk quotes always agree
+        applicant = {
+            'age': [age],
+            'sex': [sex],
+            'bmi': [bmi],
+            'children': [children],
+            'smoker': [smoker],
+            'region': [region],
+        }
+        costs, contributions = self._score(state, applicant, return_contributions=True)
+        result = (float(costs[0]), tuple(contributions[0].tolist()))
+        
+        if key is not None:
+            self.cache.put(state.version, key, result)
+        return result
+    
+    def predict(self, age, sex, bmi, children, smoker, region):
+        """
+        Predict insurance cost based on input features
+        """
+        return self.predict_with_contributions(age, sex, bmi, children, smoker, region)[0]
     
     def get_feature_importance(self):
         """
         Return feature importance for visualization
+        Computed once per loaded model; treat the returned dict as read-only
         """
-        if self.coefficients is None:
-            self.load_model()
+        self._ensure_loaded()
+        state = self._state
+        coefficients = state.coefficients
+        
+        cached = self._importance_cache
+        if cached is not None and cached[0] is state:
+            return cached[1]
         
         importance = {
-            'Smoking Status': abs(self.coefficients['smoker_yes']),
-            'BMI': abs(self.coefficients['bmi']),
-            'Age': abs(self.coefficients['age']),
-            'Number of Children': abs(self.coefficients['children']),
-            'Region': (abs(self.coefficients['region_northwest']) + 
-                      abs(self.coefficients['region_southeast']) + 
-                      abs(self.coefficients['region_southwest'])) / 3,
-            'Sex': abs(self.coefficients['sex_male']),
+            'Smoking Status': abs(coefficients['smoker_yes']),
+            'BMI': abs(coefficients['bmi']),
+            'Age': abs(coefficients['age']),
+            'Number of Children': abs(coefficients['children']),
+            'Region': (abs(coefficients['region_northwest']) + 
+                      abs(coefficients['region_southeast']) + 
+                      abs(coefficients['region_southwest'])) / 3,
+            'Sex': abs(coefficients['sex_male']),
         }
         
         # Sort by importance
-        return dict(sorted(importance.items(), key=lambda x: x[1], reverse=True))
+        importance = dict(sorted(importance.items(), key=lambda x: x[1], reverse=True))
+        self._importance_cache = (state, importance)
+        return importance
 
-# Initialize the predictor
+# Process-wide predictor. Construction does no I/O; the model is read on
+# first use (or by preload_model()), so importing this module is free.
 predictor = InsuranceCostPredictor()
 
-# Ensure model is trained on first import
-if not predictor.load_model():
-    predictor.train_model()
\ No newline at end of file
+
+def get_predictor():
+    """Return the shared, lazily loaded predictor"""
+    return predictor
+
+
+def preload_model():
+    """
+    Load the model now instead of on the first request.
+    Called from wsgi.py when INSURANCE_PRELOAD_MODEL is set, so a
+    ``gunicorn --preload`` master loads it once and forked workers share it.
+    """
+    predictor._ensure_loaded()
+    return predictor
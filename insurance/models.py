@@ -1,5 +1,6 @@
 from django.db import models
 from users.models import User
+from .ml_model import FEATURE_LABELS, unpack_contributions
 
 class InsurancePrediction(models.Model):
     """Store insurance prediction history"""
@@ -23,10 +24,33 @@ class InsurancePrediction(models.Model):
     smoker = models.CharField(max_length=3, choices=SMOKER_CHOICES)
     region = models.CharField(max_length=20, choices=REGION_CHOICES)
     predicted_cost = models.DecimalField(max_digits=10, decimal_places=2)
+    # Per-feature coefficient × value, packed by ml_model.pack_contributions()
+    contributions = models.BinaryField(null=True, blank=True, editable=False)
+    # Intercept of the model that scored it, so the breakdown still adds up
+    # after another version is activated
+    intercept = models.FloatField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Serves the per-user history page and its keyset pagination
+            models.Index(fields=['user', '-created_at', '-id'], name='insurance_pred_user_recent'),
+        ]
+    
+    @property
+    def contribution_breakdown(self):
+        """{feature name: contribution} decoded from the packed field"""
+        return unpack_contributions(self.contributions)
+    
+    @property
+    def main_factor(self):
+        """Label of the feature that raised this quote the most, if any"""
+        breakdown = self.contribution_breakdown
+        if not breakdown:
+            return None
+        name, value = max(breakdown.items(), key=lambda item: item[1])
+        return FEATURE_LABELS[name] if value > 0 else None
     
     def __str__(self):
         return f"{self.user.username} - ${self.predicted_cost} on {self.created_at.date()}"
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Versioned storage for insurance model artifacts.
+
+Each trained model is saved as ``<version>.npz`` holding the coefficient
+vector (in FEATURE_NAMES order), the intercept and a little training
+metadata. A one-line ``ACTIVE`` file names the version the predictor should
+serve, so switching models is a file write rather than a redeploy.
+"""
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+ACTIVE_FILE = 'ACTIVE'
+VERSION_PATTERN = re.compile(r'^v(\d+)$')
+
+
+class ModelRegistryError(Exception):
+    """Raised for unknown versions or malformed artifacts"""
+
+
+def model_dir():
+    """Directory holding the artifacts (``settings.INSURANCE_MODEL_DIR``)"""
+    return Path(getattr(settings, 'INSURANCE_MODEL_DIR', Path(__file__).parent / 'artifacts'))
+
+
+def artifact_path(version):
+    return model_dir() / f'{version}.npz'
+
+
+def list_versions():
+    """All stored versions, oldest first"""
+    directory = model_dir()
+    if not directory.is_dir():
+        return []
+    versions = [path.stem for path in directory.glob('v*.npz') if VERSION_PATTERN.match(path.stem)]
+    return sorted(versions, key=lambda version: int(VERSION_PATTERN.match(version).group(1)))
+
+
+def active_version():
+    """Name of the active version, or None if nothing has been activated"""
+    try:
+        version = (model_dir() / ACTIVE_FILE).read_text().strip()
+    except OSError:
+        return None
+    return version or None
+
+
+def _atomic_write(path, write):
+    """Write via a temp file + rename so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def save_artifact(feature_names, coefficients, intercept, metadata=None):
+    """Store a new artifact under the next free version and return its name"""
+    directory = model_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    existing = list_versions()
+    number = int(VERSION_PATTERN.match(existing[-1]).group(1)) + 1 if existing else 1
+    version = f'v{number:04d}'
+
+    arrays = {
+        'feature_names': np.asarray(feature_names, dtype=str),
+        'coefficients': np.asarray(coefficients, dtype=np.float64),
+        'intercept': np.float64(intercept),
+        'metadata': np.asarray(json.dumps(metadata or {})),
+    }
+    _atomic_write(artifact_path(version), lambda f: np.savez(f, **arrays))
+    return version
+
+
+def activate(version):
+    """Point ACTIVE at ``version``"""
+    if not artifact_path(version).exists():
+        raise ModelRegistryError(f"Unknown model version '{version}'")
+    _atomic_write(model_dir() / ACTIVE_FILE, lambda f: f.write(f'{version}\n'.encode()))
+
+
+def load_artifact(version):
+    """
+    Read an artifact.
+
+    Returns a dict with ``feature_names`` (tuple), ``coefficients`` (float64
+    array), ``intercept`` (float) and ``metadata`` (dict).
+    """
+    path = artifact_path(version)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return {
+                'feature_names': tuple(str(name) for name in data['feature_names']),
+                'coefficients': np.array(data['coefficients'], dtype=np.float64),
+                'intercept': float(data['intercept']),
+                'metadata': json.loads(str(data['metadata'])),
+            }
+    except FileNotFoundError:
+        raise ModelRegistryError(f"Unknown model version '{version}'")
+    except (KeyError, ValueError) as e:
+        raise ModelRegistryError(f"Malformed model artifact '{path}': {e}")
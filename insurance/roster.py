@@ -0,0 +1,172 @@
+"""
+Bulk roster scoring for the insurance predictor.
+
+Rows are read lazily from the uploaded file, validated with the same rules
+as InsurancePredictionForm, scored in chunks with predict_batch() and written
+back out as CSV, so memory use stays flat whatever the roster size.
+"""
+import csv
+import io
+import json
+from itertools import count, islice
+
+from django import forms
+
+from .forms import InsurancePredictionForm, validate_age, validate_bmi, validate_children
+from .ml_model import INPUT_FIELDS, pack_contributions, predictor
+from .models import InsurancePrediction
+
+# Rows scored (and bulk-inserted) per round trip
+ROSTER_CHUNK_SIZE = 1000
+
+OUTPUT_FIELDS = ('row',) + INPUT_FIELDS + ('predicted_cost', 'error')
+
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl', '.json')
+
+SEX_VALUES = {value for value, _ in InsurancePredictionForm.SEX_CHOICES}
+SMOKER_VALUES = {value for value, _ in InsurancePrediction.SMOKER_CHOICES}
+REGION_VALUES = {value for value, _ in InsurancePrediction.REGION_CHOICES}
+
+
+class _Echo:
+    """File-like object whose write() just hands the line back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def read_roster(uploaded_file):
+    """
+    Return an iterator of raw row dicts for an uploaded CSV or NDJSON file.
+
+    Lines that are not valid JSON come through as ``None`` so they can be
+    reported in place, and bytes that aren't UTF-8 are decoded as U+FFFD so
+    clean_row() reports their row. Raises ValidationError if a CSV header
+    is unusable.
+    """
+    text = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', errors='replace', newline='')
+
+    if uploaded_file.name.lower().endswith(NDJSON_EXTENSIONS):
+        return _read_ndjson(text)
+
+    reader = csv.DictReader(text)
+    header = [name.strip().lower() for name in (reader.fieldnames or [])]
+    missing = [field for field in INPUT_FIELDS if field not in header]
+    if missing:
+        raise forms.ValidationError(
+            f"CSV header is missing column(s): {', '.join(missing)}"
+        )
+    reader.fieldnames = header
+    return reader
+
+
+def _read_ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except (TypeError, ValueError):
+            row = None
+        yield row if isinstance(row, dict) else None
+
+
+def _choice(value, allowed, label):
+    value = str(value).strip().lower()
+    if value not in allowed:
+        raise forms.ValidationError(f"Invalid {label} '{value}'.")
+    return value
+
+
+def clean_row(raw):
+    """
+    Validate one raw roster row.
+
+    Returns ``(cleaned, error)``; exactly one of the two is ``None``.
+    """
+    if raw is None:
+        return None, 'Invalid JSON line.'
+
+    try:
+        if any(isinstance(value, str) and '\ufffd' in value for value in raw.values()):
+            raise forms.ValidationError('Row is not valid UTF-8 text.')
+
+        missing = [field for field in INPUT_FIELDS if raw.get(field) in (None, '')]
+        if missing:
+            raise forms.ValidationError(f"Missing value(s): {', '.join(missing)}")
+
+        try:
+            age = int(str(raw['age']).strip())
+            bmi = float(raw['bmi'])
+            children = int(str(raw['children']).strip())
+        except (TypeError, ValueError):
+            raise forms.ValidationError('age and children must be whole numbers and bmi a number.')
+
+        cleaned = {
+            'age': validate_age(age),
+            'sex': _choice(raw['sex'], SEX_VALUES, 'sex'),
+            'bmi': validate_bmi(bmi),
+            'children': validate_children(children),
+            'smoker': _choice(raw['smoker'], SMOKER_VALUES, 'smoker'),
+            'region': _choice(raw['region'], REGION_VALUES, 'region'),
+        }
+    except forms.ValidationError as e:
+        return None, ' '.join(e.messages)
+
+    return cleaned, None
+
+
+def _score_chunk(chunk, row_numbers, writer, user):
+    """Validate, score and (optionally) save one chunk; return its CSV text"""
+    results = [clean_row(raw) for raw in chunk]
+    valid = [cleaned for cleaned, error in results if cleaned is not None]
+
+    if valid:
+        costs, contributions = predictor.predict_batch(valid, return_contributions=True)
+        scored = zip(costs.tolist(), contributions)
+        intercept = predictor.intercept
+    else:
+        scored = iter(())
+
+    lines = []
+    to_save = []
+    for cleaned, error in results:
+        number = next(row_numbers)
+        if cleaned is None:
+            lines.append(writer.writerow([number] + [''] * len(INPUT_FIELDS) + ['', error]))
+            continue
+
+        cost, row = next(scored)
+        lines.append(writer.writerow(
+            [number] + [cleaned[field] for field in INPUT_FIELDS] + [f'{cost:.2f}', '']
+        ))
+        if user is not None:
+            to_save.append(InsurancePrediction(
+                user=user, predicted_cost=cost, contributions=pack_contributions(row),
+                intercept=intercept, **cleaned
+            ))
+
+    if to_save:
+        InsurancePrediction.objects.bulk_create(to_save, batch_size=ROSTER_CHUNK_SIZE)
+
+    return ''.join(lines)
+
+
+def score_roster(rows, user=None, chunk_size=ROSTER_CHUNK_SIZE):
+    """
+    Generator of CSV text for a streaming response.
+
+    Scores ``rows`` ``chunk_size`` at a time. When ``user`` is given, every
+    valid row is also stored as an InsurancePrediction via bulk_create.
+    """
+    writer = csv.writer(_Echo())
+    row_numbers = count(1)
+    rows = iter(rows)
+
+    yield writer.writerow(OUTPUT_FIELDS)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield _score_chunk(chunk, row_numbers, writer, user)
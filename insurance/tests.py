@@ -1,3 +1,584 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from pathlib import Path
+import csv
+import io
+import json
+import tempfile
+import threading
+import numpy as np
+from . import registry
+from .batching import PredictionBatcher
+from .explain import evaluate_risk_factors, explain_prediction
+from .ml_model import InsuranceCostPredictor, PredictionCache, predictor
+from .models import InsurancePrediction
 
-# Create your tests here.
+User = get_user_model()
+
+
+class PredictorBatchTests(TestCase):
+    """Test vectorized batch scoring"""
+
+    def setUp(self):
+        self.predictor = InsuranceCostPredictor()
+        self.applicants = [
+            {'age': 19, 'sex': 'female', 'bmi': 27.9, 'children': 0, 'smoker': 'yes', 'region': 'southwest'},
+            {'age': 18, 'sex': 'male', 'bmi': 33.77, 'children': 1, 'smoker': 'no', 'region': 'southeast'},
+            {'age': 46, 'sex': 'Female', 'bmi': 33.44, 'children': 1, 'smoker': 'no', 'region': 'northeast'},
+            {'age': 62, 'sex': 'male', 'bmi': 26.29, 'children': 0, 'smoker': 'YES', 'region': 'Northwest'},
+        ]
+
+    def test_batch_matches_single_predictions(self):
+        """Test that predict_batch agrees with predict for every row"""
+        batch = self.predictor.predict_batch(self.applicants)
+        single = [self.predictor.predict(**row) for row in self.applicants]
+
+        self.assertEqual(list(batch), single)
+        print("✅ Batch predictions match single predictions")
+
+    def test_batch_accepts_columns(self):
+        """Test that columnar numpy input gives the same result as row dicts"""
+        columns = {
+            field: np.array([row[field] for row in self.applicants])
+            for field in ('age', 'sex', 'bmi', 'children', 'smoker', 'region')
+        }
+
+        np.testing.assert_array_equal(
+            self.predictor.predict_batch(columns),
+            self.predictor.predict_batch(self.applicants),
+        )
+        print("✅ Columnar input accepted")
+
+    def test_batch_applies_floor(self):
+        """Test that the minimum cost floor is applied"""
+        batch = self.predictor.predict_batch([
+            {'age': 18, 'sex': 'male', 'bmi': 10, 'children': 0, 'smoker': 'no', 'region': 'southeast'},
+        ])
+
+        self.assertEqual(batch[0], 1000.0)
+        print("✅ Minimum cost floor applied")
+
+
+class RosterUploadTests(TestCase):
+    """Test bulk roster upload and streaming scoring"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='rosteruser',
+            password='testpass123',
+            user_type='patient'
+        )
+
+    def _upload(self, name, content, **extra):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        roster = SimpleUploadedFile(name, content)
+        response = self.client.post('/insurance/upload/', {'roster': roster, **extra})
+        body = b''.join(response.streaming_content).decode('utf-8')
+        return response, list(csv.DictReader(io.StringIO(body)))
+
+    def test_csv_rows_scored_and_validated(self):
+        """Test that valid CSV rows are scored and invalid ones report errors"""
+        response, rows = self._upload('roster.csv', (
+            'age,sex,bmi,children,smoker,region\n'
+            '30,male,25.0,1,no,northeast\n'
+            '15,female,22.0,0,no,southwest\n'
+            '40,female,70,2,yes,southeast\n'
+        ))
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(
+            float(rows[0]['predicted_cost']),
+            predictor.predict(30, 'male', 25.0, 1, 'no', 'northeast')
+        )
+        self.assertIn('at least 18', rows[1]['error'])
+        self.assertIn('valid BMI', rows[2]['error'])
+        print("✅ CSV roster scored and validated")
+
+    def test_out_of_range_values_rejected(self):
+        """Test that NaN/inf BMI, negative children and zero age/BMI are errors, not scores"""
+        response, rows = self._upload('roster.csv', (
+            'age,sex,bmi,children,smoker,region\n'
+            '30,male,nan,1,no,northeast\n'
+            '30,male,inf,1,no,northeast\n'
+            '30,male,25.0,-2,no,northeast\n'
+            '0,male,25.0,1,no,northeast\n'
+            '30,male,0,1,no,northeast\n'
+        ))
+
+        self.assertEqual([row['predicted_cost'] for row in rows], [''] * 5)
+        self.assertIn('valid BMI', rows[0]['error'])
+        self.assertIn('valid BMI', rows[1]['error'])
+        self.assertIn('between 0 and 10', rows[2]['error'])
+        self.assertIn('at least 18', rows[3]['error'])
+        self.assertIn('valid BMI', rows[4]['error'])
+        print("✅ Non-finite and out-of-range roster values rejected")
+
+    def test_ndjson_rows_scored(self):
+        """Test that NDJSON rosters are accepted, including bad lines"""
+        response, rows = self._upload('roster.ndjson', (
+            '{"age": 52, "sex": "female", "bmi": 31.2, "children": 3, "smoker": "yes", "region": "northwest"}\n'
+            'not json\n'
+        ))
+
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[0]['predicted_cost'])
+        self.assertIn('Invalid JSON', rows[1]['error'])
+        print("✅ NDJSON roster scored")
+
+    def test_malformed_cells_reported_per_row(self):
+        """Test that non-string cells and non-UTF-8 bytes fail their row, not the stream"""
+        response, rows = self._upload('roster.ndjson', (
+            '{"age": 52, "sex": "female", "bmi": [25], "children": 3, "smoker": "yes", "region": "northwest"}\n'
+            '{"age": 40, "sex": "male", "bmi": 27.5, "children": 1, "smoker": "no", "region": "southeast"}\n'
+        ))
+        self.assertEqual([bool(row['predicted_cost']) for row in rows], [False, True])
+        self.assertIn('bmi a number', rows[0]['error'])
+
+        response, rows = self._upload('roster.csv', (
+            b'age,sex,bmi,children,smoker,region\n'
+            b'30,m\xe4le,25.0,1,no,northeast\n'
+            b'35,female,24.0,0,no,northwest\n'
+        ))
+        self.assertEqual([bool(row['predicted_cost']) for row in rows], [False, True])
+        self.assertIn('not valid UTF-8', rows[0]['error'])
+        print("✅ Malformed roster cells reported per row")
+
+    def test_missing_csv_columns_rejected(self):
+        """Test that a CSV without the required columns is rejected"""
+        roster = SimpleUploadedFile('roster.csv', b'age,sex\n30,male\n')
+        response = self.client.post('/insurance/upload/', {'roster': roster})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'missing column')
+        print("✅ Incomplete CSV header rejected")
+
+    def test_logged_in_user_can_save_rows(self):
+        """Test that opted-in users get valid rows saved to their history"""
+        self.client.login(username='rosteruser', password='testpass123')
+        self._upload('roster.csv', (
+            'age,sex,bmi,children,smoker,region\n'
+            '30,male,25.0,1,no,northeast\n'
+            '45,female,28.5,2,yes,southwest\n'
+            '12,female,28.5,2,yes,southwest\n'
+        ), save_predictions='on')
+
+        self.assertEqual(InsurancePrediction.objects.filter(user=self.user).count(), 2)
+        print("✅ Roster rows saved for logged-in user")
+
+
+class ModelRegistryTests(TestCase):
+    """Test training, storing and switching model versions"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.settings_override = override_settings(
+            INSURANCE_MODEL_DIR=self.tmpdir.name,
+            INSURANCE_MODEL_CHECK_INTERVAL=0,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        # Synthetic dataset generated from known coefficients
+        rng = np.random.default_rng(0)
+        n = 500
+        self.dataset = Path(self.tmpdir.name) / 'insurance.csv'
+        with open(self.dataset, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['age', 'sex', 'bmi', 'children', 'smoker', 'region', 'charges'])
+            for _ in range(n):
+                age = int(rng.integers(18, 65))
+                sex = rng.choice(['male', 'female'])
+                bmi = round(float(rng.uniform(16, 45)), 1)
+                children = int(rng.integers(0, 5))
+                smoker = rng.choice(['yes', 'no'])
+                region = rng.choice(['northeast', 'northwest', 'southeast', 'southwest'])
+                charges = (-2000 + 250 * age + 300 * bmi + 500 * children
+                           + (20000 if smoker == 'yes' else 0) - (100 if sex == 'male' else 0)
+                           - (400 if region == 'southeast' else 0))
+                writer.writerow([age, sex, bmi, children, smoker, region, charges])
+
+    def test_training_creates_active_artifact(self):
+        """Test that training stores a versioned .npz and activates it"""
+        call_command('train_insurance_model', str(self.dataset), stdout=io.StringIO())
+
+        self.assertEqual(registry.list_versions(), ['v0001'])
+        self.assertEqual(registry.active_version(), 'v0001')
+
+        artifact = registry.load_artifact('v0001')
+        coefficients = dict(zip(artifact['feature_names'], artifact['coefficients']))
+        self.assertAlmostEqual(coefficients['smoker_yes'], 20000, places=3)
+        self.assertAlmostEqual(coefficients['age'], 250, places=3)
+        self.assertAlmostEqual(artifact['intercept'], -2000, places=2)
+        print("✅ Trained artifact stored and activated")
+
+    def test_bad_cells_reported_with_line_number(self):
+        """Test that nan cells and short rows fail with the line, not a solver traceback"""
+        lines = self.dataset.read_text().splitlines()
+        for bad_row, expected in [('30,male,nan,1,no,northeast,5000', 'Line 4 '), ('30,male,25.0', 'Line 4 ')]:
+            broken = Path(self.tmpdir.name) / 'broken.csv'
+            broken.write_text('\n'.join(lines[:3] + [bad_row] + lines[3:]) + '\n')
+            with self.assertRaisesMessage(CommandError, expected):
+                call_command('train_insurance_model', str(broken), stdout=io.StringIO())
+        self.assertEqual(registry.list_versions(), [])
+        print("✅ Bad training rows reported by line")
+
+    def test_predictor_switches_to_activated_version(self):
+        """Test that a running predictor picks up a newly activated version"""
+        predictor = InsuranceCostPredictor()
+        predictor.predict(30, 'male', 25.0, 0, 'no', 'northeast')
+        self.assertNotEqual(predictor.version, 'v0001')
+
+        call_command('train_insurance_model', str(self.dataset), stdout=io.StringIO())
+        cost = predictor.predict(30, 'male', 25.0, 0, 'no', 'northeast')
+
+        self.assertEqual(predictor.version, 'v0001')
+        self.assertAlmostEqual(cost, -2000 + 250 * 30 + 300 * 25.0 - 100, places=1)
+        print("✅ Predictor switched to new version")
+
+    def test_reload_swaps_whole_model_under_lock(self):
+        """Test that a version switch holds the load lock and publishes one consistent state"""
+        predictor = InsuranceCostPredictor()
+        predictor.predict(30, 'male', 25.0, 0, 'no', 'northeast')
+        builtin_state = predictor._state
+        call_command('train_insurance_model', str(self.dataset), stdout=io.StringIO())
+
+        seen = []
+        real_load = predictor.load_model
+
+        def load_model():
+            seen.append(predictor._load_lock.locked())
+            return real_load()
+
+        predictor.load_model = load_model
+        predictor._last_version_check = 0.0
+        predictor.predict(30, 'male', 25.0, 0, 'no', 'northeast')
+
+        self.assertEqual(seen, [True])
+        state = predictor._state
+        self.assertIsNot(state, builtin_state)
+        self.assertEqual(state.version, 'v0001')
+        self.assertAlmostEqual(state.intercept, -2000, places=2)
+        self.assertAlmostEqual(state.coefficient_vector[0], state.coefficients['age'])
+        print("✅ Reload swaps the whole model under the lock")
+
+    def test_activate_unknown_version_fails(self):
+        """Test that activating a missing version is an error"""
+        with self.assertRaises(CommandError):
+            call_command('activate_insurance_model', 'v0042', stdout=io.StringIO())
+        print("✅ Unknown version rejected")
+
+
+class LazyPredictorTests(TestCase):
+    """Test that the predictor never does I/O until it is used"""
+
+    def test_construction_does_not_load(self):
+        """Test that creating a predictor reads nothing"""
+        fresh = InsuranceCostPredictor()
+        self.assertIsNone(fresh.coefficients)
+        self.assertIsNone(fresh.version)
+        print("✅ Predictor construction is lazy")
+
+    def test_missing_artifacts_fall_back_without_writing(self):
+        """Test that a predictor with no artifacts uses built-in coefficients and writes nothing"""
+        with tempfile.TemporaryDirectory() as tmpdir, override_settings(INSURANCE_MODEL_DIR=tmpdir):
+            fresh = InsuranceCostPredictor()
+            fresh.model_path = Path(tmpdir) / 'missing.pkl'
+
+            cost = fresh.predict(30, 'male', 25.0, 0, 'no', 'northeast')
+
+            self.assertEqual(fresh.version, 'builtin')
+            self.assertGreater(cost, 0)
+            self.assertEqual(list(Path(tmpdir).iterdir()), [])
+        print("✅ Missing model falls back without writing")
+
+
+class ExplanationTests(TestCase):
+    """Test cached feature importance and table-driven risk factors"""
+
+    def test_feature_importance_cached_per_version(self):
+        """Test that importance is computed once and refreshed on model change"""
+        fresh = InsuranceCostPredictor()
+        fresh.use_default_coefficients()
+
+        first = fresh.get_feature_importance()
+        self.assertIs(fresh.get_feature_importance(), first)
+        self.assertEqual(next(iter(first)), 'Smoking Status')
+
+        fresh._set_state(dict(fresh.coefficients, bmi=99999.0), fresh.intercept, fresh.version)
+        self.assertEqual(next(iter(fresh.get_feature_importance())), 'BMI')
+        print("✅ Feature importance cached per model version")
+
+    def test_risk_factors_from_rule_table(self):
+        """Test that risk rules match the original if-chains"""
+        factors = evaluate_risk_factors({'smoker': 'yes', 'bmi': 32.0, 'age': 55})
+        self.assertEqual([f['factor'] for f in factors], ['Smoking', 'High BMI', 'Age'])
+
+        factors = evaluate_risk_factors({'smoker': 'no', 'bmi': 27.0, 'age': 30})
+        self.assertEqual([f['factor'] for f in factors], ['Overweight BMI'])
+
+        self.assertEqual(evaluate_risk_factors({'smoker': 'no', 'bmi': 22.0, 'age': 50}), [])
+        print("✅ Risk factors evaluated from rule table")
+
+    def test_guest_result_page_shows_explanation(self):
+        """Test that the guest result page renders risk factors"""
+        self.client.post('/insurance/predict/', {
+            'age': 60, 'sex': 'male', 'bmi': 31.0, 'children': 0,
+            'smoker': 'yes', 'region': 'southeast',
+        })
+        response = self.client.get('/insurance/guest-result/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'High BMI')
+        self.assertContains(response, 'Smoking Status')
+        print("✅ Guest result shows explanation")
+
+
+class PredictionCacheTests(TestCase):
+    """Test the memoized prediction cache"""
+
+    def test_repeated_quote_is_a_cache_hit(self):
+        """Test that equivalent inputs hit the cache"""
+        fresh = InsuranceCostPredictor(cache_size=8)
+
+        first = fresh.predict(30, 'male', 25.0, 1, 'no', 'northeast')
+        second = fresh.predict(30.0, 'Male', 25, 1, 'NO', 'Northeast')
+
+        self.assertEqual(first, second)
+        self.assertEqual(fresh.cache.stats()['hits'], 1)
+        self.assertEqual(fresh.cache.stats()['misses'], 1)
+        print("✅ Repeated quote served from cache")
+
+    def test_cache_is_bounded_lru(self):
+        """Test that the least recently used entry is evicted"""
+        cache = PredictionCache(maxsize=2)
+        cache.put('v1', 'a', 1.0)
+        cache.put('v1', 'b', 2.0)
+        cache.get('v1', 'a')
+        cache.put('v1', 'c', 3.0)
+
+        self.assertEqual(cache.get('v1', 'a'), 1.0)
+        self.assertIsNone(cache.get('v1', 'b'))
+        self.assertEqual(cache.stats()['size'], 2)
+        print("✅ Cache evicts least recently used entry")
+
+    def test_new_model_version_invalidates_cache(self):
+        """Test that entries from another model version are not served"""
+        cache = PredictionCache(maxsize=4)
+        cache.put('v1', 'a', 1.0)
+
+        self.assertIsNone(cache.get('v2', 'a'))
+        cache.put('v2', 'b', 2.0)
+        self.assertIsNone(cache.get('v1', 'a'))
+        print("✅ Cache versioned by model")
+
+    def test_cache_can_be_disabled(self):
+        """Test that a zero cache size turns memoization off"""
+        self.assertIsNone(InsuranceCostPredictor(cache_size=0).cache)
+        print("✅ Cache can be disabled")
+
+
+class PredictionApiTests(TestCase):
+    """Test the JSON prediction API and request coalescing"""
+
+    applicant = {'age': 40, 'sex': 'female', 'bmi': 29.5, 'children': 2, 'smoker': 'no', 'region': 'northwest'}
+
+    def _post(self, payload):
+        return self.client.post('/insurance/api/predict/', data=json.dumps(payload), content_type='application/json')
+
+    def test_single_quote(self):
+        """Test that a single applicant gets a cost and contributions"""
+        response = self._post(self.applicant)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['predicted_cost'], predictor.predict(**self.applicant))
+        self.assertAlmostEqual(
+            sum(data['contributions'].values()) + data['intercept'], data['predicted_cost'], places=1
+        )
+        print("✅ Single API quote returned")
+
+    def test_batch_quote_reports_invalid_rows(self):
+        """Test that a batch scores valid rows and reports invalid ones"""
+        response = self._post({'applicants': [self.applicant, dict(self.applicant, age=12)]})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertIn('predicted_cost', results[0])
+        self.assertIn('age', results[1]['errors'])
+        print("✅ Batch API quote returned")
+
+    def test_invalid_single_quote_rejected(self):
+        """Test that validation errors come back as 400"""
+        response = self._post(dict(self.applicant, bmi=80))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bmi', response.json()['errors'])
+        print("✅ Invalid API quote rejected")
+
+    def test_concurrent_requests_are_coalesced(self):
+        """Test that concurrent single quotes share one vectorized call"""
+        batcher = PredictionBatcher(window=0.2, max_batch=4)
+        results = []
+        threads = [
+            threading.Thread(target=lambda age=age: results.append(batcher.predict(dict(self.applicant, age=age))))
+            for age in (20, 30, 40, 50)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 4)
+        self.assertEqual(batcher.stats()['batches'], 1)
+        print("✅ Concurrent quotes coalesced")
+
+
+class PredictionHistoryTests(TestCase):
+    """Test history statistics and keyset pagination"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='historyuser',
+            password='testpass123',
+            user_type='patient'
+        )
+        InsurancePrediction.objects.bulk_create([
+            InsurancePrediction(
+                user=self.user, age=30 + i, sex='male', bmi=25.0, children=0,
+                smoker='no', region='northeast', predicted_cost=1000 + i
+            )
+            for i in range(30)
+        ])
+        self.client.login(username='historyuser', password='testpass123')
+
+    def test_stats_from_single_aggregate(self):
+        """Test that count/avg/min/max are correct"""
+        response = self.client.get('/insurance/history/')
+
+        self.assertEqual(response.context['total_predictions'], 30)
+        self.assertEqual(response.context['min_cost'], 1000)
+        self.assertEqual(response.context['max_cost'], 1029)
+        print("✅ History statistics computed")
+
+    def test_history_pages_by_cursor(self):
+        """Test that following cursors visits every prediction exactly once"""
+        seen = []
+        cursor = ''
+        while True:
+            response = self.client.get('/insurance/history/', {'cursor': cursor} if cursor else {})
+            seen.extend(pred.id for pred in response.context['predictions'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+
+        expected = list(
+            InsurancePrediction.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        print("✅ History paginated by cursor")
+
+    def test_bad_cursor_redirects(self):
+        """Test that a malformed cursor falls back to the first page"""
+        response = self.client.get('/insurance/history/', {'cursor': 'not-a-cursor'})
+
+        self.assertRedirects(response, '/insurance/history/')
+        print("✅ Bad cursor handled")
+
+
+class ContributionBreakdownTests(TestCase):
+    """Test storing and showing per-prediction contributions"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='breakdownuser',
+            password='testpass123',
+            user_type='patient'
+        )
+        self.client.login(username='breakdownuser', password='testpass123')
+
+    def test_contributions_packed_on_save(self):
+        """Test that a saved prediction stores its breakdown compactly"""
+        self.client.post('/insurance/predict/', {
+            'age': 45, 'sex': 'female', 'bmi': 30.5, 'children': 2,
+            'smoker': 'yes', 'region': 'southwest',
+        })
+        prediction = InsurancePrediction.objects.get(user=self.user)
+
+        self.assertEqual(len(prediction.contributions), 32)
+        breakdown = prediction.contribution_breakdown
+        self.assertAlmostEqual(breakdown['smoker_yes'], predictor.coefficients['smoker_yes'], places=1)
+        self.assertEqual(breakdown['sex_male'], 0.0)
+        self.assertEqual(prediction.main_factor, 'Smoking')
+        print("✅ Contributions packed on save")
+
+    def test_result_page_shows_breakdown(self):
+        """Test that the result page renders the stored breakdown"""
+        self.client.post('/insurance/predict/', {
+            'age': 45, 'sex': 'male', 'bmi': 22.0, 'children': 0,
+            'smoker': 'no', 'region': 'northeast',
+        })
+        prediction = InsurancePrediction.objects.get(user=self.user)
+        response = self.client.get(f'/insurance/result/{prediction.id}/')
+
+        self.assertContains(response, 'How Your Quote Was Calculated')
+        self.assertContains(response, 'Sex (male)')
+        print("✅ Result page shows breakdown")
+
+    def test_breakdown_rows_add_up_to_quote(self):
+        """Test that base cost, contributions and any floor adjustment sum to the quote"""
+        for applicant, floored in [
+            ({'age': 45, 'sex': 'male', 'bmi': 30.0, 'children': 1, 'smoker': 'yes', 'region': 'southeast'}, False),
+            ({'age': 18, 'sex': 'female', 'bmi': 16.0, 'children': 0, 'smoker': 'no', 'region': 'southeast'}, True),
+        ]:
+            self.client.post('/insurance/predict/', applicant)
+            prediction = InsurancePrediction.objects.filter(user=self.user).first()
+            items = explain_prediction(prediction)['contributions']
+
+            self.assertEqual(items[0]['label'], 'Base cost')
+            self.assertAlmostEqual(
+                sum(item['value'] for item in items), float(prediction.predicted_cost), places=2
+            )
+            self.assertEqual(items[-1]['kind'] == 'floor', floored)
+
+        response = self.client.get(f'/insurance/result/{prediction.id}/')
+        self.assertContains(response, 'Base cost')
+        self.assertContains(response, 'Minimum quote adjustment')
+        print("✅ Breakdown rows add up to the quote")
+
+    def test_breakdown_uses_intercept_saved_with_prediction(self):
+        """Test that a floored quote still adds up after another model is activated"""
+        self.client.post('/insurance/predict/', {
+            'age': 18, 'sex': 'female', 'bmi': 16.0, 'children': 0, 'smoker': 'no', 'region': 'southeast',
+        })
+        prediction = InsurancePrediction.objects.get(user=self.user)
+        self.assertEqual(prediction.intercept, predictor.intercept)
+        before = explain_prediction(prediction)['contributions']
+
+        old_state = predictor._state
+        predictor._set_state(dict(predictor.coefficients), predictor.intercept + 20000, 'replacement')
+        try:
+            after = explain_prediction(prediction)['contributions']
+        finally:
+            predictor._state = old_state
+
+        self.assertEqual(after, before)
+        self.assertEqual(after[-1]['kind'], 'floor')
+        self.assertAlmostEqual(sum(item['value'] for item in after), float(prediction.predicted_cost), places=2)
+        print("✅ Breakdown uses the intercept saved with the prediction")
+
+    def test_legacy_rows_without_breakdown(self):
+        """Test that predictions saved before breakdowns existed still work"""
+        prediction = InsurancePrediction.objects.create(
+            user=self.user, age=30, sex='male', bmi=25.0, children=0,
+            smoker='no', region='northeast', predicted_cost=5000
+        )
+
+        self.assertEqual(prediction.contribution_breakdown, {})
+        self.assertIsNone(prediction.main_factor)
+        print("✅ Legacy predictions handled")
@@ -5,6 +5,8 @@ app_name = 'insurance'
 
 urlpatterns = [
     path('predict/', views.predict_insurance, name='predict'),
+    path('upload/', views.upload_roster, name='upload_roster'),
+    path('api/predict/', views.api_predict, name='api_predict'),
     path('result/<int:prediction_id>/', views.prediction_result, name='result'),
     path('guest-result/', views.guest_result, name='guest_result'),  # NEW - for guests
     path('history/', views.prediction_history, name='history'),
@@ -1,11 +1,23 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+import json
 from django.db import models
-from .forms import InsurancePredictionForm
+from django import forms
+from .forms import InsurancePredictionForm, RosterUploadForm
 from .models import InsurancePrediction
-from .ml_model import predictor
+from .ml_model import predictor, pack_contributions, FEATURE_NAMES
+from .batching import get_batcher
+from .roster import read_roster, score_roster
+from .explain import explain_prediction
+from core.pagination import paginate_keyset, InvalidCursor
+
+HISTORY_PAGE_SIZE = 25
+HISTORY_ORDERING = ('-created_at', '-id')
 
 def predict_insurance(request):
     """
@@ -25,13 +37,17 @@ def predict_insurance(request):
             
             try:
                 # Make prediction
-                predicted_cost = predictor.predict(age, sex, bmi, children, smoker, region)
+                predicted_cost, contributions = predictor.predict_with_contributions(
+                    age, sex, bmi, children, smoker, region
+                )
                 
                 # Save prediction only for logged-in users
                 if request.user.is_authenticated:
                     prediction = form.save(commit=False)
                     prediction.user = request.user
                     prediction.predicted_cost = predicted_cost
+                    prediction.contributions = pack_contributions(contributions)
+                    prediction.intercept = predictor.intercept
                     prediction.save()
                     
                     # Redirect to result page
@@ -46,7 +62,9 @@ def predict_insurance(request):
                         'children': children,
                         'smoker': smoker,
                         'region': region,
-                        'predicted_cost': float(predicted_cost)
+                        'predicted_cost': float(predicted_cost),
+                        'contributions': list(contributions),
+                        'intercept': predictor.intercept,
                     }
                     return redirect('insurance:guest_result')
                 
@@ -57,6 +75,107 @@ def predict_insurance(request):
     
     return render(request, 'insurance/predict.html', {'form': form})
 
+def upload_roster(request):
+    """
+    Bulk roster scoring - PUBLIC ACCESS
+    Streams scored rows back as CSV; logged-in users can also save them
+    """
+    if request.method == 'POST':
+        form = RosterUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                rows = read_roster(form.cleaned_data['roster'])
+            except forms.ValidationError as e:
+                form.add_error('roster', e)
+            else:
+                # Only logged-in users who opted in get rows written to history
+                save_for = None
+                if request.user.is_authenticated and form.cleaned_data['save_predictions']:
+                    save_for = request.user
+                
+                response = StreamingHttpResponse(
+                    score_roster(rows, user=save_for),
+                    content_type='text/csv'
+                )
+                response['Content-Disposition'] = 'attachment; filename="roster_predictions.csv"'
+                return response
+    else:
+        form = RosterUploadForm()
+    
+    return render(request, 'insurance/upload.html', {'form': form})
+
+def _form_errors(form):
+    return {field: list(errors) for field, errors in form.errors.items()}
+
+def _quote_payload(cost, contributions):
+    return {
+        'predicted_cost': round(cost, 2),
+        'contributions': {name: round(contributions[name], 2) for name in FEATURE_NAMES},
+    }
+
+# Stateless JSON API for partner systems: never touches the session or saves,
+# so there is no CSRF-protected state to defend
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_predict(request):
+    """
+    JSON prediction API - PUBLIC ACCESS
+    Body is one applicant object, or {"applicants": [...]} for a batch.
+    Single quotes from concurrent requests are coalesced into one vectorized call.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON format'}, status=400)
+    
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+    
+    # Single applicant
+    if 'applicants' not in data:
+        form = InsurancePredictionForm(data)
+        if not form.is_valid():
+            return JsonResponse({'errors': _form_errors(form)}, status=400)
+        
+        cost, contributions = get_batcher().predict(form.cleaned_data)
+        return JsonResponse({
+            **_quote_payload(cost, contributions),
+            'intercept': predictor.intercept,
+            'model_version': predictor.version,
+        })
+    
+    # Batch of applicants
+    applicants = data['applicants']
+    max_rows = getattr(settings, 'INSURANCE_API_MAX_BATCH', 1000)
+    if not isinstance(applicants, list) or not applicants:
+        return JsonResponse({'error': 'applicants must be a non-empty list'}, status=400)
+    if len(applicants) > max_rows:
+        return JsonResponse({'error': f'Batch too large. Please send at most {max_rows} applicants.'}, status=400)
+    
+    results = []
+    valid = []
+    for index, applicant in enumerate(applicants):
+        form = InsurancePredictionForm(applicant if isinstance(applicant, dict) else {})
+        if form.is_valid():
+            valid.append(form.cleaned_data)
+            results.append({'index': index})
+        else:
+            results.append({'index': index, 'errors': _form_errors(form)})
+    
+    if valid:
+        costs, contributions = predictor.predict_batch(valid, return_contributions=True)
+        scored = iter(zip(costs.tolist(), contributions.tolist()))
+        for result in results:
+            if 'errors' not in result:
+                cost, row = next(scored)
+                result.update(_quote_payload(cost, dict(zip(FEATURE_NAMES, row))))
+    
+    return JsonResponse({
+        'results': results,
+        'intercept': predictor.intercept,
+        'model_version': predictor.version,
+    })
+
 def prediction_result(request, prediction_id):
     """
     Display prediction result - REQUIRES LOGIN
@@ -68,42 +187,9 @@ def prediction_result(request, prediction_id):
     try:
         prediction = InsurancePrediction.objects.get(id=prediction_id, user=request.user)
         
-        # Get feature importance
-        feature_importance = predictor.get_feature_importance()
-        
-        # Calculate risk factors
-        risk_factors = []
-        if prediction.smoker == 'yes':
-            risk_factors.append({
-                'factor': 'Smoking',
-                'impact': 'Very High',
-                'recommendation': 'Quitting smoking can significantly reduce insurance costs'
-            })
-        
-        if prediction.bmi > 30:
-            risk_factors.append({
-                'factor': 'High BMI',
-                'impact': 'High',
-                'recommendation': 'Maintaining a healthy weight can lower costs'
-            })
-        elif prediction.bmi > 25:
-            risk_factors.append({
-                'factor': 'Overweight BMI',
-                'impact': 'Moderate',
-                'recommendation': 'Consider weight management for better rates'
-            })
-        
-        if prediction.age > 50:
-            risk_factors.append({
-                'factor': 'Age',
-                'impact': 'Moderate',
-                'recommendation': 'Regular health checkups are important'
-            })
-        
         context = {
             'prediction': prediction,
-            'feature_importance': feature_importance,
-            'risk_factors': risk_factors,
+            **explain_prediction(prediction),
         }
         
         return render(request, 'insurance/result.html', context)
@@ -122,42 +208,9 @@ def guest_result(request):
         messages.error(request, 'No prediction data found. Please make a prediction first.')
         return redirect('insurance:predict')
     
-    # Get feature importance
-    feature_importance = predictor.get_feature_importance()
-    
-    # Calculate risk factors
-    risk_factors = []
-    if guest_prediction['smoker'] == 'yes':
-        risk_factors.append({
-            'factor': 'Smoking',
-            'impact': 'Very High',
-            'recommendation': 'Quitting smoking can significantly reduce insurance costs'
-        })
-    
-    if guest_prediction['bmi'] > 30:
-        risk_factors.append({
-            'factor': 'High BMI',
-            'impact': 'High',
-            'recommendation': 'Maintaining a healthy weight can lower costs'
-        })
-    elif guest_prediction['bmi'] > 25:
-        risk_factors.append({
-            'factor': 'Overweight BMI',
-            'impact': 'Moderate',
-            'recommendation': 'Consider weight management for better rates'
-        })
-    
-    if guest_prediction['age'] > 50:
-        risk_factors.append({
-            'factor': 'Age',
-            'impact': 'Moderate',
-            'recommendation': 'Regular health checkups are important'
-        })
-    
     context = {
         'prediction': guest_prediction,
-        'feature_importance': feature_importance,
-        'risk_factors': risk_factors,
+        **explain_prediction(guest_prediction),
         'is_guest': True,
     }
     
@@ -170,19 +223,33 @@ def prediction_history(request):
     """
     predictions = InsurancePrediction.objects.filter(user=request.user)
     
-    # Calculate statistics
-    if predictions.exists():
-        avg_cost = predictions.aggregate(models.Avg('predicted_cost'))['predicted_cost__avg']
-        min_cost = predictions.aggregate(models.Min('predicted_cost'))['predicted_cost__min']
-        max_cost = predictions.aggregate(models.Max('predicted_cost'))['predicted_cost__max']
-    else:
-        avg_cost = min_cost = max_cost = None
+    # Calculate statistics in a single query
+    stats = predictions.aggregate(
+        count=models.Count('id'),
+        avg_cost=models.Avg('predicted_cost'),
+        min_cost=models.Min('predicted_cost'),
+        max_cost=models.Max('predicted_cost'),
+    )
+    
+    # Keyset pagination: newest first, continue after the cursor row
+    try:
+        page = paginate_keyset(
+            predictions,
+            HISTORY_ORDERING,
+            cursor=request.GET.get('cursor'),
+            page_size=HISTORY_PAGE_SIZE,
+        )
+    except InvalidCursor:
+        return redirect('insurance:history')
     
     context = {
-        'predictions': predictions,
-        'avg_cost': avg_cost,
-        'min_cost': min_cost,
-        'max_cost': max_cost,
+        'predictions': page,
+        'next_cursor': page.next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        'total_predictions': stats['count'],
+        'avg_cost': stats['avg_cost'],
+        'min_cost': stats['min_cost'],
+        'max_cost': stats['max_cost'],
     }
     
     return render(request, 'insurance/history.html', context)
@@ -13,20 +13,19 @@ document.addEventListener('DOMContentLoaded', function() {
         chatMessages.scrollTop = chatMessages.scrollHeight;
     }
 
-    // Add message to chat with better formatting
-    function addMessage(content, isUser = true) {
-        const messageDiv = document.createElement('div');
-        messageDiv.className = `message ${isUser ? 'user-message' : 'ai-message'}`;
-        
-        const now = new Date();
-        const timeString = now.toLocaleString();
-        
-        // Sanitize content and convert newlines
-        const sanitizedContent = content
+    // Sanitize content and convert newlines
+    function formatContent(content) {
+        return content
             .replace(/&/g, '&amp;')
             .replace(/</g, '&lt;')
             .replace(/>/g, '&gt;')
             .replace(/\n/g, '<br>');
+    }
+
+    // Build a message element with better formatting
+    function createMessage(content, isUser, timeString) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `message ${isUser ? 'user-message' : 'ai-message'}`;
         
         messageDiv.innerHTML = `
             <div class="message-wrapper">
@@ -34,7 +33,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     ${isUser ? '<i class="fas fa-user-circle"></i> You' : '<i class="fas fa-robot"></i> AI Assistant'}
                 </div>
                 <div class="message-content">
-                    <div class="message-text">${sanitizedContent}</div>
+                    <div class="message-text">${formatContent(content)}</div>
                 </div>
                 <div class="message-time">
                     <i class="far fa-clock me-1"></i>
@@ -42,9 +41,65 @@ document.addEventListener('DOMContentLoaded', function() {
                 </div>
             </div>
         `;
-        
+        return messageDiv;
+    }
+
+    // Add message to chat
+    function addMessage(content, isUser = true) {
+        const messageDiv = createMessage(content, isUser, new Date().toLocaleString());
         chatMessages.appendChild(messageDiv);
         scrollToBottom();
+        return messageDiv;
+    }
+
+    // ✅ NEW: Load older messages when scrolled to the top (logged-in users)
+    let historyCursor = chatMessages.dataset.nextCursor || null;
+    let loadingHistory = false;
+
+    async function loadOlderMessages() {
+        if (!historyCursor || loadingHistory) {
+            return;
+        }
+        loadingHistory = true;
+        
+        try {
+            const url = `${chatMessages.dataset.historyUrl}?cursor=${encodeURIComponent(historyCursor)}`;
+            const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+            if (!response.ok) {
+                throw await responseError(response);
+            }
+            const data = await response.json();
+            
+            // Insert above the oldest message, keeping the visible position
+            const fragment = document.createDocumentFragment();
+            data.messages.forEach(function(message) {
+                fragment.appendChild(createMessage(
+                    message.content,
+                    message.is_from_user,
+                    new Date(message.created_at).toLocaleString()
+                ));
+            });
+            const previousHeight = chatMessages.scrollHeight;
+            chatMessages.insertBefore(fragment, chatMessages.querySelector('.message'));
+            chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+            
+            historyCursor = data.next_cursor;
+        } catch (error) {
+            console.error('Failed to load older messages:', error);
+        } finally {
+            loadingHistory = false;
+        }
+    }
+
+    chatMessages.addEventListener('scroll', function() {
+        if (chatMessages.scrollTop < 100) {
+            loadOlderMessages();
+        }
+    });
+
+    // Replace the text of a message already in the chat
+    function setMessageText(messageDiv, content) {
+        messageDiv.querySelector('.message-text').innerHTML = formatContent(content);
     }
 
     // Show/hide typing indicator
@@ -87,42 +142,91 @@ document.addEventListener('DOMContentLoaded', function() {
         return token;
     }
 
+    // Turn a failed HTTP response into a user-facing error
+    async function responseError(response) {
+        if (response.status === 403) {
+            return new Error('Session expired. Please refresh the page.');
+        } else if (response.status === 500) {
+            return new Error('Server error. Please try again later.');
+        } else if (response.status === 400) {
+            const data = await response.json().catch(() => ({}));
+            return new Error(data.error || 'Invalid message.');
+        }
+        return new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+
+    function showSendError(error) {
+        console.error('Network/Parse error:', error);
+        
+        let errorMessage = 'Sorry, I encountered an error. ';
+        
+        if (error.name === 'TypeError' && error.message.includes('fetch')) {
+            errorMessage += 'Please check your internet connection.';
+        } else if (error.message.includes('CSRF')) {
+            errorMessage += 'Please refresh the page and try again.';
+        } else {
+            errorMessage += error.message;
+        }
+        
+        addMessage(errorMessage, false);
+    }
+
+    function postChatMessage(url, message) {
+        const csrfToken = getCSRFToken();
+        
+        if (!csrfToken) {
+            throw new Error('CSRF token not found. Please refresh the page.');
+        }
+
+        return fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken,  // ✅ FIXED: Proper CSRF header
+            },
+            body: JSON.stringify({ message: message })
+        });
+    }
+
+    // Poll a queued chat job, backing off up to 2s between checks
+    async function pollJob(url) {
+        let delay = 250;
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, delay));
+            const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+            if (!response.ok) {
+                throw await responseError(response);
+            }
+            const data = await response.json();
+            if (data.status === 'done' || data.status === 'failed') {
+                return data;
+            }
+            delay = Math.min(delay * 2, 2000);
+        }
+    }
+
     // Enhanced message sending with proper CSRF handling
     async function sendMessage(message) {
         console.log('Sending message:', message);
         
         try {
-            const csrfToken = getCSRFToken();
-            
-            if (!csrfToken) {
-                throw new Error('CSRF token not found. Please refresh the page.');
-            }
-
-            const response = await fetch('/chatbot/send/', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': csrfToken,  // ✅ FIXED: Proper CSRF header
-                },
-                body: JSON.stringify({ message: message })
-            });
+            const response = await postChatMessage('/chatbot/send/', message);
 
             console.log('Response status:', response.status);
             
             // Handle different response statuses
             if (!response.ok) {
-                if (response.status === 403) {
-                    throw new Error('Session expired. Please refresh the page.');
-                } else if (response.status === 500) {
-                    throw new Error('Server error. Please try again later.');
-                } else {
-                    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-                }
+                throw await responseError(response);
             }
 
-            const data = await response.json();
+            let data = await response.json();
             console.log('Response data:', data);
 
+            // ✅ NEW: Reply queued as a background job - poll until it is ready
+            if (response.status === 202) {
+                data = await pollJob(data.poll_url);
+            }
+
             if (data.success) {
                 addMessage(data.ai_response, false);
                 
@@ -140,24 +244,85 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
             }
         } catch (error) {
-            console.error('Network/Parse error:', error);
-            
-            let errorMessage = 'Sorry, I encountered an error. ';
-            
-            if (error.name === 'TypeError' && error.message.includes('fetch')) {
-                errorMessage += 'Please check your internet connection.';
-            } else if (error.message.includes('CSRF')) {
-                errorMessage += 'Please refresh the page and try again.';
-            } else {
-                errorMessage += error.message;
+            showSendError(error);
+        } finally {
+            hideTypingIndicator();
+        }
+    }
+
+    // Parse one Server-Sent Events frame into {type, data}
+    function parseEvent(frame) {
+        let type = 'message';
+        const dataLines = [];
+        frame.split('\n').forEach(function(line) {
+            if (line.startsWith('event:')) {
+                type = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trim());
             }
+        });
+        return { type: type, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+    }
+
+    // ✅ NEW: Stream the AI response token by token over Server-Sent Events
+    async function streamMessage(message) {
+        console.log('Streaming message:', message);
+        
+        let aiMessage = null;
+        let aiText = '';
+        
+        try {
+            const response = await postChatMessage('/chatbot/stream/', message);
             
-            addMessage(errorMessage, false);
+            if (!response.ok) {
+                throw await responseError(response);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
+                }
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const event = parseEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+
+                    if (event.type === 'token') {
+                        // First token replaces the typing indicator with the reply
+                        if (!aiMessage) {
+                            hideTypingIndicator();
+                            aiMessage = addMessage('', false);
+                        }
+                        aiText += event.data.text;
+                        setMessageText(aiMessage, aiText);
+                        scrollToBottom();
+                    } else if (event.type === 'done') {
+                        console.log('Stream finished:', event.data);
+                        if (event.data.error) {
+                            console.error('Save error:', event.data.error);
+                        }
+                    }
+                }
+            }
+        } catch (error) {
+            showSendError(error);
         } finally {
             hideTypingIndicator();
         }
     }
 
+    // Stream when the browser can read response bodies incrementally,
+    // unless the server queues replies as background jobs
+    const useJobs = chatForm.dataset.useJobs === 'true';
+    const canStream = !useJobs && Boolean(window.ReadableStream && window.TextDecoder);
+
     // Form submission handler
     chatForm.addEventListener('submit', function(e) {
         e.preventDefault();
@@ -178,7 +343,11 @@ document.addEventListener('DOMContentLoaded', function() {
         showTypingIndicator();
         
         // Send message to backend
-        sendMessage(message);
+        if (canStream) {
+            streamMessage(message);
+        } else {
+            sendMessage(message);
+        }
     });
 
     // Handle Enter key press (without Shift)